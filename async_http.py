@@ -0,0 +1,272 @@
+import json
+import time
+import asyncio
+from collections import deque
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+# ============================================================
+# 🔌 輕量 asyncio HTTP/1.1 用戶端 (keep-alive 連線池)
+# ============================================================
+# 只依賴標準函式庫，供壓測 (load_generator) 與 smart router 使用：
+#   - 每個 host:port 一個連線池，連線用完放回 idle 佇列重複使用
+#   - 支援 Content-Length / chunked 回應，可逐塊串流 (SSE)
+#   - 重用的連線若已被伺服器關閉，自動以新連線重送一次
+
+
+class HTTPError(Exception):
+    """連線失敗、逾時或回應格式錯誤。"""
+
+
+class _Connection:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, connect_s: float):
+        self.reader = reader
+        self.writer = writer
+        self.connect_s = connect_s   # 建立 TCP 連線花費的時間
+        self.reused = False
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class HTTPResponse:
+    """
+    回應物件；本體必須讀完 (read / iter_raw / iter_lines) 或呼叫 close()，
+    連線才會歸還連線池。
+    """
+
+    def __init__(self, pool: "AsyncHTTPPool", conn: _Connection, status: int, headers: Dict[str, str],
+                 sent_at: float = 0.0):
+        self.pool = pool
+        self.status = status
+        self.headers = headers
+        self.sent_at = sent_at       # 請求寫出完成的時間 (perf_counter)
+        self.connect_s = 0.0 if conn.reused else conn.connect_s
+        self._conn: Optional[_Connection] = conn
+        self._chunked = headers.get("transfer-encoding", "").lower() == "chunked"
+        self._remaining = int(headers.get("content-length", -1)) if not self._chunked else -1
+        self._keep_alive = headers.get("connection", "").lower() != "close"
+
+    async def iter_raw(self) -> AsyncIterator[bytes]:
+        """逐塊產生回應本體 (已解開 chunked 編碼)。"""
+        if self._conn is None:
+            return
+        reader = self._conn.reader
+        io = self.pool._io
+        try:
+            if self._chunked:
+                while True:
+                    line = await io(reader.readline())
+                    if not line:
+                        raise HTTPError("connection closed in chunked body")
+                    size = int(line.split(b";")[0].strip(), 16)
+                    if size == 0:
+                        # 略過 trailer
+                        while (await io(reader.readline())) not in (b"\r\n", b"\n", b""):
+                            pass
+                        break
+                    data = await io(reader.readexactly(size))
+                    await io(reader.readexactly(2))
+                    yield data
+            elif self._remaining >= 0:
+                while self._remaining > 0:
+                    data = await io(reader.read(min(65536, self._remaining)))
+                    if not data:
+                        raise HTTPError("connection closed in body")
+                    self._remaining -= len(data)
+                    yield data
+            else:
+                # 沒有長度資訊：讀到連線關閉為止
+                self._keep_alive = False
+                while True:
+                    data = await io(reader.read(65536))
+                    if not data:
+                        break
+                    yield data
+        except BaseException:
+            self._discard()
+            raise
+        self._release()
+
+    async def read(self) -> bytes:
+        return b"".join([chunk async for chunk in self.iter_raw()])
+
+    async def json(self) -> Any:
+        return json.loads(await self.read())
+
+    async def iter_lines(self) -> AsyncIterator[bytes]:
+        """逐行產生本體 (不含換行符號)，用於 SSE。"""
+        buffer = b""
+        async for chunk in self.iter_raw():
+            buffer += chunk
+            while True:
+                idx = buffer.find(b"\n")
+                if idx < 0:
+                    break
+                line, buffer = buffer[:idx], buffer[idx + 1:]
+                yield line.rstrip(b"\r")
+        if buffer:
+            yield buffer
+
+    async def iter_sse(self) -> AsyncIterator[bytes]:
+        """產生每個 SSE `data:` 欄位的內容 (略過 [DONE])。"""
+        async for line in self.iter_lines():
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                continue   # 繼續讀完本體，讓連線可以重複使用
+            yield data
+
+    def close(self) -> None:
+        """放棄尚未讀取的本體 (連線直接關閉，不放回連線池)。"""
+        self._discard()
+
+    def _release(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self.pool._release(conn, self._keep_alive)
+
+    def _discard(self) -> None:
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self.pool._release(conn, False)
+
+
+class AsyncHTTPPool:
+    """
+    單一 host:port 的 keep-alive 連線池。
+
+    參數：
+        base_url (str): 例如 "http://localhost:8000"
+        max_connections (int): 同時使用中的最大連線數 (超過時請求排隊等待)
+        connect_timeout (float): 建立連線逾時秒數
+        read_timeout (float): 每次讀取的逾時秒數 (串流時為相鄰兩塊之間的間隔)
+    """
+
+    def __init__(self, base_url: str, max_connections: int = 64,
+                 connect_timeout: float = 5.0, read_timeout: float = 300.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._idle: deque = deque()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self.connections_opened = 0
+
+    def _io(self, coro):
+        return asyncio.wait_for(coro, self.read_timeout)
+
+    async def _connect(self) -> _Connection:
+        start = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port), self.connect_timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise HTTPError(f"connect {self.host}:{self.port} failed: {e!r}") from e
+        self.connections_opened += 1
+        return _Connection(reader, writer, time.perf_counter() - start)
+
+    async def _acquire(self) -> _Connection:
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_connections)
+        await self._sem.acquire()
+        while self._idle:
+            conn = self._idle.pop()
+            if not conn.reader.at_eof():
+                conn.reused = True
+                return conn
+            conn.close()
+        try:
+            return await self._connect()
+        except BaseException:
+            self._sem.release()
+            raise
+
+    def _release(self, conn: _Connection, keep_alive: bool) -> None:
+        if keep_alive and not conn.reader.at_eof():
+            self._idle.append(conn)
+        else:
+            conn.close()
+        self._sem.release()
+
+    async def request(self, method: str, path: str, body: bytes = b"",
+                      headers: Optional[Dict[str, str]] = None) -> HTTPResponse:
+        """送出請求並讀完回應標頭；本體由呼叫端讀取。"""
+        head = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        for k, v in (headers or {}).items():
+            head.append(f"{k}: {v}")
+        raw = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+
+        for attempt in range(2):
+            conn = await self._acquire()
+            try:
+                conn.writer.write(raw)
+                await conn.writer.drain()
+                sent_at = time.perf_counter()
+                status_line = await self._io(conn.reader.readline())
+                if not status_line:
+                    raise ConnectionResetError("connection closed before response")
+                status = int(status_line.split(b" ", 2)[1])
+                resp_headers = {}
+                while True:
+                    line = await self._io(conn.reader.readline())
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = line.decode("latin-1").partition(":")
+                    resp_headers[k.strip().lower()] = v.strip()
+                return HTTPResponse(self, conn, status, resp_headers, sent_at)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                reused = conn.reused
+                self._release(conn, False)
+                # 閒置的 keep-alive 連線可能已被伺服器關閉 → 用新連線重送一次
+                if reused and attempt == 0:
+                    continue
+                raise HTTPError(f"{method} {path}: {e!r}") from e
+            except asyncio.TimeoutError as e:
+                self._release(conn, False)
+                raise HTTPError(f"{method} {path}: read timeout") from e
+            except BaseException:
+                self._release(conn, False)
+                raise
+        raise HTTPError(f"{method} {path}: retry failed")
+
+    async def post_json(self, path: str, payload: Any,
+                        headers: Optional[Dict[str, str]] = None) -> HTTPResponse:
+        hdrs = {"Content-Type": "application/json"}
+        hdrs.update(headers or {})
+        return await self.request("POST", path, json.dumps(payload).encode("utf-8"), hdrs)
+
+    async def get(self, path: str) -> Tuple[int, bytes]:
+        response = await self.request("GET", path)
+        return response.status, await response.read()
+
+    async def close(self) -> None:
+        while self._idle:
+            conn = self._idle.pop()
+            conn.close()
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import sys
+
+    async def _demo(url: str):
+        pool = AsyncHTTPPool(url)
+        for _ in range(3):
+            start = time.perf_counter()
+            status, body = await pool.get("/v2/health/ready")
+            print(f"GET /v2/health/ready → {status} ({(time.perf_counter() - start) * 1000:.2f} ms)")
+        print(f"🔌 開啟的連線數: {pool.connections_opened}")
+        await pool.close()
+
+    asyncio.run(_demo(sys.argv[1] if len(sys.argv) > 1 else "http://localhost:8000"))
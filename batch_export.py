@@ -0,0 +1,309 @@
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import hashlib
+import tempfile
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from config_store import ConfigStore, ovms_reload_hook
+
+# psutil 為選用套件，沒有安裝時改用 os.sysconf (Linux) 或預設值
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+DEFAULT_RAM_GB = 16.0
+EXPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "export_model.py")
+
+
+# ============================================================
+# 💾 記憶體預算
+# ============================================================
+
+def available_ram_GB() -> float:
+    """目前可用的系統記憶體 (GB)。"""
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024 ** 3
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / 1024 ** 3
+    except (AttributeError, ValueError, OSError):
+        return DEFAULT_RAM_GB
+
+
+def estimate_ram_GB(export: Dict[str, Any]) -> float:
+    """
+    估計單一匯出工作的峰值記憶體 (GB)。
+
+    已是 OpenVINO 格式 ("OpenVINO/..." 或本機 OV 資料夾) 只需下載，約 1 GB；
+    HF 模型轉換時 optimum-cli 會以 FP16/FP32 載入權重，約為參數量 (B) × 2.5 GB。
+    manifest 中可用 "ram_GB" 覆寫。
+    """
+    if "ram_GB" in export:
+        return float(export["ram_GB"])
+    source = export["source_model"]
+    if source.startswith("OpenVINO/") or os.path.isfile(os.path.join(source, "openvino_model.xml")):
+        return 1.0
+    match = re.search(r"(\d+(?:\.\d+)?)[bB]\b", source)
+    return float(match.group(1)) * 2.5 if match else 8.0
+
+
+class MemoryBudget:
+    """以 GB 為單位的計數號誌：工作開始前預留估計用量，結束時歸還。"""
+
+    def __init__(self, total_GB: float):
+        self.total_GB = total_GB
+        self.free_GB = total_GB
+        self._cond = threading.Condition()
+
+    def acquire(self, amount: float) -> float:
+        # 單一工作超過總預算時仍讓它獨佔執行
+        amount = min(amount, self.total_GB)
+        with self._cond:
+            while self.free_GB < amount:
+                self._cond.wait()
+            self.free_GB -= amount
+        return amount
+
+    def release(self, amount: float) -> None:
+        with self._cond:
+            self.free_GB += amount
+            self._cond.notify_all()
+
+
+# ============================================================
+# 📋 Manifest / checkpoint
+# ============================================================
+
+def job_id(export: Dict[str, Any]) -> str:
+    """由匯出參數計算穩定的工作 ID (參數改變時視為新工作)。"""
+    raw = json.dumps({k: v for k, v in export.items() if k != "ram_GB"}, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def load_manifest(path: str) -> Dict[str, Any]:
+    """
+    讀取批次匯出清單，格式：
+
+        {
+            "model_repository_path": "models",
+            "config_file_path": "models/config.json",
+            "exports": [
+                {"task": "text_generation", "source_model": "Qwen/Qwen3-8B", "model_name": "Qwen3-8B-int4-ov",
+                 "weight_format": "int4", "target_device": "GPU", "args": ["--cache_size", "2"]},
+                ...
+            ]
+        }
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    manifest.setdefault("model_repository_path", "models")
+    manifest.setdefault("config_file_path", os.path.join(manifest["model_repository_path"], "config.json"))
+    for export in manifest["exports"]:
+        export.setdefault("task", "text_generation")
+        export.setdefault("model_name", export["source_model"])
+    return manifest
+
+
+class Checkpoint:
+    """
+    記錄每個工作的狀態 ("started" / "done")，以及完成工作要加入 config 的 servable。
+    每次狀態改變都以 temp + os.replace 寫入，中斷後可從上次的進度繼續。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.jobs = json.load(f).get("jobs", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ checkpoint 損毀，從頭開始: {e}", file=sys.stderr)
+
+    def status(self, jid: str) -> Optional[str]:
+        return self.jobs.get(jid, {}).get("status")
+
+    def update(self, jid: str, **fields) -> None:
+        with self._lock:
+            self.jobs.setdefault(jid, {}).update(fields)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"jobs": self.jobs}, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+
+
+# ============================================================
+# ⚙️ 執行
+# ============================================================
+
+def build_command(converter: List[str], export: Dict[str, Any], repository: str, config_path: str,
+                  overwrite: bool) -> List[str]:
+    cmd = list(converter) + [
+        export["task"],
+        "--source_model", export["source_model"],
+        "--model_name", export["model_name"],
+        "--model_repository_path", repository,
+        "--config_file_path", config_path,
+    ]
+    if export.get("weight_format"):
+        cmd += ["--weight-format", export["weight_format"]]
+    if export.get("target_device"):
+        cmd += ["--target_device", export["target_device"]]
+    if overwrite:
+        cmd.append("--overwrite_models")
+    return cmd + [str(a) for a in export.get("args", [])]
+
+
+def _collect_servables(job_config: str, repository: str, config_path: str) -> List[Dict[str, str]]:
+    """讀出工作寫入暫存 config 的 servable，base_path 改為相對於最終 config 的位置。"""
+    if not os.path.isfile(job_config):
+        return []
+    with open(job_config, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    config_dir = os.path.dirname(os.path.abspath(config_path))
+    job_dir = os.path.dirname(os.path.abspath(job_config))
+    servables = []
+    for entry in config.get("mediapipe_config_list", []):
+        base_path = entry["base_path"]
+        if not os.path.isabs(base_path):
+            base_path = os.path.join(job_dir, base_path)
+        servables.append({"name": entry["name"],
+                          "base_path": Path(os.path.relpath(base_path, config_dir)).as_posix()})
+    return servables
+
+
+def run_batch(manifest_path: str, max_workers: Optional[int] = None, ram_budget_GB: Optional[float] = None,
+              converter: Optional[List[str]] = None, checkpoint_path: Optional[str] = None,
+              retry_failed: bool = True, on_change: Optional[Callable] = None) -> Dict[str, Any]:
+    """
+    平行執行 manifest 中的所有匯出工作，完成後一次更新 config.json。
+
+    參數：
+        manifest_path (str): 批次匯出清單 (見 load_manifest)
+        max_workers (int, optional): 同時執行的工作上限，預設 CPU 核心數
+        ram_budget_GB (float, optional): 記憶體預算，預設為目前可用記憶體的 80%
+        converter (list, optional): 轉換指令，預設 [python, export_model.py]；測試時可換成 stub
+        checkpoint_path (str, optional): 預設為 <manifest>.state.json
+        retry_failed (bool): 重新執行上次失敗的工作
+        on_change (callable, optional): config.json 更新後呼叫一次 (見 config_store.ovms_reload_hook)
+
+    回傳：
+        dict：{"done": [...], "failed": [...], "skipped": [...], "wall_s": ...}
+    """
+    manifest = load_manifest(manifest_path)
+    repository = manifest["model_repository_path"]
+    config_path = manifest["config_file_path"]
+    converter = converter or [sys.executable, EXPORT_SCRIPT]
+    checkpoint = Checkpoint(checkpoint_path or manifest_path + ".state.json")
+    log_dir = os.path.splitext(checkpoint.path)[0] + "_logs"
+    os.makedirs(log_dir, exist_ok=True)
+    os.makedirs(repository, exist_ok=True)
+
+    budget = MemoryBudget(ram_budget_GB if ram_budget_GB is not None else available_ram_GB() * 0.8)
+    max_workers = max_workers or os.cpu_count() or 1
+    print(f"📦 {len(manifest['exports'])} 個匯出工作，最多 {max_workers} 個平行，記憶體預算 {budget.total_GB:.1f} GB")
+
+    result = {"done": [], "failed": [], "skipped": []}
+    pending = []
+    for export in manifest["exports"]:
+        jid = job_id(export)
+        status = checkpoint.status(jid)
+        if status == "done" or (status == "failed" and not retry_failed):
+            result["skipped"].append(export["model_name"])
+            continue
+        pending.append((jid, export, status))
+
+    def _run(jid: str, export: Dict[str, Any], previous: Optional[str]) -> None:
+        """執行一個工作；任何例外都記錄為這個工作失敗，不中斷整個批次。"""
+        name = export["model_name"]
+        try:
+            _export(jid, export, previous)
+        except Exception as e:
+            if checkpoint.status(jid) == "done":
+                # 匯出已完成，只是之後的清理 (例如刪除暫存資料夾) 失敗
+                print(f"⚠️ [{name}] 已完成，但清理失敗: {e}")
+                return
+            checkpoint.update(jid, status="failed", model_name=name, error=f"{type(e).__name__}: {e}")
+            print(f"❌ [{name}] 失敗: {e}")
+            result["failed"].append(name)
+
+    def _export(jid: str, export: Dict[str, Any], previous: Optional[str]) -> None:
+        name = export["model_name"]
+        need = budget.acquire(estimate_ram_GB(export))
+        try:
+            # 每個工作寫自己的暫存 config，最後才合併到共用的 config.json
+            with tempfile.TemporaryDirectory(prefix="export_") as tmpdir:
+                job_config = os.path.join(tmpdir, "config.json")
+                # 上次中斷的工作可能留下不完整的資料夾 → 強制覆寫
+                cmd = build_command(converter, export, repository, job_config,
+                                    overwrite=export.get("overwrite", False) or previous is not None)
+                checkpoint.update(jid, status="started", model_name=name, started=time.time())
+                print(f"⚙️ [{name}] 開始 (預留 {need:.1f} GB)")
+                start = time.perf_counter()
+                with open(os.path.join(log_dir, f"{name.replace('/', '-')}.log"), "w", encoding="utf-8") as log:
+                    log.write(" ".join(shlex.quote(c) for c in cmd) + "\n")
+                    log.flush()
+                    code = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+                elapsed = time.perf_counter() - start
+                if code != 0:
+                    checkpoint.update(jid, status="failed", exit_code=code, elapsed_s=elapsed)
+                    print(f"❌ [{name}] 失敗 (exit {code})，記錄檔: {log.name}")
+                    result["failed"].append(name)
+                    return
+                servables = _collect_servables(job_config, repository, config_path)
+                checkpoint.update(jid, status="done", elapsed_s=elapsed, servables=servables)
+                print(f"✅ [{name}] 完成 {elapsed:.1f} s")
+                result["done"].append(name)
+        finally:
+            budget.release(need)
+
+    start = time.perf_counter()
+    # 先排記憶體需求大的工作，小工作填補剩餘預算
+    pending.sort(key=lambda p: -estimate_ram_GB(p[1]))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_run, *p) for p in pending]
+        for future in futures:
+            future.result()
+    result["wall_s"] = time.perf_counter() - start
+
+    # 所有完成的工作 (包含先前執行的) 一次寫入 config.json
+    servables = [s for job in checkpoint.jobs.values() if job.get("status") == "done"
+                 for s in job.get("servables", [])]
+    if servables:
+        ConfigStore(config_path, on_change=on_change).update(add=servables)
+        print(f"📝 已更新 {config_path}：{len(servables)} 個 servable")
+    return result
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Parallel, resumable batch export of OVMS models")
+    parser.add_argument("manifest", help="JSON manifest with model_repository_path, config_file_path and exports")
+    parser.add_argument("--max_workers", type=int, default=None)
+    parser.add_argument("--ram_budget_GB", type=float, default=None, help="default: 80%% of available RAM")
+    parser.add_argument("--converter", default=None, help="converter command (default: python export_model.py)")
+    parser.add_argument("--no_retry_failed", dest="retry_failed", action="store_false")
+    parser.add_argument("--reload_url", default=None, help="OVMS to reload once after config.json is updated")
+    args = parser.parse_args()
+
+    result = run_batch(args.manifest, args.max_workers, args.ram_budget_GB,
+                       shlex.split(args.converter) if args.converter else None, retry_failed=args.retry_failed,
+                       on_change=ovms_reload_hook(args.reload_url) if args.reload_url else None)
+    print(f"🏁 完成 {len(result['done'])}，失敗 {len(result['failed'])}，略過 {len(result['skipped'])}，"
+          f"耗時 {result['wall_s']:.1f} s")
+    sys.exit(1 if result["failed"] else 0)
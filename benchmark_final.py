@@ -1,8 +1,9 @@
 import time
-import requests
 import numpy as np
 import subprocess
 import sys
+from throughput_model import ThroughputCurves, CURVES_FILE
+from ovms_client import get_client
 PORT = 8000  # 你用單一 OVMS port
 
 models = [
@@ -39,51 +40,36 @@ def stop_load_process(proc):
     time.sleep(1)
 
 
-def benchmark_ovms(model_name, prompt, max_tokens):
-    url = f"http://localhost:{PORT}/v3/chat/completions"
-
-    payload = {
-        "model": model_name,
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt},
-        ],
-        "max_new_tokens": max_tokens,
-        "temperature": 0
-    }
-
-    start = time.time()
-    response = requests.post(url, json=payload)
-    end = time.time()
-
-    if response.status_code != 200:
-        print(f"❌ Error: {response.text}")
+def benchmark_ovms(model_name, prompt, max_tokens, client=None):
+    # 共用 keep-alive 連線；建立連線的時間不計入 tok/s
+    client = client or get_client(PORT)
+    data, timing = client.chat(model_name, prompt, max_tokens)
+    if data is None:
         return None, 0
 
-    data = response.json()
     actual_tokens = data.get("usage", {}).get("completion_tokens", None)
 
     if actual_tokens is None:
         print("⚠️ OVMS 沒回傳 usage")
         return None, 0
 
-    total_time = end - start
+    total_time = timing["inference_s"]
     tps = actual_tokens / total_time
     return total_time, tps
 
 
-def run_benchmark(model_npu, model_igpu, prompt, tokens):
+def run_benchmark(model_npu, model_igpu, prompt, tokens, client=None):
     print("\n============================================")
     print(f"🧪 Benchmark: {model_npu} vs {model_igpu}")
     print("============================================\n")
 
     # NPU
     print("⚡ Testing NPU...")
-    t_npu, tps_npu = benchmark_ovms(model_npu, prompt, tokens)
+    t_npu, tps_npu = benchmark_ovms(model_npu, prompt, tokens, client)
 
     # iGPU
     print("⚡ Testing iGPU...")
-    t_igpu, tps_igpu = benchmark_ovms(model_igpu, prompt, tokens)
+    t_igpu, tps_igpu = benchmark_ovms(model_igpu, prompt, tokens, client)
 
     print("\n=== Result ===")
     print(f"NPU  ({model_npu}):  {tps_npu:.2f} tok/s")
@@ -98,7 +84,18 @@ def run_benchmark(model_npu, model_igpu, prompt, tokens):
     return tps_npu, tps_igpu
 
 
-def auto_find_threshold(model_npu, model_igpu):
+def record_curve_point(curves, model_npu, model_igpu, load, tps_npu, tps_igpu):
+    """記錄一個掃描點：x 軸皆為 iGPU 負載 (%)。"""
+    if curves is None:
+        return
+    # 請求失敗時 tps 為 0，不寫入曲線
+    if tps_igpu:
+        curves.add_point(model_igpu, "iGPU", load * 100, tps_igpu, axis="iGPU")
+    if tps_npu:
+        curves.add_point(model_npu, "NPU", load * 100, tps_npu, axis="iGPU")
+
+
+def auto_find_threshold(model_npu, model_igpu, curves=None):
     print("\n============================================")
     print(f"🔍 Auto threshold test for {model_igpu}")
     print("============================================")
@@ -111,17 +108,183 @@ def auto_find_threshold(model_npu, model_igpu):
         procs = start_load_process(load)
         tps_npu, tps_igpu = run_benchmark(model_npu, model_igpu, prompt, tokens_to_generate)
         stop_load_process(procs)
+        record_curve_point(curves, model_npu, model_igpu, load, tps_npu, tps_igpu)
         if tps_igpu < tps_npu:
             print(f"\n📌 建議切換點：CPU/iGPU load > {load*100:.0f}% → 換 NPU")
             return load
             break
 
 
+# --------------------------------------------------
+# 自適應搜尋：二分切換點 + 重複量測直到信賴區間夠窄
+# --------------------------------------------------
+# 95% 雙尾 t 臨界值 (自由度 1~9)，自由度更高時近似 1.96
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262]
+
+
+def _mean_ci(samples):
+    """回傳 (平均, 95% 信賴區間半寬)。"""
+    n = len(samples)
+    mean = float(np.mean(samples))
+    if n < 2:
+        return mean, float("inf")
+    t = _T95[n - 2] if n - 2 < len(_T95) else 1.96
+    return mean, t * float(np.std(samples, ddof=1)) / np.sqrt(n)
+
+
+def measure_gap(model_npu, model_igpu, load, client, max_tokens, min_reps=3, max_reps=8, rel_ci=0.05, curves=None):
+    """
+    在指定 iGPU 負載下重複量測 (tps_igpu - tps_npu)，直到 95% 信賴區間半寬
+    小於 rel_ci × 兩者平均吞吐量，或達到 max_reps 次。
+
+    回傳: (平均差值, 信賴區間半寬, 量測次數)
+    """
+    procs = start_load_process(load)
+    gaps, tps_n, tps_i = [], [], []
+    try:
+        for _ in range(max_reps):
+            tps_npu, tps_igpu = run_benchmark(model_npu, model_igpu, prompt, max_tokens, client)
+            if not tps_npu or not tps_igpu:
+                continue
+            gaps.append(tps_igpu - tps_npu)
+            tps_n.append(tps_npu)
+            tps_i.append(tps_igpu)
+            if len(gaps) >= min_reps:
+                _, half = _mean_ci(gaps)
+                scale = (np.mean(tps_n) + np.mean(tps_i)) / 2
+                if half <= rel_ci * scale:
+                    break
+    finally:
+        stop_load_process(procs)
+
+    if not gaps:
+        raise RuntimeError(f"負載 {load:.2f} 下所有請求皆失敗")
+    record_curve_point(curves, model_npu, model_igpu, load, float(np.mean(tps_n)), float(np.mean(tps_i)))
+    mean, half = _mean_ci(gaps)
+    print(f"📏 load={load*100:.1f}% → iGPU-NPU = {mean:+.2f} ± {half:.2f} tok/s ({len(gaps)} 次)")
+    return mean, half, len(gaps)
+
+
+def auto_find_threshold_adaptive(model_npu, model_igpu, lo=0.3, hi=1.0, resolution=0.025,
+                                 max_tokens=256, min_reps=3, max_reps=8, rel_ci=0.05, curves=None):
+    """
+    以二分法尋找 iGPU 比 NPU 慢的切換負載。
+
+    - 共用 ovms_client 的 keep-alive 連線，並先各送一次暖機請求
+    - 每個點重複量測直到信賴區間夠窄 (measure_gap)
+    - 最終區間 [lo, hi] 寬度 ≤ resolution 後以線性內插估計交叉點
+
+    回傳: (threshold, error) — threshold 為 0~1；
+          整個範圍內 iGPU 都比較快時回傳 (None, 0.0)，一開始就比較慢時回傳 (lo, 0.0)
+    """
+    print("\n============================================")
+    print(f"🔍 Adaptive threshold search for {model_igpu}")
+    print("============================================")
+
+    client = get_client(PORT)
+    # 暖機：建立連線並讓兩個模型都完成載入/編譯
+    benchmark_ovms(model_npu, prompt, 8, client)
+    benchmark_ovms(model_igpu, prompt, 8, client)
+
+    runs = 0
+    f_lo, e_lo, n = measure_gap(model_npu, model_igpu, lo, client, max_tokens, min_reps, max_reps, rel_ci, curves)
+    runs += n
+    if f_lo <= 0:
+        print(f"📌 負載 {lo*100:.0f}% 時 iGPU 已比 NPU 慢")
+        return lo, 0.0
+    f_hi, e_hi, n = measure_gap(model_npu, model_igpu, hi, client, max_tokens, min_reps, max_reps, rel_ci, curves)
+    runs += n
+    if f_hi > 0:
+        print(f"📌 負載 {hi*100:.0f}% 時 iGPU 仍比 NPU 快，不需切換")
+        return None, 0.0
+
+    while hi - lo > resolution:
+        mid = (lo + hi) / 2
+        f_mid, e_mid, n = measure_gap(model_npu, model_igpu, mid, client, max_tokens, min_reps, max_reps, rel_ci, curves)
+        runs += n
+        if f_mid > 0:
+            lo, f_lo, e_lo = mid, f_mid, e_mid
+        else:
+            hi, f_hi, e_hi = mid, f_mid, e_mid
+
+    def crossing(a, b):
+        # 線性內插 f(lo)=a、f(hi)=b 的零點，並限制在 [lo, hi]
+        if a == b:
+            return (lo + hi) / 2
+        return float(np.clip(lo + (hi - lo) * a / (a - b), lo, hi))
+
+    threshold = crossing(f_lo, f_hi)
+    # 誤差：兩端量測值在信賴區間內變動時交叉點的最大偏移；
+    # 內插本身的誤差下限取最終區間寬度的 1/4
+    extremes = [crossing(f_lo + da, f_hi + db) for da in (-e_lo, e_lo) for db in (-e_hi, e_hi)]
+    error = max(max(abs(x - threshold) for x in extremes), (hi - lo) / 4)
+
+    print(f"\n📌 建議切換點：iGPU load > {threshold*100:.1f}% ± {error*100:.1f}% → 換 NPU "
+          f"(共 {runs} 次量測)")
+    return threshold, error
+
+
+def sweep_throughput_curves(model_npu, model_igpu, loads=None, curves=None, path=CURVES_FILE):
+    """
+    完整掃描 (不提早結束) iGPU 負載，記錄 NPU / iGPU 的 tok/s 曲線並寫入 path，
+    供 throughput_model.select_by_throughput 使用。
+    """
+    if loads is None:
+        loads = np.linspace(0.0, 1.0, 11)
+    if curves is None:
+        curves = ThroughputCurves.load(path)
+
+    for load in loads:
+        procs = start_load_process(load)
+        try:
+            tps_npu, tps_igpu = run_benchmark(model_npu, model_igpu, prompt, tokens_to_generate)
+        finally:
+            stop_load_process(procs)
+        record_curve_point(curves, model_npu, model_igpu, load, tps_npu, tps_igpu)
+
+    curves.save(path)
+    print(f"💾 已寫入吞吐量曲線: {path}")
+    return curves
+
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="iGPU / NPU 切換點自動搜尋")
+    parser.add_argument("--mode", choices=["linear", "adaptive", "sweep"], default="linear",
+                        help="linear: 依序掃描 8 個負載點；adaptive: 二分搜尋 + 信賴區間；"
+                             "sweep: 完整掃描 0~100%% 負載並寫入吞吐量曲線 (不找切換點)")
+    parser.add_argument("--resolution", type=float, default=0.025, help="adaptive 模式的目標解析度 (0~1)")
+    parser.add_argument("--points", type=int, default=11, help="sweep 模式的負載點數 (含 0%% 與 100%%)")
+    cli = parser.parse_args()
+
+    curves = ThroughputCurves.load(CURVES_FILE)
     for model_igpu, model_npu in models:
         start_time = time.time()
-        usage = auto_find_threshold(model_npu, model_igpu)
-        print(f"⚙️ 建議 iGPU 使用率切換點: {usage*100:.0f}%")
+        if cli.mode == "sweep":
+            # 完整曲線讓 ThroughputCurves 不必在最後一個點之後外插
+            sweep_throughput_curves(model_npu, model_igpu, np.linspace(0.0, 1.0, cli.points), curves)
+            print(f"⏱️ {model_npu} , {model_igpu}掃描完成，耗時 {time.time() - start_time:.2f} 秒\n")
+            continue
+        try:
+            if cli.mode == "adaptive":
+                usage, error = auto_find_threshold_adaptive(model_npu, model_igpu, resolution=cli.resolution,
+                                                            curves=curves)
+            else:
+                usage, error = auto_find_threshold(model_npu, model_igpu, curves), None
+        except RuntimeError as e:
+            # 單一模型組無法量測 (例如模型未載入)：略過，繼續測試其他組
+            print(f"⚠️ {model_npu} , {model_igpu} 量測失敗，略過: {e}")
+            continue
+        finally:
+            # 已量到的曲線點 (包含失敗前的點) 都要保存
+            curves.save(CURVES_FILE)
+        if usage is None:
+            print("⚙️ iGPU 在所有負載下都比 NPU 快，不需切換")
+        elif error is not None:
+            print(f"⚙️ 建議 iGPU 使用率切換點: {usage*100:.1f}% ± {error*100:.1f}%")
+        else:
+            print(f"⚙️ 建議 iGPU 使用率切換點: {usage*100:.0f}%")
         end_time = time.time()
         elapsed = end_time - start_time
         print(f"⏱️ {model_npu} , {model_igpu}測試完成，耗時 {elapsed:.2f} 秒\n")
@@ -0,0 +1,89 @@
+import os
+import re
+import sys
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+# ============================================================
+# ⏱️ import 時間量測：每次都啟動新的直譯器，避免已載入的模組影響結果
+# ============================================================
+# 選擇核心 (main 的選擇函式、detect_hw、scheduler) 應維持在幾十毫秒內，
+# 而且不應在 import 時就載入 numpy、requests、asyncio、wmi、winreg 等重的相依套件 (見 FORBIDDEN)。
+
+BUDGET_MS = {
+    "main": 50.0,
+    "detect_hw": 30.0,
+    "scheduler": 50.0,
+}
+# 這些模組的 import 不應連帶載入的套件
+FORBIDDEN = {
+    "main": ("numpy", "requests", "asyncio", "wmi", "winreg", "torch", "pyopencl", "benchmark_final"),
+    "detect_hw": ("numpy", "requests", "wmi", "winreg"),
+    "scheduler": ("numpy", "asyncio"),
+}
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure_import(module: str, cwd: Optional[str] = None) -> Dict[str, object]:
+    """
+    以 python -X importtime 在新的直譯器匯入 module。
+
+    回傳：
+        dict：{"module", "total_ms": 含相依模組的累計時間, "loaded": [所有載入的模組]}
+    """
+    cwd = cwd or os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=cwd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    total_us, loaded = 0, []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        name = match.group(4)
+        loaded.append(name)
+        if name == module:
+            total_us = int(match.group(2))
+    return {"module": module, "total_ms": total_us / 1000.0, "loaded": loaded}
+
+
+def benchmark(modules: List[str], runs: int = 5, cwd: Optional[str] = None) -> List[Dict[str, object]]:
+    """每個模組量測 runs 次，取中位數；同時檢查是否載入了 FORBIDDEN 中的套件。"""
+    results = []
+    for module in modules:
+        samples = [measure_import(module, cwd) for _ in range(runs)]
+        loaded = set(samples[-1]["loaded"])
+        heavy = [m for m in FORBIDDEN.get(module, ()) if m in loaded]
+        median = statistics.median(s["total_ms"] for s in samples)
+        budget = BUDGET_MS.get(module)
+        results.append({"module": module, "median_ms": median,
+                        "min_ms": min(s["total_ms"] for s in samples),
+                        "budget_ms": budget, "forbidden_loaded": heavy,
+                        "ok": (budget is None or median <= budget) and not heavy})
+    return results
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Measure cold import time of the selection core")
+    parser.add_argument("modules", nargs="*", default=list(BUDGET_MS), help="modules to import (default: budgeted core)")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for r in benchmark(args.modules, args.runs):
+        budget = f"{r['budget_ms']:.0f} ms" if r["budget_ms"] is not None else "-"
+        mark = "✅" if r["ok"] else "❌"
+        print(f"{mark} {r['module']:18s} median {r['median_ms']:7.1f} ms  min {r['min_ms']:7.1f} ms  budget {budget}")
+        if r["forbidden_loaded"]:
+            print(f"   ⚠️ 載入了重的相依套件: {', '.join(r['forbidden_loaded'])}")
+        failed = failed or not r["ok"]
+    sys.exit(1 if failed else 0)
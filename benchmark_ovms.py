@@ -1,8 +1,12 @@
 import subprocess
 import time
 import psutil
-import requests
 import os
+import asyncio
+import numpy as np
+
+from load_generator import sweep, print_sweep
+from ovms_client import get_client, base_url, chat_url, CHAT_PATH
 
 PORT_NPU = "8001"
 PORT_IGPU = "8000"
@@ -14,28 +18,19 @@ models = [
 
 prompt = "Hello, how are you today?"
 tokens_to_generate = 10000  # 生成 token 數
+load_tokens = 256           # 併發壓測時每個請求的 token 數
 
-def benchmark_ovms(url, model_name, prompt, max_tokens):
-    payload = {
-        "model": model_name,
-        "messages": [
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        "max_new_tokens": max_tokens,
-        "temperature": 0
-    }
+def _client_for(url):
+    # url 為完整的 .../v3/chat/completions；同一端點共用 keep-alive 連線
+    return get_client(url.split(CHAT_PATH)[0])
 
-    start = time.time()
-    response = requests.post(url, json=payload)
-    end = time.time()
 
-    if response.status_code != 200:
-        print(f"❌ Model request error from {url}: {response.text}")
+def benchmark_ovms(url, model_name, prompt, max_tokens):
+    client = _client_for(url)
+    data, timing = client.chat(model_name, prompt, max_tokens)
+    if data is None:
         return None, 0
 
-    data = response.json()
-
     # 取得實際生成 token 數
     actual_tokens = data.get("usage", {}).get("completion_tokens", None)
 
@@ -43,12 +38,85 @@ def benchmark_ovms(url, model_name, prompt, max_tokens):
         print("⚠️ WARNING: OVMS 沒回傳 usage.completion_tokens")
         return None, 0
 
-    total_time = end - start
+    # 只計熱連線上的推論時間；建立連線時間另外記在 timing["connect_s"]
+    total_time = timing["inference_s"]
     tps = actual_tokens / total_time
 
     return total_time, tps
 
 
+def benchmark_ovms_stream(url, model_name, prompt, max_tokens):
+    """
+    以 stream: true 呼叫 /v3/chat/completions (SSE)，分開量測各階段：
+
+    回傳 dict (失敗時回傳 None)：
+        connect_s       - 建立連線時間 (熱連線時為 0，不計入下列數值)
+        ttft_s          - time to first token (含 prefill 與 HTTP 開銷)
+        icl_p50_ms / icl_p95_ms / icl_p99_ms - SSE chunk 間隔百分位數 (inter-chunk latency)；
+                          OVMS 一個 chunk 可能包含多個 token，這不是逐 token 的間隔
+        itl_mean_ms     - 平均每個 token 的間隔 = decode 時間 / (tokens - 1)
+        tokens_per_chunk - 平均每個 chunk 的 token 數 (> 1 表示 chunk 間隔高估了 token 間隔)
+        decode_tps      - 純 decode 吞吐量 (第一個 token 之後)
+        e2e_tps         - 端到端 tokens / 總時間 (與 benchmark_ovms 相同定義)
+        tokens, total_s
+    """
+    client = _client_for(url)
+    connect_s = client.ensure_warm()
+
+    arrivals = []
+    usage_tokens = None
+    start = time.perf_counter()
+    try:
+        for now, chunk in client.stream_chat(model_name, prompt, max_tokens):
+            if chunk.get("usage"):
+                usage_tokens = chunk["usage"].get("completion_tokens", usage_tokens)
+            for choice in chunk.get("choices", []):
+                if choice.get("delta", {}).get("content"):
+                    arrivals.append(now)
+    except client.errors as e:
+        print(f"❌ Model request error from {url}: {e}")
+        return None
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return None
+    end = time.perf_counter()
+
+    if not arrivals:
+        print(f"⚠️ WARNING: {url} 沒有回傳任何 token")
+        return None
+
+    # OVMS 可能一次送出多個 token；有 usage 時以 usage 為準
+    tokens = usage_tokens or len(arrivals)
+    # arrivals 是每個 SSE chunk 的抵達時間，不是每個 token
+    gaps_ms = np.diff(arrivals) * 1000.0 if len(arrivals) > 1 else np.zeros(1)
+    decode_time = arrivals[-1] - arrivals[0]
+
+    return {
+        "connect_s": connect_s,
+        "ttft_s": arrivals[0] - start,
+        "icl_p50_ms": float(np.percentile(gaps_ms, 50)),
+        "icl_p95_ms": float(np.percentile(gaps_ms, 95)),
+        "icl_p99_ms": float(np.percentile(gaps_ms, 99)),
+        "itl_mean_ms": decode_time * 1000.0 / (tokens - 1) if tokens > 1 else 0.0,
+        "tokens_per_chunk": tokens / len(arrivals),
+        "decode_tps": (tokens - 1) / decode_time if decode_time > 0 else 0.0,
+        "e2e_tps": tokens / (end - start),
+        "tokens": tokens,
+        "total_s": end - start,
+    }
+
+
+def print_stream_result(label, result):
+    if result is None:
+        print(f"{label}: ❌ failed")
+        return
+    print(f"{label}: TTFT {result['ttft_s']*1000:8.1f} ms | "
+          f"inter-chunk p50/p95/p99 {result['icl_p50_ms']:.1f}/{result['icl_p95_ms']:.1f}/{result['icl_p99_ms']:.1f} ms "
+          f"({result['tokens_per_chunk']:.1f} tok/chunk) | ITL mean {result['itl_mean_ms']:.1f} ms | "
+          f"decode {result['decode_tps']:.2f} tok/s | e2e {result['e2e_tps']:.2f} tok/s | "
+          f"connect {result['connect_s']*1000:.1f} ms")
+
+
 # def kill_ovms():
 #     # 刪掉 OVMS process
 #     os.system("taskkill /IM ovms.exe /F >nul 2>&1")
@@ -62,7 +130,41 @@ def benchmark_ovms(url, model_name, prompt, max_tokens):
 #     print(f"⏳ Waiting {WAIT_MODEL_READY}s for model to load...\n")
 #     time.sleep(WAIT_MODEL_READY)
 
-def run_all_tests():
+def run_load_tests(concurrency=None, rates=None, duration=30.0):
+    """
+    併發壓測模式：對每組模型的 NPU / iGPU 端點跑多個負載等級
+    (concurrency 個封閉迴圈用戶端，或 Poisson 開放迴圈到達率 rates req/s)，
+    回報總吞吐量、排隊延遲與延遲百分位數，找出各裝置的飽和點。
+    """
+    summary = []
+    for model_npu, model_igpu in models:
+        for device, port, model in (("NPU", PORT_NPU, model_npu), ("iGPU", PORT_IGPU, model_igpu)):
+            results = asyncio.run(sweep(base_url(port), model, prompt, load_tokens,
+                                        concurrency, rates, duration))
+            print_sweep(f"{device} [{model}]", results)
+            best = max(results, key=lambda r: r["agg_tps"]) if results else None
+            summary.append((device, model, best))
+
+    print("\n================= PEAK THROUGHPUT =================")
+    for device, model, best in summary:
+        if best is None:
+            continue
+        print(f"{device:5s} {model:32s} | {best['agg_tps']:8.2f} tok/s @ {best['mode']}={best['level']:g} "
+              f"| p95 latency {best['latency_p95_s']:.2f} s")
+
+
+def run_all_tests(stream=False, concurrency=None, rates=None, duration=30.0):
+    """
+    依序測試每組 (NPU, iGPU) 模型。
+
+    stream=True 時改用 SSE 串流量測 TTFT / token 間隔 / 純 decode 吞吐量，
+    並以 decode tok/s 判定勝者。
+    concurrency / rates 有值時改跑併發壓測 (見 run_load_tests)。
+    """
+    if concurrency or rates:
+        run_load_tests(concurrency, rates, duration)
+        return
+
     results = []
 
     for model_npu, model_igpu in models:
@@ -70,32 +172,54 @@ def run_all_tests():
         print(f"🔥 Testing model family: {model_npu.split('/')[-1].split('-int4')[0]}")
         print("====================================================\n")
 
-        # 🧠 Test NPU
-        # start_model(model_npu, "NPU", PORT_NPU)
-        time_npu, tps_npu = benchmark_ovms(f"http://localhost:{PORT_NPU}/v3/chat/completions",
-                                           model_npu, prompt, tokens_to_generate)
+        url_npu = chat_url(PORT_NPU)
+        url_igpu = chat_url(PORT_IGPU)
 
-        # 🧠 Test iGPU
-        # start_model(model_igpu, "GPU", PORT_IGPU)
-        time_igpu, tps_igpu = benchmark_ovms(f"http://localhost:{PORT_IGPU}/v3/chat/completions",
-                                             model_igpu, prompt, tokens_to_generate)
+        if stream:
+            res_npu = benchmark_ovms_stream(url_npu, model_npu, prompt, tokens_to_generate)
+            res_igpu = benchmark_ovms_stream(url_igpu, model_igpu, prompt, tokens_to_generate)
+            tps_npu = res_npu["decode_tps"] if res_npu else 0
+            tps_igpu = res_igpu["decode_tps"] if res_igpu else 0
 
-        results.append((model_npu, model_igpu, tps_npu, tps_igpu))
+            print("✅ Results:")
+            print_stream_result(f"NPU [{model_npu}]", res_npu)
+            print_stream_result(f"iGPU[{model_igpu}]", res_igpu)
+        else:
+            # 🧠 Test NPU
+            # start_model(model_npu, "NPU", PORT_NPU)
+            time_npu, tps_npu = benchmark_ovms(url_npu, model_npu, prompt, tokens_to_generate)
 
-        # 印結果
-        print("✅ Results:")
-        print(f"NPU [{model_npu}]: {tps_npu:.2f} tokens/s")
-        print(f"iGPU[{model_igpu}]: {tps_igpu:.2f} tokens/s")
+            # 🧠 Test iGPU
+            # start_model(model_igpu, "GPU", PORT_IGPU)
+            time_igpu, tps_igpu = benchmark_ovms(url_igpu, model_igpu, prompt, tokens_to_generate)
+
+            # 印結果
+            print("✅ Results:")
+            print(f"NPU [{model_npu}]: {tps_npu:.2f} tokens/s")
+            print(f"iGPU[{model_igpu}]: {tps_igpu:.2f} tokens/s")
+
+        results.append((model_npu, model_igpu, tps_npu, tps_igpu))
         print("----------------------------------------------------")
         print("✅ Faster:", "NPU" if tps_npu > tps_igpu else "iGPU")
 
     print("\n================= FINAL SUMMARY =================")
+    metric = "decode" if stream else ""
     for m_npu, m_igpu, tps_npu, tps_igpu in results:
         name = m_npu.split('/')[-1].split('-int4')[0]
-        print(f"{name:28s} | NPU {tps_npu:8.2f} tok/s | iGPU {tps_igpu:8.2f} tok/s | 🔥 { 'NPU' if tps_npu > tps_igpu else 'iGPU'} wins")
+        print(f"{name:28s} | NPU {tps_npu:8.2f} tok/s | iGPU {tps_igpu:8.2f} tok/s | 🔥 { 'NPU' if tps_npu > tps_igpu else 'iGPU'} wins {metric}")
 
     # kill_ovms()
 
 if __name__ == "__main__":
-    run_all_tests()
-
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OVMS NPU vs iGPU benchmark")
+    parser.add_argument("--stream", action="store_true", help="use SSE streaming to measure TTFT / inter-chunk latency / decode tok/s")
+    parser.add_argument("--concurrency", default="", help="load test: comma-separated parallel client counts, e.g. 1,2,4,8")
+    parser.add_argument("--rate", default="", help="load test: comma-separated Poisson arrival rates (req/s)")
+    parser.add_argument("--duration", type=float, default=30.0, help="load test: seconds per level")
+    args = parser.parse_args()
+    run_all_tests(stream=args.stream,
+                  concurrency=[int(x) for x in args.concurrency.split(",") if x],
+                  rates=[float(x) for x in args.rate.split(",") if x],
+                  duration=args.duration)
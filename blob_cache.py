@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from throughput_model import model_key
+
+MANIFEST_FILE = "blob_manifest.json"
+
+# 路由使用的裝置名稱 → OpenVINO 裝置名稱
+OV_DEVICE = {"iGPU": "GPU", "NPU": "NPU", "CPU": "CPU"}
+
+# 只讀取權重檔頭尾各 1 MB 計算指紋，避免每次雜湊數 GB 的 .bin
+_SAMPLE_BYTES = 1 << 20
+
+
+# ============================================================
+# 🔑 快取鍵：模型雜湊 + 裝置 + OpenVINO 版本
+# ============================================================
+
+def model_hash(model_dir: str) -> str:
+    """
+    模型指紋：所有 .xml / .json 的完整內容，加上 .bin 的大小與頭尾取樣。
+    重新匯出或量化參數改變都會改變指紋。
+    """
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(model_dir):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith((".xml", ".bin", ".json")):
+                continue
+            path = os.path.join(root, name)
+            h.update(os.path.relpath(path, model_dir).replace(os.sep, "/").encode("utf-8"))
+            size = os.path.getsize(path)
+            h.update(str(size).encode("ascii"))
+            with open(path, "rb") as f:
+                if not name.endswith(".bin") or size <= 2 * _SAMPLE_BYTES:
+                    h.update(f.read())
+                else:
+                    h.update(f.read(_SAMPLE_BYTES))
+                    f.seek(-_SAMPLE_BYTES, os.SEEK_END)
+                    h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def openvino_version() -> str:
+    """目前安裝的 OpenVINO 版本 (未安裝時回傳 "unknown")。"""
+    try:
+        import openvino as ov
+        return ov.get_version()
+    except ImportError:
+        return "unknown"
+
+
+def read_graph_options(model_dir: str) -> Dict[str, Any]:
+    """由 export_model 產生的 graph.pbtxt 讀出 device、models_path、plugin_config 與 cache_size (GB)。"""
+    path = os.path.join(model_dir, "graph.pbtxt")
+    options = {"device": None, "models_path": "./", "plugin_config": {}, "cache_size": None}
+    if not os.path.isfile(path):
+        return options
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    device = re.search(r'^\s*device:\s*"([^"]+)"', text, re.MULTILINE)
+    models_path = re.search(r'^\s*models_path:\s*"([^"]+)"', text, re.MULTILINE)
+    plugin_config = re.search(r"^\s*plugin_config:\s*'([^']*)'", text, re.MULTILINE)
+    cache_size = re.search(r"^\s*cache_size:\s*(\d+)", text, re.MULTILINE)
+    if device:
+        options["device"] = device.group(1)
+    if cache_size:
+        options["cache_size"] = int(cache_size.group(1))
+    if models_path:
+        options["models_path"] = models_path.group(1)
+    if plugin_config:
+        try:
+            options["plugin_config"] = json.loads(plugin_config.group(1) or "{}")
+        except ValueError:
+            pass
+    return options
+
+
+def _dir_files(path: str) -> Dict[str, int]:
+    if not os.path.isdir(path):
+        return {}
+    return {name: os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)
+            if os.path.isfile(os.path.join(path, name))}
+
+
+# ============================================================
+# ⚙️ 預先編譯
+# ============================================================
+
+def compile_with_openvino(model_dir: str, device: str, cache_dir: str, properties: Dict[str, Any]) -> None:
+    """
+    以與 OVMS 相同的屬性編譯模型，讓 OpenVINO 把 blob 寫入 cache_dir。
+    LLM 使用 openvino_genai.LLMPipeline (與 OVMS 的 LLM 節點相同路徑)，否則用 Core.compile_model。
+    """
+    try:
+        import openvino_genai as ov_genai
+    except ImportError:
+        ov_genai = None
+    if ov_genai is not None and os.path.isfile(os.path.join(model_dir, "openvino_model.xml")):
+        ov_genai.LLMPipeline(model_dir, device, CACHE_DIR=cache_dir, **properties)
+        return
+    import openvino as ov
+    core = ov.Core()
+    core.set_property({"CACHE_DIR": cache_dir})
+    for name in sorted(os.listdir(model_dir)):
+        if name.startswith("openvino_") and name.endswith("_model.xml"):
+            core.compile_model(os.path.join(model_dir, name), device, properties)
+
+
+# ============================================================
+# 💾 Blob manifest
+# ============================================================
+
+class BlobManifest:
+    """
+    記錄 CACHE_DIR 中每個預先編譯的 blob。
+
+    OpenVINO 自己以模型與編譯屬性決定 blob 檔名，所有 blob 共用同一個 CACHE_DIR
+    (與 export_model --ov_cache_dir 寫入 graph.pbtxt 的路徑相同，OVMS 才會直接使用)；
+    manifest 依 (模型雜湊, 裝置, OpenVINO 版本) 記下產生的檔案、大小與編譯時間。
+
+    JSON 格式：{"entries": {"<hash>/<device>/<ov_version>": {"model": ..., "files": [...], "size_MB": ..., "compile_s": ...}}}
+    """
+
+    def __init__(self, cache_dir: str, path: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self.path = path or os.path.join(cache_dir, MANIFEST_FILE)
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.isfile(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ blob manifest 損毀，將重新建立: {e}", file=sys.stderr)
+
+    @staticmethod
+    def key(digest: str, device: str, ov_version: str) -> str:
+        return f"{digest}/{device}/{ov_version}"
+
+    def __len__(self):
+        return len(self.entries)
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def put(self, model: str, model_dir: str, digest: str, device: str, ov_version: str,
+            files: Dict[str, int], compile_s: float) -> Dict[str, Any]:
+        # 同一模型 + 裝置只保留最新的紀錄 (舊雜湊 / 舊 OpenVINO 版本自動失效)
+        stale = [k for k, e in self.entries.items() if e["model"] == model and e["device"] == device]
+        for k in stale:
+            del self.entries[k]
+        entry = {
+            "model": model, "model_dir": model_dir, "hash": digest, "device": device,
+            "ov_version": ov_version, "files": sorted(files), "size_MB": sum(files.values()) / 1024 ** 2,
+            "compile_s": compile_s, "created": time.time(),
+        }
+        self.entries[self.key(digest, device, ov_version)] = entry
+        self.save()
+        return entry
+
+    def lookup(self, model: str, device: str) -> Optional[Dict[str, Any]]:
+        """依模型名稱 (接受 "OpenVINO/..." 前綴) 與裝置 (iGPU/NPU 或 GPU/NPU) 找紀錄。"""
+        device = OV_DEVICE.get(device, device)
+        names = {model, model_key(model)}
+        for entry in self.entries.values():
+            if entry["device"] == device and (entry["model"] in names or model_key(entry["model"]) in names):
+                return entry
+        return None
+
+    def is_warm(self, model: str, device: str, ov_version: Optional[str] = None) -> bool:
+        """
+        blob 仍可使用：紀錄存在、OpenVINO 版本相同 (ov_version 為 None 時不比對)、
+        而且 blob 檔案都還在 CACHE_DIR 中。
+        """
+        entry = self.lookup(model, device)
+        if entry is None:
+            return False
+        if ov_version is not None and entry["ov_version"] != ov_version:
+            return False
+        return all(os.path.isfile(os.path.join(self.cache_dir, name)) for name in entry["files"])
+
+    def validate(self, ov_version: Optional[str] = None,
+                 model_dirs: Optional[Dict[str, str]] = None) -> List[str]:
+        """
+        移除已失效的紀錄 (模型被重新匯出、blob 被刪除或 OpenVINO 升級)，回傳移除的鍵。
+        model_dirs ({servable 名稱: 權重資料夾}) 指定時以其重新計算模型雜湊，否則使用紀錄中的 model_dir。
+        """
+        model_dirs = model_dirs or {}
+        removed = []
+        for k, entry in list(self.entries.items()):
+            model_dir = model_dirs.get(entry["model"]) or entry.get("model_dir")
+            stale = (not self.is_warm(entry["model"], entry["device"], ov_version)
+                     or (model_dir and os.path.isdir(model_dir) and model_hash(model_dir) != entry["hash"]))
+            if stale:
+                del self.entries[k]
+                removed.append(k)
+        if removed:
+            self.save()
+        return removed
+
+
+def warm_cache(models: Iterable[Tuple[str, str]], devices: Iterable[str], cache_dir: str,
+               compile_fn: Optional[Callable[[str, str, str, Dict[str, Any]], None]] = None,
+               force: bool = False) -> List[Dict[str, Any]]:
+    """
+    為每個 (模型名稱, 模型資料夾) × 裝置預先編譯 blob，並更新 manifest。
+
+    參數：
+        models: [(servable 名稱, 資料夾)]，資料夾內有 export_model 產生的 graph.pbtxt
+        devices: OpenVINO 裝置，例如 ["GPU", "NPU"]；None 或空時使用 graph.pbtxt 的 device
+        cache_dir (str): 共用的 CACHE_DIR
+        compile_fn: (模型路徑, 裝置, cache_dir, 屬性) → None；預設 compile_with_openvino
+        force (bool): 即使 manifest 顯示已預熱也重新編譯
+
+    回傳：
+        list[dict]：本次編譯的 manifest 紀錄
+    """
+    compile_fn = compile_fn or compile_with_openvino
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = BlobManifest(cache_dir)
+    ov_version = openvino_version()
+    devices = list(devices or [])
+    results = []
+
+    for name, model_dir in models:
+        options = read_graph_options(model_dir)
+        weights_dir = os.path.normpath(os.path.join(model_dir, options["models_path"]))
+        digest = model_hash(weights_dir)
+        # CACHE_DIR 不屬於編譯屬性：blob 內容只取決於其他屬性
+        properties = {k: v for k, v in options["plugin_config"].items() if k != "CACHE_DIR"}
+        for device in devices or [options["device"] or "CPU"]:
+            entry = manifest.entries.get(BlobManifest.key(digest, device, ov_version))
+            if entry and not force and manifest.is_warm(name, device, ov_version):
+                print(f"📦 {name} @ {device}: 已有預先編譯的 blob ({entry['size_MB']:.0f} MB)")
+                continue
+            # NPU 專屬屬性在其他裝置上會被拒絕
+            device_props = properties if device == "NPU" else {k: v for k, v in properties.items() if k != "MAX_PROMPT_LEN"}
+            before = _dir_files(cache_dir)
+            print(f"⚙️ 編譯 {name} @ {device} ...")
+            start = time.perf_counter()
+            try:
+                compile_fn(weights_dir, device, cache_dir, device_props)
+            except Exception as e:
+                print(f"❌ {name} @ {device} 編譯失敗: {e}")
+                continue
+            compile_s = time.perf_counter() - start
+            after = _dir_files(cache_dir)
+            files = {f: size for f, size in after.items()
+                     if f != os.path.basename(manifest.path) and not f.endswith(".tmp")
+                     and (f not in before or before[f] != size)}
+            if not files:
+                print(f"⚠️ {name} @ {device}: 編譯完成但 CACHE_DIR 中沒有新的 blob")
+                continue
+            entry = manifest.put(name, os.path.abspath(weights_dir), digest, device, ov_version, files, compile_s)
+            print(f"✅ {name} @ {device}: {compile_s:.1f} s, {entry['size_MB']:.0f} MB")
+            results.append(entry)
+    return results
+
+
+# ============================================================
+# 🧭 選擇裝置時優先使用已預熱的 blob
+# ============================================================
+
+def prefer_warm(select_fn: Callable[..., Tuple[str, str]], manifest: BlobManifest,
+                ov_version: Optional[str] = None, verbose: bool = True) -> Callable[..., Tuple[str, str]]:
+    """
+    包裝 select_fn (簽名與 main.select_best_device_and_model 相同)：
+    選到的 iGPU/NPU 沒有可用 blob、而排除該裝置後的選擇有 blob 時，改選後者，
+    避免切換時重新編譯數分鐘。dGPU (Ollama) 不受影響。
+    verbose=False 時不印出改選訊息 (每個請求都會呼叫的路由路徑)。
+    """
+    def select(devices, *args, **kwargs):
+        device, model = select_fn(devices, *args, **kwargs)
+        if device not in OV_DEVICE or manifest.is_warm(model, device, ov_version):
+            return device, model
+        others = dict(devices)
+        others[device] = False
+        if not any(others.get(d, False) for d in ("dGPU", "iGPU", "NPU")):
+            return device, model
+        alt_device, alt_model = select_fn(others, *args, **kwargs)
+        if others.get(alt_device, False) and (alt_device not in OV_DEVICE
+                                               or manifest.is_warm(alt_model, alt_device, ov_version)):
+            if verbose:
+                print(f"🔥 {device}/{model} 沒有預先編譯的 blob，改用已預熱的 {alt_device}/{alt_model}")
+            return alt_device, alt_model
+        return device, model
+    return select
+
+
+def load_manifest(cache_dir: str, config_path: Optional[str] = None) -> Tuple[BlobManifest, Optional[str]]:
+    """
+    載入 manifest 並移除失效紀錄，回傳 (manifest, OpenVINO 版本)；版本應再傳給 prefer_warm。
+    config_path 指定時以 config.json 中各 servable 目前的權重資料夾比對模型雜湊。
+    未安裝 OpenVINO 時無法比對版本 (回傳 None)，只檢查 blob 檔案與模型雜湊。
+    """
+    manifest = BlobManifest(cache_dir)
+    ov_version = openvino_version()
+    if ov_version == "unknown":
+        print("⚠️ 未安裝 OpenVINO，無法比對 blob 的編譯版本", file=sys.stderr)
+        ov_version = None
+    model_dirs = {}
+    if config_path and os.path.isfile(config_path):
+        for name, model_dir in servables_from_config(config_path):
+            options = read_graph_options(model_dir)
+            model_dirs[name] = os.path.normpath(os.path.join(model_dir, options["models_path"]))
+    for k in manifest.validate(ov_version, model_dirs):
+        print(f"🗑️ 移除失效的 blob 紀錄 {k}")
+    return manifest, ov_version
+
+
+def servables_from_config(config_path: str, names: Optional[List[str]] = None) -> List[Tuple[str, str]]:
+    """由 OVMS config.json 取得 [(servable 名稱, 絕對路徑)]；names 指定時只取其中的模型。"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    servables = []
+    for list_name in ("mediapipe_config_list", "model_config_list"):
+        for item in config.get(list_name, []):
+            entry = item.get("config", item)
+            if names and entry["name"] not in names and model_key(entry["name"]) not in names:
+                continue
+            servables.append((entry["name"], os.path.join(base_dir, entry["base_path"])))
+    return servables
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect / validate the precompiled blob manifest")
+    parser.add_argument("cache_dir", help="OpenVINO CACHE_DIR (export_model --ov_cache_dir)")
+    parser.add_argument("--validate", action="store_true", help="drop entries whose blobs or models changed")
+    parser.add_argument("--config", default=None, help="OVMS config.json whose model dirs are re-hashed (--validate)")
+    args = parser.parse_args()
+
+    if args.validate:
+        manifest, _ = load_manifest(args.cache_dir, args.config)
+    else:
+        manifest = BlobManifest(args.cache_dir)
+    for k, e in sorted(manifest.entries.items()):
+        print(f"{e['model']:32s} {e['device']:4s} OV {e['ov_version']:12s} "
+              f"{e['size_MB']:8.0f} MB  compile {e['compile_s']:6.1f} s")
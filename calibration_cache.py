@@ -0,0 +1,193 @@
+import os
+import sys
+import json
+import time
+import glob
+import hashlib
+import platform
+from typing import Any, Callable, Dict, Optional
+
+CACHE_FILE = "calibration_cache.json"
+OVMS_PORT = 8000
+# 無法校正 (OVMS 連不上、量測全部失敗) 時使用的門檻，不寫入快取
+DEFAULT_THRESHOLD = 0.5
+
+
+# ============================================================
+# 🔑 快取鍵：硬體指紋 + 模型組合 + 驅動版本 + OVMS 版本
+# ============================================================
+
+def hardware_fingerprint(devices: Dict[str, Any]) -> str:
+    """以 detect_compute_devices() 的 detail 計算硬體指紋。"""
+    detail = devices.get("detail", devices)
+    raw = json.dumps(detail, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _windows_driver_versions() -> Dict[str, str]:
+    import winreg
+    versions = {}
+    gpu_key_path = r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}"
+    try:
+        key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, gpu_key_path)
+        for i in range(0, 256):
+            try:
+                subkey = winreg.OpenKey(key, winreg.EnumKey(key, i))
+                name, _ = winreg.QueryValueEx(subkey, "DriverDesc")
+                version, _ = winreg.QueryValueEx(subkey, "DriverVersion")
+                versions[name] = version
+            except OSError:
+                break
+    except OSError:
+        pass
+    return versions
+
+
+def _linux_driver_versions() -> Dict[str, str]:
+    versions = {"kernel": platform.release()}
+    for path in glob.glob("/sys/module/*/version"):
+        module = path.split("/")[-2]
+        if module in ("i915", "xe", "intel_vpu", "nvidia", "amdgpu"):
+            try:
+                with open(path, "r") as f:
+                    versions[module] = f.read().strip()
+            except OSError:
+                continue
+    return versions
+
+
+def get_driver_versions() -> Dict[str, str]:
+    """取得 GPU / NPU 驅動版本 (盡力而為，失敗時回傳空 dict)。"""
+    try:
+        if platform.system() == "Windows":
+            return _windows_driver_versions()
+        if platform.system() == "Linux":
+            return _linux_driver_versions()
+    except Exception as e:
+        print(f"⚠️ 無法取得驅動版本: {e}", file=sys.stderr)
+    return {}
+
+
+def get_ovms_version(port: int = OVMS_PORT, timeout: float = 1.0) -> str:
+    """由 OVMS 的 KServe server metadata (GET /v2) 取得版本，失敗時回傳 "unknown"。"""
+    try:
+        from ovms_client import get_client
+        response = get_client(port).get("/v2", timeout=(timeout, timeout))
+        if response.status_code == 200:
+            return str(response.json().get("version", "unknown"))
+    except Exception:
+        pass
+    return "unknown"
+
+
+def make_cache_key(devices: Dict[str, Any], model_npu: str, model_igpu: str,
+                   driver_versions: Optional[Dict[str, str]] = None, ovms_version: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "hardware": hardware_fingerprint(devices),
+        "model_npu": model_npu,
+        "model_igpu": model_igpu,
+        "drivers": driver_versions if driver_versions is not None else get_driver_versions(),
+        "ovms": ovms_version if ovms_version is not None else get_ovms_version(),
+    }
+
+
+def _key_id(key: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+# ============================================================
+# 💾 門檻快取
+# ============================================================
+
+class CalibrationCache:
+    """
+    把 auto_find_threshold 的結果存到磁碟。
+
+    任何鍵值 (硬體、模型組合、驅動、OVMS 版本) 改變時查不到舊結果，
+    重新校正後會覆蓋同一模型組合的舊紀錄。
+
+    JSON 格式：{"entries": {<key_id>: {"key": {...}, "threshold": 0.6, "created": ...}}}
+    """
+
+    def __init__(self, path: str = CACHE_FILE):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.isfile(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f).get("entries", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 校正快取損毀，將重新建立: {e}", file=sys.stderr)
+
+    def get(self, key: Dict[str, Any]) -> Optional[float]:
+        entry = self.entries.get(_key_id(key))
+        return entry["threshold"] if entry else None
+
+    def put(self, key: Dict[str, Any], threshold: float) -> None:
+        # 同一模型組合只保留最新的校正結果 (舊的硬體/驅動/OVMS 版本自動失效)
+        stale = [k for k, e in self.entries.items()
+                 if e["key"].get("model_npu") == key["model_npu"] and e["key"].get("model_igpu") == key["model_igpu"]]
+        for k in stale:
+            del self.entries[k]
+        self.entries[_key_id(key)] = {"key": key, "threshold": threshold, "created": time.time()}
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+
+def _auto_find_threshold(model_npu: str, model_igpu: str) -> Optional[float]:
+    """
+    benchmark_final.auto_find_threshold，另外確認兩個模型都有成功的量測：
+    OVMS 不可用時 auto_find_threshold 同樣回傳 None，不能當成 "iGPU 一直比較快"。
+    """
+    from benchmark_final import auto_find_threshold
+    from throughput_model import ThroughputCurves
+
+    curves = ThroughputCurves()   # record_curve_point 只記錄 tok/s > 0 的量測
+    threshold = auto_find_threshold(model_npu, model_igpu, curves)
+    if not (curves.has(model_npu, "NPU") and curves.has(model_igpu, "iGPU")):
+        raise RuntimeError("no successful benchmark measurements")
+    return threshold
+
+
+def get_or_calibrate(devices: Dict[str, Any], model_npu: str, model_igpu: str,
+                     calibrate_fn: Optional[Callable[[str, str], Optional[float]]] = None,
+                     recalibrate: bool = False, path: str = CACHE_FILE) -> float:
+    """
+    回傳 iGPU → NPU 的切換門檻 (0~1)。快取命中時立即回傳；
+    未命中或 recalibrate=True 時執行 calibrate_fn (預設 benchmark_final.auto_find_threshold)。
+
+    calibrate_fn 回傳 None 表示 iGPU 一直比較快 (門檻 1.0)；拋出例外表示校正失敗。
+    OVMS 版本不明 (連不上) 或校正失敗時回傳 DEFAULT_THRESHOLD，且不寫入快取，
+    避免失敗的結果被永久快取或覆蓋同一模型組合的有效紀錄。
+    """
+    cache = CalibrationCache(path)
+    key = make_cache_key(devices, model_npu, model_igpu)
+
+    if not recalibrate:
+        threshold = cache.get(key)
+        if threshold is not None:
+            print(f"📦 使用快取的切換門檻: {threshold * 100:.0f}% ({model_igpu} / {model_npu})")
+            return threshold
+
+    if key["ovms"] == "unknown":
+        print(f"⚠️ 無法連線 OVMS，略過門檻校正，使用預設門檻 {DEFAULT_THRESHOLD * 100:.0f}%")
+        return DEFAULT_THRESHOLD
+
+    print("🔍 執行門檻校正 (需要數分鐘)...")
+    try:
+        threshold = (calibrate_fn or _auto_find_threshold)(model_npu, model_igpu)
+    except Exception as e:
+        print(f"⚠️ 門檻校正失敗 ({e})，使用預設門檻 {DEFAULT_THRESHOLD * 100:.0f}% (不寫入快取)")
+        return DEFAULT_THRESHOLD
+    if threshold is None:
+        # 掃描範圍內 iGPU 一直比 NPU 快 → 不切換
+        threshold = 1.0
+    threshold = float(threshold)
+    cache.put(key, threshold)
+    print(f"💾 已快取切換門檻: {threshold * 100:.0f}%")
+    return threshold
@@ -1,4 +1,3 @@
-import wmi
 import re
 import sys
 import subprocess
@@ -20,8 +19,13 @@ def extract_luid(name: str) -> str:
 
 
 def luid_to_int(luid_str: str) -> int:
-    """將 LUID 轉換為整數 (方便排序)。"""
+    """
+    將 LUID 轉換為整數 (方便排序)。Linux 記錄以 PCI 位址 ("0000:00:02.0") 代替 LUID，
+    同樣轉成整數，依 domain / bus / device / function 排序。
+    """
     try:
+        if ":" in luid_str:
+            return int(luid_str.replace(":", "").replace(".", ""), 16)
         return int(luid_str.split('_')[-1], 16)
     except Exception:
         return 0
@@ -45,12 +49,42 @@ def run_powershell(cmd: str) -> str:
         return ""
 
 
+def label_luid_records(luids, utilization: Dict[str, float], memory: Dict[str, float]) -> List[Dict[str, Any]]:
+    """依 LUID 排序並標記設備類型 (最小 → iGPU，最大 → NPU，其餘 → dGPU)。"""
+    results = []
+    sorted_luids = sorted(luids, key=luid_to_int)
+    num_devices = len(sorted_luids)
+
+    for idx, luid in enumerate(sorted_luids):
+        if idx == 0:
+            label = "iGPU - 內建顯卡"
+        elif num_devices > 1 and idx == num_devices - 1:
+            label = "NPU - 神經處理單元"
+        else:
+            label = "dGPU - 獨立顯卡/其他元件"
+
+        results.append({
+            "luid": luid,
+            "utilization": utilization.get(luid, 0.0),
+            "memory_usage_MB": memory.get(luid, 0.0),
+            "type": label
+        })
+
+    return results
+
+
 # ============================================================
 # 🧠 主核心：整合 Utilization 與 Shared Memory
 # ============================================================
 
 def _get_luid_data() -> List[Dict[str, Any]]:
     """取得 GPU LUID 對應的利用率與共享記憶體使用量。"""
+    try:
+        import wmi  # 僅 Windows 可用，延遲載入以免其他平台無法匯入本模組
+    except ImportError:
+        print("❌ 錯誤: 未安裝 wmi 套件 (僅支援 Windows)。", file=sys.stderr)
+        return []
+
     try:
         w = wmi.WMI(namespace=r'root\CIMV2')
         gpu_engines = w.query(
@@ -101,33 +135,48 @@ def _get_luid_data() -> List[Dict[str, Any]]:
     if not all_luids:
         return []
 
-    results = []
-    sorted_luids = sorted(all_luids, key=luid_to_int)
-    num_devices = len(sorted_luids)
+    return label_luid_records(all_luids, utilization_sum, memory_sum)
 
-    for idx, luid in enumerate(sorted_luids):
-        if idx == 0:
-            label = "iGPU - 內建顯卡"
-        elif num_devices > 1 and idx == num_devices - 1:
-            label = "NPU - 神經處理單元"
-        else:
-            label = "dGPU - 獨立顯卡/其他元件"
 
-        results.append({
-            "luid": luid,
-            "utilization": utilization_sum.get(luid, 0.0),
-            "memory_usage_MB": memory_sum.get(luid, 0.0),
-            "type": label
-        })
+def split_igpu_npu(records: List[Dict[str, Any]]):
+    """
+    從 LUID 使用率資料中挑出 iGPU 與 NPU。
+
+    優先依 type 標記；沒有標記時 最小 LUID → iGPU、最大 LUID → NPU。
+    回傳: (igpu_record 或 None, npu_record 或 None)
+    """
+    if not records:
+        return None, None
+    records = sorted(records, key=lambda d: luid_to_int(d["luid"]))
+    igpu = next((d for d in records if d.get("type", "").startswith("iGPU")), records[0])
+    npu = next((d for d in records if d.get("type", "").startswith("NPU")),
+               records[-1] if len(records) > 1 else None)
+    if npu is igpu:
+        npu = None
+    return igpu, npu
+
+
+_linux_sampler = None
 
-    return results
+
+def _get_linux_utilization() -> List[Dict[str, Any]]:
+    """Linux：以 DRM fdinfo / accel sysfs 計算使用率 (需保留前一次讀值計算差值)。"""
+    global _linux_sampler
+    if _linux_sampler is None:
+        from linux_telemetry import LinuxGpuNpuSampler
+        _linux_sampler = LinuxGpuNpuSampler()
+    return _linux_sampler.sample()
 
 
 def get_gpu_utilization_fast() -> List[Dict[str, Any]]:
     """
     使用 PowerShell Get-Counter 直接取得 GPU 使用率與共享記憶體使用量 (更快)
+    Linux 上改為讀取 DRM fdinfo 與 /sys/class/accel (不啟動子程序)
     回傳格式: [{"luid": "...", "utilization": 85.5, "memory_usage_MB": 12.3, "type": "iGPU"}, ...]
     """
+    if sys.platform.startswith("linux"):
+        return _get_linux_utilization()
+
     ps_cmd = (
         'Get-Counter "\\GPU Engine(*)\\Utilization Percentage" -ErrorAction SilentlyContinue | '
         'Select-Object -ExpandProperty CounterSamples | '
@@ -184,26 +233,7 @@ def get_gpu_utilization_fast() -> List[Dict[str, Any]]:
                 continue
 
     # 2️⃣ 排序並標記設備類型
-    results = []
-    sorted_luids = sorted(luid_utilization.keys(), key=luid_to_int)
-    num_devices = len(sorted_luids)
-    
-    for idx, luid in enumerate(sorted_luids):
-        if idx == 0:
-            label = "iGPU - 內建顯卡"
-        elif num_devices > 1 and idx == num_devices - 1:
-            label = "NPU - 神經處理單元"
-        else:
-            label = "dGPU - 獨立顯卡/其他元件"
-        
-        results.append({
-            "luid": luid,
-            "utilization": luid_utilization[luid],
-            "memory_usage_MB": memory_sum.get(luid, 0.0),
-            "type": label
-        })
-    
-    return results
+    return label_luid_records(luid_utilization.keys(), luid_utilization, memory_sum)
 
 
 def get_gpu_engine_utilization_by_luid() -> List[Dict[str, Any]]:
@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import tempfile
+import platform
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+if platform.system() == "Windows":
+    import msvcrt
+    fcntl = None
+else:
+    import fcntl
+    msvcrt = None
+
+LIST_NAMES = ("mediapipe_config_list", "model_config_list")
+
+
+# ============================================================
+# 🔒 跨行程的檔案鎖 (advisory)
+# ============================================================
+
+class FileLock:
+    """
+    以 <path>.lock 作為 advisory lock：POSIX 用 fcntl.flock，Windows 用 msvcrt.locking。
+    同一行程內的不同執行緒各自開檔，也會互斥。
+
+    參數：
+        path (str): 要保護的檔案 (鎖檔為 path + ".lock")
+        timeout (float): 等待上限秒數，逾時拋出 TimeoutError
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0, poll_interval: float = 0.02):
+        self.lock_path = path + ".lock"
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._file = None
+
+    def _try_lock(self) -> bool:
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self) -> None:
+        self._file = open(self.lock_path, "a+")
+        deadline = time.monotonic() + self.timeout
+        while not self._try_lock():
+            if time.monotonic() > deadline:
+                self._file.close()
+                self._file = None
+                raise TimeoutError(f"could not lock {self.lock_path} within {self.timeout:.0f}s")
+            time.sleep(self.poll_interval)
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+def atomic_write_json(path: str, data: Any) -> None:
+    """
+    寫到同一目錄的暫存檔 → fsync → os.replace，讀取端 (OVMS) 只會看到舊檔或完整的新檔。
+    保留原檔權限 (mkstemp 預設 0600，OVMS 可能以其他使用者執行)。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix="." + os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+        mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    if fcntl is not None:
+        # 目錄項目也要寫入磁碟，rename 才能在斷電後保留
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+# ============================================================
+# 🗂️ OVMS config.json
+# ============================================================
+
+def _entry(item: Dict[str, Any]) -> Dict[str, Any]:
+    # model_config_list 的條目包在 {"config": {...}} 之內
+    return item.get("config", item)
+
+
+class ConfigStore:
+    """
+    OVMS config.json 的讀寫：所有修改都在檔案鎖內「讀取 → 修改 → 原子寫入」，
+    多個匯出程式同時執行也不會遺失條目。
+
+    一次 transaction() 可以修改任意多個 servable，只寫入一次、只觸發一次 on_change。
+
+    參數：
+        path (str): config.json 路徑
+        on_change (callable, optional): on_change(config, changed_names)，寫入後呼叫
+            (例如觸發 OVMS POST /v1/config/reload)
+        lock_timeout (float): 等待檔案鎖的秒數
+    """
+
+    def __init__(self, path: str = "config.json",
+                 on_change: Optional[Callable[[Dict[str, Any], Set[str]], None]] = None,
+                 lock_timeout: float = 30.0):
+        self.path = path
+        self.on_change = on_change
+        self.lock_timeout = lock_timeout
+
+    def read(self) -> Dict[str, Any]:
+        if not os.path.isfile(self.path):
+            return {"mediapipe_config_list": [], "model_config_list": []}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def entries(config: Dict[str, Any]):
+        """產生 (清單名稱, 條目) — 條目為 {"name", "base_path", ...}。"""
+        for list_name in LIST_NAMES:
+            for item in config.get(list_name, []):
+                yield list_name, _entry(item)
+
+    def names(self) -> List[str]:
+        return [entry["name"] for _, entry in self.entries(self.read())]
+
+    @contextmanager
+    def transaction(self):
+        """
+        在檔案鎖內讀出 config 讓呼叫端修改，離開時內容有變才寫入並通知。
+
+            with store.transaction() as config:
+                config["mediapipe_config_list"].append({...})
+        """
+        with FileLock(self.path, self.lock_timeout):
+            config = self.read()
+            for list_name in LIST_NAMES:
+                config.setdefault(list_name, [])
+            before = {entry["name"]: json.dumps(entry, sort_keys=True) for _, entry in self.entries(config)}
+            yield config
+            after = {entry["name"]: json.dumps(entry, sort_keys=True) for _, entry in self.entries(config)}
+            changed = {name for name in before.keys() | after.keys() if before.get(name) != after.get(name)}
+            if changed or not os.path.isfile(self.path):
+                atomic_write_json(self.path, config)
+        if changed and self.on_change is not None:
+            self.on_change(config, changed)
+
+    def update(self, add: Iterable[Dict[str, str]] = (), remove: Iterable[str] = (),
+               list_name: str = "mediapipe_config_list") -> None:
+        """
+        一次寫入多個 servable：add 中的條目新增或更新 base_path (不論原本在哪個清單)，
+        remove 中的名稱從所有清單移除。
+        """
+        add = [dict(s, base_path=Path(s["base_path"]).as_posix()) for s in add]
+        remove = set(remove)
+        with self.transaction() as config:
+            for name in LIST_NAMES:
+                config[name] = [item for item in config[name] if _entry(item)["name"] not in remove]
+            existing = {entry["name"]: entry for _, entry in self.entries(config)}
+            for servable in add:
+                if servable["name"] in existing:
+                    existing[servable["name"]].update(servable)
+                elif list_name == "model_config_list":
+                    config[list_name].append({"config": servable})
+                else:
+                    config[list_name].append(servable)
+
+    def add_servable(self, name: str, base_path: str) -> None:
+        self.update(add=[{"name": name, "base_path": base_path}])
+
+    def remove_servable(self, name: str) -> None:
+        self.update(remove=[name])
+
+
+def ovms_reload_hook(base_url: str = "http://localhost:8000", timeout: float = 600.0):
+    """
+    回傳 on_change 函式：config 變更後呼叫 OVMS POST /v1/config/reload
+    (OVMS 以 --file_system_poll_wait_seconds 0 啟動時需要手動觸發)。
+    """
+    def on_change(config: Dict[str, Any], changed: Set[str]) -> None:
+        import requests
+        try:
+            response = requests.post(base_url.rstrip("/") + "/v1/config/reload", timeout=timeout)
+            if response.status_code >= 400:
+                print(f"⚠️ OVMS config reload 回應 {response.status_code}: {response.text}", file=sys.stderr)
+        except requests.RequestException as e:
+            print(f"⚠️ OVMS config reload 失敗: {e}", file=sys.stderr)
+    return on_change
+
+
+def ovms_loaded_servables(config_path: str, base_url: Optional[str] = None, timeout: float = 1.0) -> List[str]:
+    """
+    目前已佔用記憶體的 servable：OVMS GET /v1/config 中狀態為 AVAILABLE / LOADING 的模型。
+    未指定 base_url 或 OVMS 無法連線時，以 config.json 列出的 servable 為準
+    (OVMS 啟動時會載入 config 中的所有模型)。
+    """
+    if base_url:
+        import requests
+        try:
+            response = requests.get(base_url.rstrip("/") + "/v1/config", timeout=timeout)
+            if response.status_code == 200:
+                return [name for name, status in response.json().items()
+                        if any(v.get("state") in ("AVAILABLE", "LOADING")
+                               for v in status.get("model_version_status", []))]
+        except (requests.RequestException, ValueError, AttributeError):
+            pass
+    return ConfigStore(config_path).names()
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Locked, atomic edits of an OVMS config.json")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--add", nargs=2, action="append", default=[], metavar=("NAME", "BASE_PATH"))
+    parser.add_argument("--remove", action="append", default=[], metavar="NAME")
+    parser.add_argument("--reload-url", default=None, help="call POST /v1/config/reload on this OVMS after a change")
+    args = parser.parse_args()
+
+    store = ConfigStore(args.config, on_change=ovms_reload_hook(args.reload_url) if args.reload_url else None)
+    if args.add or args.remove:
+        store.update(add=[{"name": n, "base_path": p} for n, p in args.add], remove=args.remove)
+    for list_name, entry in store.entries(store.read()):
+        print(f"{list_name:22s} {entry['name']:32s} {entry.get('base_path', '')}")
@@ -1,6 +1,12 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import threading
 import subprocess
 import platform
-from typing import Dict, Any
+from typing import Callable, Dict, Any, Optional
 
 
 # ============================================================
@@ -23,10 +29,7 @@ def run_cmd(cmd: str) -> str:
 # ============================================================
 # 🧠 Windows GPU/NPU 檢測
 # ============================================================
-import subprocess
-import platform
-import winreg
-from typing import Dict, Any
+# winreg 只在 Windows 偵測函式內載入，其他平台也能 import 本模組
 
 
 # ============================================================
@@ -47,10 +50,6 @@ def run_cmd_fast(cmd: str) -> str:
 # ============================================================
 # 🖥️ Windows GPU 偵測（wmic：0.01~0.03 秒）
 # ============================================================
-import platform
-import wmi
-
-import winreg
 
 # ------------------------------------------------------------
 # 執行指令（只給 NPU 用）
@@ -71,6 +70,7 @@ def run_cmd(cmd: str) -> str:
 # Windows GPU (iGPU / dGPU) - 快速 Registry 方法
 # ------------------------------------------------------------
 def _detect_windows_gpu(result: Dict[str, Any]) -> None:
+    import winreg
     gpu_key_path = r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}"
     try:
         key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, gpu_key_path)
@@ -113,48 +113,171 @@ def _detect_windows_npu(result: Dict[str, Any]) -> None:
             result["detail"]["npu"] = npu_devices[0]
 
 # ------------------------------------------------------------
-# 主偵測函式
+# 各平台偵測 (只呼叫目前平台的函式，其他平台的模組不會被載入)
 # ------------------------------------------------------------
-def detect_compute_devices() -> Dict[str, Any]:
+def _probe_windows(result: Dict[str, Any]) -> Dict[str, Any]:
+    _detect_windows_gpu(result)   # 快速 GPU
+    _detect_windows_npu(result)   # 可靠 NPU
+    return result
+
+
+def _probe_linux(result: Dict[str, Any]) -> Dict[str, Any]:
+    # 直接讀 /sys/bus/pci/devices 與 /sys/class/drm|accel，每個裝置另有結構化紀錄
+    from linux_hw import detect_linux_devices
+    return detect_linux_devices()
+
+
+def _probe_darwin(result: Dict[str, Any]) -> Dict[str, Any]:
+    result.update({"iGPU": True, "NPU": True})
+    result["detail"]["gpus"].append("Apple M-series Integrated GPU")
+    result["detail"]["npu"] = "Apple Neural Engine (ANE)"
+    return result
+
+
+PROBES: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    "Windows": _probe_windows,
+    "Linux": _probe_linux,
+    "Darwin": _probe_darwin,
+}
+
+
+# ------------------------------------------------------------
+# 實際偵測 (Windows PowerShell 約 1~3 秒)
+# ------------------------------------------------------------
+def probe_compute_devices() -> Dict[str, Any]:
     result = {"dGPU": False, "iGPU": False, "NPU": False, "detail": {"gpus": [], "npu": None}}
-    os_name = platform.system()
+    probe = PROBES.get(platform.system())
+    return probe(result) if probe is not None else result
 
-    if os_name == "Windows":
-        _detect_windows_gpu(result)   # 快速 GPU
-        _detect_windows_npu(result)   # 可靠 NPU
 
+# ============================================================
+# 💾 偵測結果快取：以便宜的硬體指紋為鍵
+# ============================================================
+HW_CACHE_FILE = "hw_cache.json"
+_WINDOWS_FINGERPRINT_KEYS = (
+    r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}",  # Display
+    r"SYSTEM\CurrentControlSet\Enum\PCI",
+)
+_LINUX_FINGERPRINT_DIRS = ("/sys/bus/pci/devices", "/sys/class/drm", "/sys/class/accel", "/dev/accel")
+_revalidation: Optional[threading.Thread] = None
+
+
+def _windows_fingerprint() -> list:
+    # QueryInfoKey 回傳 (子機碼數, 值數, 最後寫入時間)；裝置新增/移除或驅動更新都會改變
+    import winreg
+    parts = []
+    for path in _WINDOWS_FINGERPRINT_KEYS:
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, path) as key:
+                subkeys, _, last_write = winreg.QueryInfoKey(key)
+                parts.append([path, subkeys, last_write])
+        except OSError:
+            parts.append([path, None, None])
+    return parts
+
+
+def _linux_fingerprint() -> list:
+    # 只列目錄 (不讀裝置內容)；PCI 裝置、DRM/accel 節點或核心版本改變時指紋不同
+    parts = [platform.release()]
+    for path in _LINUX_FINGERPRINT_DIRS:
+        try:
+            parts.append([path, sorted(os.listdir(path))])
+        except OSError:
+            parts.append([path, None])
+    return parts
+
+
+def device_fingerprint() -> str:
+    """毫秒級的硬體指紋：Windows 用 Registry 最後寫入時間，Linux 用 sysfs 裝置列表。"""
+    os_name = platform.system()
+    if os_name == "Windows":
+        parts = _windows_fingerprint()
     elif os_name == "Linux":
-        out = subprocess.getoutput("lspci -nnk | grep -i vga -A3")
-        for line in out.splitlines():
-            gpu_l = line.lower()
-            if "vga" in gpu_l or "3d" in gpu_l:
-                gpu = line.split(":")[-1].strip()
-                result["detail"]["gpus"].append(gpu)
-                if "nvidia" in gpu_l or "amd" in gpu_l:
-                    result["dGPU"] = True
-                if "intel" in gpu_l:
-                    result["iGPU"] = True
-        if subprocess.getoutput("ls /dev/dri/ | grep 'accel'").strip():
-            result["NPU"] = True
-            result["detail"]["npu"] = "Generic Compute Accelerator (Linux)"
+        parts = _linux_fingerprint()
+    else:
+        parts = [platform.machine(), platform.release()]
+    raw = json.dumps([os_name, parts], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
 
-    elif os_name == "Darwin":
-        result.update({"iGPU": True, "NPU": True})
-        result["detail"]["gpus"].append("Apple M-series Integrated GPU")
-        result["detail"]["npu"] = "Apple Neural Engine (ANE)"
 
-    return result
+def _load_hw_cache(path: str) -> Dict[str, Any]:
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
 
 
+def _save_hw_cache(path: str, fingerprint: str, result: Dict[str, Any]) -> None:
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"fingerprint": fingerprint, "platform": platform.system(), "result": result},
+                      f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ 無法寫入硬體偵測快取 {path}: {e}")
+
+
+def _revalidate(path: str, fingerprint: str, cached: Dict[str, Any],
+                on_change: Optional[Callable[[Dict[str, Any]], None]]) -> None:
+    result = probe_compute_devices()
+    if result != cached:
+        print("🔄 硬體偵測結果與快取不同，已更新快取")
+        _save_hw_cache(path, fingerprint, result)
+        if on_change is not None:
+            on_change(result)
+
+
+def wait_for_revalidation(timeout: Optional[float] = None) -> None:
+    """等待背景重新偵測完成 (主要給 CLI 與測試使用)。"""
+    if _revalidation is not None:
+        _revalidation.join(timeout)
+
+
+# ------------------------------------------------------------
+# 主偵測函式
+# ------------------------------------------------------------
+def detect_compute_devices(use_cache: bool = True, revalidate: bool = True, cache_path: str = HW_CACHE_FILE,
+                           on_change: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    偵測 dGPU / iGPU / NPU。
+
+    指紋與快取相同時直接回傳快取結果 (毫秒級)，並在背景執行緒重新偵測一次；
+    結果不同時更新快取並呼叫 on_change(新結果)。指紋改變或沒有快取時同步偵測。
+
+    參數：
+        use_cache (bool): False 時一律同步偵測，不讀寫快取
+        revalidate (bool): 命中快取時是否在背景重新偵測
+        cache_path (str): 快取檔案路徑
+        on_change (callable, optional): 背景偵測發現差異時呼叫
+    """
+    global _revalidation
+    if not use_cache:
+        return probe_compute_devices()
+    fingerprint = device_fingerprint()
+    cache = _load_hw_cache(cache_path)
+    if cache.get("fingerprint") == fingerprint and "result" in cache:
+        cached = cache["result"]
+        if revalidate:
+            _revalidation = threading.Thread(target=_revalidate, args=(cache_path, fingerprint, cached, on_change),
+                                             name="detect-hw-revalidate", daemon=True)
+            _revalidation.start()
+        return cached
+    result = probe_compute_devices()
+    _save_hw_cache(cache_path, fingerprint, result)
+    return result
 
 
-import time
 # ============================================================
 # 🧾 主程式執行
 # ============================================================
 if __name__ == "__main__":
     start = time.time()
-    devices = detect_compute_devices()
+    # --no-cache：強制重新偵測
+    devices = detect_compute_devices(use_cache="--no-cache" not in sys.argv)
     # luid_utilization_data = get_gpu_engine_utilization_by_luid()
     elapsed = time.time() - start
     print(f"⏱️ 偵測完成，耗時 {elapsed:.2f} 秒")
@@ -165,3 +288,4 @@ if __name__ == "__main__":
     print(f"🖥️ 獨立顯示卡 (dGPU): {'✅ 偵測到' if devices['dGPU'] else '❌ 未偵測到'}")
     print(f"🎮 整合顯示卡 (iGPU): {'✅ 偵測到' if devices['iGPU'] else '❌ 未偵測到'}")
     print(f"⚙️ 神經處理單元 (NPU): {'✅ 偵測到' if devices['NPU'] else '❌ 未偵測到'}")
+    wait_for_revalidation()
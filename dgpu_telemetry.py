@@ -0,0 +1,159 @@
+import sys
+import time
+from typing import List, Dict, Any, Optional
+
+from get_dgpu_usage import NvidiaSmiStream, query_all_gpus
+
+try:
+    import pynvml  # pip install nvidia-ml-py
+except ImportError:
+    pynvml = None
+
+
+# ============================================================
+# 🚀 dGPU 遙測：NVML 常駐 handle，失敗時改用串流 nvidia-smi
+# ============================================================
+
+class DGpuTelemetry:
+    """
+    一次呼叫取得所有 NVIDIA GPU 的使用率、VRAM、功耗與時脈。
+
+    參數：
+        nvml (module, optional): NVML 模組 (預設 pynvml)；測試時可傳入假的 shim
+        interval_ms (int): 改用 nvidia-smi 串流時的取樣間隔
+        smi_cmd (list, optional): nvidia-smi 執行指令 (測試時可換成替身腳本)
+        max_age (float, optional): 串流樣本的最長有效秒數 (預設 max(2 秒, 4 個取樣間隔))；
+            串流停止輸出 (例如程序卡住或重新啟動中) 時改用單次 nvidia-smi 查詢，
+            不會一直回報最後一筆樣本
+
+    sample() 回傳：
+        [{"index": 0, "name": "...", "utilization": 35.0,
+          "memory_used_MB": ..., "memory_free_MB": ..., "memory_total_MB": ...,
+          "power_W": ..., "sm_clock_MHz": ..., "mem_clock_MHz": ...,
+          "timestamp": time.time() 取樣時間}, ...]
+    """
+
+    def __init__(self, nvml=None, interval_ms: int = 500, smi_cmd: Optional[List[str]] = None,
+                 max_age: Optional[float] = None):
+        self.nvml = nvml if nvml is not None else pynvml
+        self.interval_ms = interval_ms
+        self.smi_cmd = smi_cmd
+        self.max_age = max_age if max_age is not None else max(2.0, 4 * interval_ms / 1000.0)
+        self.backend: Optional[str] = None
+        self._handles: List[Any] = []
+        self._names: List[str] = []
+        self._stream: Optional[NvidiaSmiStream] = None
+
+    def open(self) -> "DGpuTelemetry":
+        """初始化 NVML 並快取所有 GPU handle；NVML 無法載入時啟動 nvidia-smi 串流。"""
+        if self.backend is not None:
+            return self
+
+        if self.nvml is not None:
+            try:
+                self.nvml.nvmlInit()
+                count = self.nvml.nvmlDeviceGetCount()
+                self._handles = [self.nvml.nvmlDeviceGetHandleByIndex(i) for i in range(count)]
+                self._names = [self._decode(self.nvml.nvmlDeviceGetName(h)) for h in self._handles]
+                self.backend = "nvml"
+                return self
+            except Exception as e:
+                print(f"⚠️ 無法載入 NVML，改用 nvidia-smi 串流: {e}", file=sys.stderr)
+
+        try:
+            self._stream = NvidiaSmiStream(self.interval_ms, cmd=self.smi_cmd).start()
+            self.backend = "nvidia-smi"
+        except FileNotFoundError:
+            print("❌ 錯誤: 找不到 'nvidia-smi' 命令，請確認 NVIDIA 驅動已安裝。", file=sys.stderr)
+            self.backend = "none"
+        return self
+
+    def close(self) -> None:
+        if self.backend == "nvml":
+            try:
+                self.nvml.nvmlShutdown()
+            except Exception:
+                pass
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+        self._handles = []
+        self.backend = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @staticmethod
+    def _decode(name) -> str:
+        return name.decode("utf-8", "ignore") if isinstance(name, bytes) else str(name)
+
+    def _nvml_value(self, func, *args, default=0.0):
+        try:
+            return func(*args)
+        except Exception:
+            return default  # 例如 NVML_ERROR_NOT_SUPPORTED
+
+    def sample(self) -> List[Dict[str, Any]]:
+        """回傳所有 GPU 的最新樣本。"""
+        if self.backend is None:
+            self.open()
+        if self.backend == "none":
+            return []
+        if self.backend != "nvml":
+            return self._sample_stream()
+
+        nvml = self.nvml
+        mb = 1024 * 1024
+        now = time.time()
+        results = []
+        for index, handle in enumerate(self._handles):
+            util = self._nvml_value(nvml.nvmlDeviceGetUtilizationRates, handle, default=None)
+            mem = self._nvml_value(nvml.nvmlDeviceGetMemoryInfo, handle, default=None)
+            power_mw = self._nvml_value(nvml.nvmlDeviceGetPowerUsage, handle)
+            sm_clock = self._nvml_value(nvml.nvmlDeviceGetClockInfo, handle, nvml.NVML_CLOCK_SM)
+            mem_clock = self._nvml_value(nvml.nvmlDeviceGetClockInfo, handle, nvml.NVML_CLOCK_MEM)
+
+            results.append({
+                "index": index,
+                "name": self._names[index],
+                "utilization": float(util.gpu) if util is not None else 0.0,
+                "memory_used_MB": mem.used / mb if mem is not None else 0.0,
+                "memory_free_MB": mem.free / mb if mem is not None else 0.0,
+                "memory_total_MB": mem.total / mb if mem is not None else 0.0,
+                "power_W": power_mw / 1000.0,
+                "sm_clock_MHz": float(sm_clock),
+                "mem_clock_MHz": float(mem_clock),
+                "timestamp": now,
+            })
+        return results
+
+    def _sample_stream(self) -> List[Dict[str, Any]]:
+        samples = self._stream.latest(max_age=self.max_age)
+        if samples:
+            return samples
+        # 串流還沒有輸出或已過期 → 單次查詢 (失敗時為空 list，呼叫端視為無資料)
+        now = time.time()
+        return [dict(record, timestamp=now) for record in query_all_gpus(self._stream.cmd)]
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    with DGpuTelemetry() as telemetry:
+        print(f"🔌 後端: {telemetry.backend}")
+        time.sleep(1)
+        while True:
+            start = time.perf_counter()
+            gpus = telemetry.sample()
+            elapsed = time.perf_counter() - start
+            for g in gpus:
+                print(f"💾 GPU{g['index']} {g['name']} | 使用率: {g['utilization']:5.1f}% | "
+                      f"VRAM: {g['memory_used_MB']:.0f}/{g['memory_total_MB']:.0f} MB | "
+                      f"{g['power_W']:.1f} W | SM {g['sm_clock_MHz']:.0f} MHz")
+            print(f"⏱️ 取樣耗時: {elapsed * 1000:.3f} ms\n")
+            time.sleep(1)
@@ -16,11 +16,13 @@
 
 import argparse
 import os
+import sys
 import jinja2
 import json
 import shutil
 import tempfile
 from pathlib import Path
+from config_store import ConfigStore
 
 def add_common_arguments(parser):
     parser.add_argument('--model_repository_path', required=False, default='models', help='Where the model should be exported to', dest='model_repository_path')
@@ -31,6 +33,7 @@ def add_common_arguments(parser):
     parser.add_argument('--overwrite_models', default=False, action='store_true', help='Overwrite the model if it already exists in the models repository', dest='overwrite_models')
     parser.add_argument('--target_device', default="CPU", help='CPU, GPU, NPU or HETERO, default is CPU', dest='target_device')
     parser.add_argument('--ov_cache_dir', default=None, help='Folder path for compilation cache to speedup initialization time', dest='ov_cache_dir')
+    parser.add_argument('--content_store', default=None, help='Content-addressed store folder (e.g. models/.blobs). Exported files identical to ones already stored are replaced with hardlinks', dest='content_store')
     parser.add_argument('--extra_quantization_params', required=False, help='Add advanced quantization parameters. Check optimum-intel documentation. Example: "--sym --group-size -1 --ratio 1.0 --awq --scale-estimation --dataset wikitext2"', dest='extra_quantization_params')
 
 parser = argparse.ArgumentParser(description='Export Hugging face models to OVMS models repository including all configuration for deployments')
@@ -92,6 +95,24 @@ parser_image_generation.add_argument('--default_resolution', default="", help='D
 parser_image_generation.add_argument('--max_num_images_per_prompt', type=int, default=0, help='Max allowed number of images client is allowed to request for a given prompt', dest='max_num_images_per_prompt')
 parser_image_generation.add_argument('--default_num_inference_steps', type=int, default=0, help='Default number of inference steps when not specified by client', dest='default_num_inference_steps')
 parser_image_generation.add_argument('--max_num_inference_steps', type=int, default=0, help='Max allowed number of inference steps client is allowed to request for a given prompt', dest='max_num_inference_steps')
+
+parser_warm_cache = subparsers.add_parser('warm_cache', help='precompile exported models for target devices into the OpenVINO cache directory and record them in a blob manifest')
+parser_warm_cache.add_argument('--config_file_path', default='config.json', help='path to the config file listing the exported servables', dest='config_file_path')
+parser_warm_cache.add_argument('--model_name', action='append', default=None, help='servable to precompile; repeatable. All servables from the config file by default', dest='model_name')
+parser_warm_cache.add_argument('--target_devices', nargs='+', default=None, help='CPU, GPU and/or NPU. Device from the servable graph.pbtxt by default', dest='target_devices')
+parser_warm_cache.add_argument('--ov_cache_dir', required=True, help='Folder path for compilation cache; the same path passed as --ov_cache_dir during export', dest='ov_cache_dir')
+parser_warm_cache.add_argument('--force', action='store_true', help='Recompile even if the manifest has a valid blob', dest='force')
+
+parser_batch = subparsers.add_parser('batch', help='run many exports from a JSON manifest in parallel, resumable, with a single config file update at the end')
+parser_batch.add_argument('--manifest', required=True, help='JSON file with model_repository_path, config_file_path and a list of exports', dest='manifest')
+parser_batch.add_argument('--max_workers', type=int, default=None, help='Maximum parallel exports. Number of CPU cores by default', dest='max_workers')
+parser_batch.add_argument('--ram_budget_GB', type=float, default=None, help='Memory budget shared by running exports. 80%% of available RAM by default', dest='ram_budget_GB')
+parser_batch.add_argument('--converter', default=None, help='Command used for each export instead of this script, e.g. a stub for testing', dest='converter')
+
+parser_gc = subparsers.add_parser('gc', help='remove blobs from the content store that no model folder uses anymore')
+parser_gc.add_argument('--model_repository_path', required=False, default='models', help='Models repository; the store defaults to <model_repository_path>/.blobs', dest='model_repository_path')
+parser_gc.add_argument('--content_store', default=None, help='Content-addressed store folder', dest='content_store')
+parser_gc.add_argument('--dry_run', action='store_true', help='Only list orphaned blobs', dest='dry_run')
 args = vars(parser.parse_args())
 
 embedding_graph_template = """input_stream: "REQUEST_PAYLOAD:input"
@@ -365,22 +386,9 @@ def add_servable_to_config(config_path, mediapipe_name, base_path):
     print(config_path, mediapipe_name, base_path)
     if not os.path.isfile(config_path):
         print("Creating new config file")
-        with open(config_path, 'w') as config_file:
-            json.dump({'mediapipe_config_list': [], "model_config_list": []}, config_file, indent=4)
-    with open(config_path, 'r') as config_file:
-        config_data = json.load(config_file)
-        if 'mediapipe_config_list' not in config_data:
-            config_data['mediapipe_config_list'] = []
-        mp_list = config_data['mediapipe_config_list']
-        updated = False
-        for mp_config in mp_list:
-            if mp_config['name'] == mediapipe_name:
-                mp_config['base_path'] = base_path
-                updated = True
-        if not updated:
-            mp_list.append({'name': mediapipe_name, 'base_path': base_path})
-    with open(config_path, 'w') as config_file:
-        json.dump(config_data, config_file, indent=4)
+    # locked read-modify-write with an atomic replace, so concurrent exports do not lose entries
+    # and OVMS never reads a partially written file
+    ConfigStore(config_path).add_servable(mediapipe_name, base_path)
     print("Added servable to config file", config_path)
 
 def export_text_generation_model(model_repository_path, source_model, model_name, precision, task_parameters, config_file_path):
@@ -635,6 +643,22 @@ def export_image_generation_model(model_repository_path, source_model, model_nam
     add_servable_to_config(config_file_path, model_name, os.path.relpath( os.path.join(model_repository_path, model_name), os.path.dirname(config_file_path)))
 
 
+if args['task'] == 'warm_cache':
+    from blob_cache import warm_cache, servables_from_config
+    warm_cache(servables_from_config(args['config_file_path'], args['model_name']), args['target_devices'], args['ov_cache_dir'], force=args['force'])
+    sys.exit(0)
+
+if args['task'] == 'gc':
+    from model_store import ContentStore, default_store
+    ContentStore(args['content_store'] or default_store(args['model_repository_path'])).gc(args['dry_run'])
+    sys.exit(0)
+
+if args['task'] == 'batch':
+    import shlex
+    from batch_export import run_batch
+    result = run_batch(args['manifest'], args['max_workers'], args['ram_budget_GB'], shlex.split(args['converter']) if args['converter'] else None)
+    sys.exit(1 if result['failed'] else 0)
+
 if not os.path.isdir(args['model_repository_path']):
     raise ValueError(f"The model repository path '{args['model_repository_path']}' is not a valid directory.")
 if args['source_model'] is None:
@@ -655,9 +679,15 @@ if args['task'] == 'text_generation':
 if args['extra_quantization_params'] is None:
     args['extra_quantization_params'] = ""
 
-template_parameters = {k: v for k, v in args.items() if k not in ['model_repository_path', 'source_model', 'model_name', 'precision', 'version', 'config_file_path', 'overwrite_models']}
+template_parameters = {k: v for k, v in args.items() if k not in ['model_repository_path', 'source_model', 'model_name', 'precision', 'version', 'config_file_path', 'overwrite_models', 'content_store']}
 print("template params:", template_parameters)
 
+### Files shared through the content store must not be rewritten in place by a re-export
+model_folder = os.path.join(args['model_repository_path'], args['model_name'])
+if args['overwrite_models'] and os.path.isdir(model_folder):
+    from model_store import unshare_links
+    unshare_links(model_folder)
+
 if args['task'] == 'text_generation':
     export_text_generation_model(args['model_repository_path'], args['source_model'], args['model_name'], args['precision'], template_parameters, args['config_file_path'])
 
@@ -688,3 +718,8 @@ elif args['task'] == 'image_generation':
         'extra_quantization_params'
     ]}
     export_image_generation_model(args['model_repository_path'], args['source_model'], args['model_name'], args['precision'], template_parameters, args['config_file_path'], args['num_streams'])
+
+if args['content_store'] is not None:
+    from model_store import ContentStore
+    stats = ContentStore(args['content_store']).dedup(model_folder)
+    print("Deduplicated {} files into {}, saved {:.1f} MB".format(stats['linked'], args['content_store'], stats['saved_MB']))
@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import math
+import argparse
+
+# ============================================================
+# 🎭 nvidia-smi 替身 (測試用)
+# ============================================================
+# 只支援 --query-gpu=... --format=csv[,noheader][,nounits] [-lms N | --loop-ms=N]
+#
+# 使用方式：
+#   set NVIDIA_SMI=python fake_nvidia_smi.py
+#   python get_dgpu_usage.py
+#
+# 腳本化輸出：環境變數 FAKE_NVIDIA_SMI_SCRIPT 指向 JSON 檔，內容為「幀」的 list，
+# 每一幀是各 GPU 欄位值的 list，例如：
+#   [[{"utilization.gpu": 10, "memory.used": 2048}], [{"utilization.gpu": 90}]]
+# 每次輸出依序取一幀，最後一幀會重複使用。未提供腳本時輸出合成數值。
+# FAKE_NVIDIA_SMI_GPUS 指定合成 GPU 數量 (預設 1)。
+# FAKE_NVIDIA_SMI_EXIT_AFTER 指定輸出幾幀後結束 (模擬程序崩潰)。
+
+TOTAL_MB = 16384.0
+
+
+def synthetic_gpu(index: int, tick: int) -> dict:
+    util = 50.0 + 40.0 * math.sin(tick / 5.0 + index)
+    used = 2048.0 + 1024.0 * index
+    return {
+        "index": index,
+        "name": f"NVIDIA Fake GPU {index}",
+        "utilization.gpu": round(util),
+        "memory.used": used,
+        "memory.free": TOTAL_MB - used,
+        "memory.total": TOTAL_MB,
+        "power.draw": round(80.0 + util, 2),
+        "clocks.sm": 1800,
+        "clocks.mem": 9000,
+    }
+
+
+def load_script():
+    path = os.environ.get("FAKE_NVIDIA_SMI_SCRIPT")
+    if not path:
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def frame(tick: int, script, num_gpus: int):
+    if script:
+        gpus = script[min(tick, len(script) - 1)]
+        merged = []
+        for i, gpu in enumerate(gpus):
+            base = synthetic_gpu(i, tick)
+            base.update(gpu)
+            if ("memory.used" in gpu or "memory.total" in gpu) and "memory.free" not in gpu:
+                base["memory.free"] = base["memory.total"] - base["memory.used"]
+            merged.append(base)
+        return merged
+    return [synthetic_gpu(i, tick) for i in range(num_gpus)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--query-gpu", dest="query", required=True)
+    parser.add_argument("--format", dest="fmt", default="csv")
+    parser.add_argument("-lms", "--loop-ms", dest="loop_ms", type=int, default=0)
+    args = parser.parse_args()
+
+    fields = [f.strip() for f in args.query.split(",")]
+    fmt = args.fmt.split(",")
+    script = load_script()
+    num_gpus = int(os.environ.get("FAKE_NVIDIA_SMI_GPUS", "1"))
+    exit_after = int(os.environ.get("FAKE_NVIDIA_SMI_EXIT_AFTER", "0"))
+
+    if "noheader" not in fmt:
+        print(", ".join(fields))
+
+    tick = 0
+    while True:
+        for gpu in frame(tick, script, num_gpus):
+            print(", ".join(str(gpu.get(f, "[N/A]")) for f in fields))
+        sys.stdout.flush()
+        tick += 1
+
+        if args.loop_ms <= 0 or (exit_after and tick >= exit_after):
+            break
+        time.sleep(args.loop_ms / 1000.0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# ============================================================
+# 🎭 假的 OVMS (測試用)
+# ============================================================
+# 模擬 OpenVINO Model Server 的 OpenAI 相容端點，依固定時程輸出 token：
+#   POST /v3/chat/completions   (stream: true → SSE；否則一次回傳並附 usage)
+#   POST /v1/chat/completions   (同上，Ollama 的 OpenAI 相容路徑)
+#   GET  /v2                    (KServe server metadata，含 version)
+#   GET  /v2/health/ready
+#   GET  /v2/models/{name}/ready  (載入中回傳 503)
+#   GET  /v1/config               (各模型狀態 AVAILABLE / LOADING)
+#   POST /v1/config/reload        (重新讀取 config.json，等待新模型載入完成)
+#   POST /api/generate、GET /api/ps (Ollama 的預熱 / 卸載與已載入模型清單)
+#
+# 指定 --config 時只有 config.json 中的模型可用，新加入的模型需經過 --load-time 秒才就緒。
+#
+# 使用方式：
+#   python fake_ovms.py --port 8000 --ttft 0.2 --itl 0.02
+#   python fake_ovms.py --port 8001 --model Qwen3-8B-int4-cw-ov=0.5:0.05
+#   python fake_ovms.py --port 8000 --config config.json --load-time 3
+
+DEFAULT_MODELS = ["Qwen3-8B-int4-ov", "Qwen3-8B-int4-cw-ov", "Qwen3-4B-int4-ov", "Qwen3-4B-int4-cw-ov"]
+
+
+class FakeOVMS:
+    """
+    假 OVMS 伺服器設定。
+
+    參數：
+        ttft (float): 第一個 token 之前的延遲 (秒，模擬 prefill)
+        itl (float): 每個 token 之間的間隔 (秒，模擬 decode)
+        models (dict): {模型名稱: (ttft, itl)}，未列出的模型回傳 404
+        max_tokens (int): 單次請求最多輸出的 token 數
+        slots (int, optional): 同時生成的請求上限 (模擬 continuous batching 容量)，
+            超過的請求排隊等待；None 表示不限
+        config_path (str, optional): 模擬 OVMS 的 config.json；指定時只有其中的模型會載入
+        load_time (float 或 dict): 模型載入 (編譯) 秒數，dict 時為 {模型名稱: 秒數}
+    """
+
+    def __init__(self, ttft=0.2, itl=0.02, models=None, max_tokens=512, version="2025.3-fake", slots=None,
+                 config_path=None, load_time=0.0):
+        self.ttft = ttft
+        self.itl = itl
+        self.models = models if models is not None else {m: (ttft, itl) for m in DEFAULT_MODELS}
+        self.max_tokens = max_tokens
+        self.version = version
+        self.requests_served = 0
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(slots) if slots else None
+        self.config_path = config_path
+        self.load_time = load_time
+        # 模型名稱 → 就緒時間 (monotonic)；None 表示不模擬載入，所有模型都可用
+        self.loaded = None
+        if config_path:
+            self.loaded = {}
+            self.reload()
+
+    def _name(self, model):
+        # 接受含組織前綴的名稱 ("OpenVINO/Qwen3-4B-int4-ov")
+        return model if model in self.models else model.split("/")[-1]
+
+    def timing(self, model):
+        return self.models.get(self._name(model))
+
+    def _load_seconds(self, name):
+        if isinstance(self.load_time, dict):
+            return self.load_time.get(name, 0.0)
+        return self.load_time
+
+    def reload(self):
+        """重新讀取 config.json：新模型開始載入、移除的模型卸載。回傳最晚就緒時間。"""
+        with open(self.config_path, "r", encoding="utf-8") as f:
+            config = json.load(f)
+        names = [item.get("config", item)["name"]
+                 for key in ("mediapipe_config_list", "model_config_list") for item in config.get(key, [])]
+        now = time.monotonic()
+        with self.lock:
+            for name in names:
+                self.models.setdefault(name, (self.ttft, self.itl))
+                if name not in self.loaded:
+                    self.loaded[name] = now + self._load_seconds(name)
+            for name in list(self.loaded):
+                if name not in names:
+                    del self.loaded[name]
+            return max(self.loaded.values(), default=now)
+
+    def load(self, model):
+        """直接載入單一模型 (Ollama 式預熱)，回傳就緒時間。"""
+        name = self._name(model)
+        with self.lock:
+            self.models.setdefault(name, (self.ttft, self.itl))
+            if self.loaded is None:
+                return time.monotonic()
+            if name not in self.loaded:
+                self.loaded[name] = time.monotonic() + self._load_seconds(name)
+            return self.loaded[name]
+
+    def unload(self, model):
+        with self.lock:
+            if self.loaded is not None:
+                self.loaded.pop(self._name(model), None)
+
+    def model_state(self, model):
+        """回傳 "AVAILABLE"、"LOADING" 或 None (未載入)。"""
+        name = self._name(model)
+        if name not in self.models:
+            return None
+        if self.loaded is None:
+            return "AVAILABLE"
+        ready_at = self.loaded.get(name)
+        if ready_at is None:
+            return None
+        return "AVAILABLE" if time.monotonic() >= ready_at else "LOADING"
+
+
+def make_handler(state: FakeOVMS):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send_json(self, status, obj):
+            body = json.dumps(obj).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _write_chunk(self, data: bytes):
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            if self.path == "/v2":
+                self._send_json(200, {"name": "OpenVINO Model Server", "version": state.version})
+            elif self.path in ("/v2/health/ready", "/v2/health/live"):
+                self._send_json(200, {})
+            elif self.path.startswith("/v2/models/") and self.path.endswith("/ready"):
+                status = state.model_state(self.path[len("/v2/models/"):-len("/ready")])
+                self._send_json({"AVAILABLE": 200, "LOADING": 503}.get(status, 404), {})
+            elif self.path == "/v1/config":
+                self._send_json(200, {name: {"model_version_status": [{"version": "1", "state": state.model_state(name)}]}
+                                      for name in state.models if state.model_state(name)})
+            elif self.path == "/api/ps":
+                self._send_json(200, {"models": [{"name": name} for name in state.models
+                                                 if state.model_state(name) == "AVAILABLE"]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._send_json(400, {"error": "invalid json"})
+                return
+
+            if self.path == "/v1/config/reload":
+                if not state.config_path:
+                    self._send_json(400, {"error": "server started without config file"})
+                    return
+                # 與 OVMS 相同：等新模型載入完成才回應
+                ready_at = state.reload()
+                time.sleep(max(0.0, ready_at - time.monotonic()))
+                self._send_json(200, {})
+                return
+
+            if self.path == "/api/generate":
+                # Ollama：沒有 prompt 時只載入模型；keep_alive=0 卸載
+                model = payload.get("model", "")
+                if payload.get("keep_alive") in (0, "0", "0s"):
+                    state.unload(model)
+                else:
+                    time.sleep(max(0.0, state.load(model) - time.monotonic()))
+                self._send_json(200, {"model": model, "response": "", "done": True})
+                return
+
+            # /v1/chat/completions：Ollama 的 OpenAI 相容端點 (模擬 dGPU 上游)
+            if self.path not in ("/v3/chat/completions", "/v1/chat/completions"):
+                self._send_json(404, {"error": "not found"})
+                return
+
+            model = payload.get("model", "")
+            timing = state.timing(model)
+            status = state.model_state(model)
+            if timing is None or status is None:
+                self._send_json(404, {"error": f"Model with requested name is not found: {model}"})
+                return
+            if status == "LOADING":
+                self._send_json(503, {"error": f"Model {model} is loading"})
+                return
+            ttft, itl = timing
+            n_tokens = int(payload.get("max_tokens") or payload.get("max_new_tokens") or 16)
+            n_tokens = max(1, min(n_tokens, state.max_tokens))
+            with state.lock:
+                state.requests_served += 1
+
+            if state.slots is not None:
+                state.slots.acquire()
+            try:
+                self._generate(payload, model, n_tokens, ttft, itl)
+            finally:
+                if state.slots is not None:
+                    state.slots.release()
+
+        def _generate(self, payload, model, n_tokens, ttft, itl):
+            if payload.get("stream"):
+                self._stream(model, n_tokens, ttft, itl)
+            else:
+                time.sleep(ttft + itl * (n_tokens - 1))
+                self._send_json(200, {
+                    "object": "chat.completion",
+                    "model": model,
+                    "choices": [{"index": 0, "finish_reason": "length",
+                                 "message": {"role": "assistant", "content": "tok " * n_tokens}}],
+                    "usage": {"prompt_tokens": 8, "completion_tokens": n_tokens, "total_tokens": 8 + n_tokens},
+                })
+
+        def _stream(self, model, n_tokens, ttft, itl):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            time.sleep(ttft)
+            for i in range(n_tokens):
+                if i:
+                    time.sleep(itl)
+                chunk = {"object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": "tok "},
+                                      "finish_reason": "length" if i == n_tokens - 1 else None}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            usage = {"object": "chat.completion.chunk", "model": model, "choices": [],
+                     "usage": {"prompt_tokens": 8, "completion_tokens": n_tokens, "total_tokens": 8 + n_tokens}}
+            self._write_chunk(f"data: {json.dumps(usage)}\n\n".encode("utf-8"))
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+
+    return Handler
+
+
+class _Server(ThreadingHTTPServer):
+    request_queue_size = 256   # 併發壓測時避免 listen backlog 滿而重送 SYN
+    daemon_threads = True
+
+
+def serve(port=8000, state=None, host="127.0.0.1", background=False):
+    """啟動假 OVMS；background=True 時在背景執行緒執行並回傳 server (測試用)。"""
+    state = state or FakeOVMS()
+    server = _Server((host, port), make_handler(state))
+    server.state = state
+    if background:
+        threading.Thread(target=server.serve_forever, name=f"fake-ovms-{port}", daemon=True).start()
+        return server
+    print(f"🎭 Fake OVMS listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OVMS for benchmark/router testing")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--ttft", type=float, default=0.2, help="time to first token (s)")
+    parser.add_argument("--itl", type=float, default=0.02, help="inter-token latency (s)")
+    parser.add_argument("--slots", type=int, default=None, help="max concurrent generations (queue the rest)")
+    parser.add_argument("--config", default=None, help="config.json to serve (enables load/reload simulation)")
+    parser.add_argument("--load-time", type=float, default=0.0, help="seconds to load a model added to the config")
+    parser.add_argument("--model", action="append", default=[],
+                        help="model name, optionally NAME=TTFT:ITL; repeatable (default: Qwen3 models)")
+    args = parser.parse_args()
+
+    models = None
+    if args.model:
+        models = {}
+        for spec in args.model:
+            name, _, timing = spec.partition("=")
+            if timing:
+                ttft, itl = (float(x) for x in timing.split(":"))
+            else:
+                ttft, itl = args.ttft, args.itl
+            models[name] = (ttft, itl)
+
+    serve(args.port, FakeOVMS(args.ttft, args.itl, models, slots=args.slots,
+                              config_path=args.config, load_time=args.load_time))
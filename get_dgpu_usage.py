@@ -1,5 +1,30 @@
+import os
+import time
+import shlex
+import threading
 import subprocess
-from typing import Optional
+from typing import Optional, List, Dict, Any
+
+# 可用環境變數 NVIDIA_SMI 改用其他執行檔 (例如 "python fake_nvidia_smi.py")
+NVIDIA_SMI = os.environ.get("NVIDIA_SMI", "nvidia-smi")
+
+# 一次查詢所有 GPU 的所有欄位
+QUERY_FIELDS = [
+    "index", "name", "utilization.gpu",
+    "memory.used", "memory.free", "memory.total",
+    "power.draw", "clocks.sm", "clocks.mem",
+]
+_FIELD_KEYS = {
+    "index": "index",
+    "name": "name",
+    "utilization.gpu": "utilization",
+    "memory.used": "memory_used_MB",
+    "memory.free": "memory_free_MB",
+    "memory.total": "memory_total_MB",
+    "power.draw": "power_W",
+    "clocks.sm": "sm_clock_MHz",
+    "clocks.mem": "mem_clock_MHz",
+}
 
 def get_dgpu_utilization_nvidia_smi() -> float:
     """
@@ -23,7 +48,7 @@ def get_dgpu_utilization_nvidia_smi() -> float:
             # 無輸出代表系統無 GPU 或無法存取
             return 0.0
 
-        # 支援多 GPU 時僅取第一張卡
+        # 只取第一張卡 (舊介面)；多 GPU 請用 get_dgpu_utilization_all() / query_all_gpus()
         first_line = output.splitlines()[0].strip()
         return float(first_line) if first_line else 0.0
 
@@ -53,8 +78,7 @@ def run_cmd(cmd):
         return str(err)
 def get_dgpu_vram():
     """
-    取得 NVIDIA dGPU VRAM 使用量與剩餘容量 (MB)
-    回傳: (used_vram_mb, free_vram_mb, total_vram_mb)
+    取得第一張 NVIDIA dGPU 的剩餘 VRAM (GB)；多 GPU 請用 get_dgpu_vram_all()
     """
     try:
         cmd = [
@@ -70,10 +94,195 @@ def get_dgpu_vram():
     except Exception as e:
         return 0.0
 
+def nvidia_smi_cmd() -> List[str]:
+    """回傳 nvidia-smi 執行指令 (支援 NVIDIA_SMI 環境變數)。"""
+    return shlex.split(NVIDIA_SMI)
+
+
+def parse_query_line(line: str, fields: List[str] = QUERY_FIELDS) -> Optional[Dict[str, Any]]:
+    """
+    解析一行 `nvidia-smi --query-gpu=... --format=csv,noheader,nounits` 輸出。
+
+    回傳: {"index": 0, "name": "...", "utilization": 35.0, "memory_used_MB": ..., ...}
+          無法解析時回傳 None (例如標頭行)
+    """
+    values = [v.strip() for v in line.strip().split(",")]
+    if len(values) != len(fields):
+        return None
+
+    record: Dict[str, Any] = {}
+    for field, value in zip(fields, values):
+        key = _FIELD_KEYS.get(field, field)
+        if field == "name":
+            record[key] = value
+            continue
+        try:
+            number = float(value)
+        except ValueError:
+            if field == "index":
+                return None
+            number = 0.0  # "[N/A]"、"[Not Supported]"
+        record[key] = int(number) if field == "index" else number
+    return record
+
+
+def query_all_gpus(cmd: Optional[List[str]] = None, fields: List[str] = QUERY_FIELDS,
+                   timeout: float = 5.0) -> List[Dict[str, Any]]:
+    """
+    單次執行 nvidia-smi，回傳每張 GPU 的樣本 (依 index 排序)；失敗時回傳空 list。
+
+    參數：
+        cmd (list, optional): nvidia-smi 執行指令 (預設 nvidia_smi_cmd()，測試時可換成 fake_nvidia_smi.py)
+    """
+    try:
+        result = subprocess.run(
+            (cmd if cmd is not None else nvidia_smi_cmd()) +
+            ["--query-gpu=" + ",".join(fields), "--format=csv,noheader,nounits"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            check=True,
+            timeout=timeout,
+        )
+    except FileNotFoundError:
+        print("❌ 錯誤: 找不到 'nvidia-smi' 命令，請確認 NVIDIA 驅動已安裝。")
+        return []
+    except subprocess.CalledProcessError as e:
+        print(f"❌ 錯誤: 執行 nvidia-smi 失敗。訊息: {e.stderr.strip() or '未知錯誤'}")
+        return []
+    except subprocess.TimeoutExpired:
+        print("⚠️ nvidia-smi 查詢逾時。")
+        return []
+
+    records = [r for r in (parse_query_line(line, fields) for line in result.stdout.splitlines()) if r is not None]
+    return sorted(records, key=lambda r: r.get("index", 0))
+
+
+def get_dgpu_utilization_all(cmd: Optional[List[str]] = None) -> List[float]:
+    """每張 GPU 的核心使用率 (%)，依 index 排序。"""
+    return [r["utilization"] for r in query_all_gpus(cmd)]
+
+
+def get_dgpu_vram_all(cmd: Optional[List[str]] = None) -> List[float]:
+    """每張 GPU 的可用 VRAM (GB)，依 index 排序。"""
+    return [r["memory_free_MB"] / 1024.0 for r in query_all_gpus(cmd)]
+
+
+class NvidiaSmiStream:
+    """
+    持續執行一個 `nvidia-smi --query-gpu=... --loop-ms N` 程序，
+    由背景執行緒解析輸出並保存每張 GPU 的最新樣本 (無 NVML 時使用)。
+
+    - 讀取不需要鎖：背景執行緒每次寫入都建立新的 dict 再整個替換
+      self.samples，讀取端只是一次屬性存取。
+    - 每筆樣本附帶 "timestamp" (time.time())，可用 max_age 過濾過期資料。
+    - nvidia-smi 程序意外結束時自動重新啟動 (退避最多 restart_max_delay 秒)。
+    """
+
+    def __init__(self, interval_ms: int = 500, fields: List[str] = QUERY_FIELDS, cmd: Optional[List[str]] = None,
+                 restart_delay: float = 0.5, restart_max_delay: float = 10.0):
+        self.interval_ms = interval_ms
+        self.fields = fields
+        self.cmd = cmd if cmd is not None else nvidia_smi_cmd()
+        self.restart_delay = restart_delay
+        self.restart_max_delay = restart_max_delay
+        self.proc: Optional[subprocess.Popen] = None
+        self.samples: Dict[int, Dict[str, Any]] = {}
+        self.restarts = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _spawn(self) -> subprocess.Popen:
+        return subprocess.Popen(
+            self.cmd + [
+                "--query-gpu=" + ",".join(self.fields),
+                "--format=csv,noheader,nounits",
+                "--loop-ms", str(self.interval_ms),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+            bufsize=1,
+        )
+
+    def start(self) -> "NvidiaSmiStream":
+        """啟動 nvidia-smi (找不到執行檔時直接拋出 FileNotFoundError)。"""
+        self._stop.clear()
+        self.proc = self._spawn()
+        self._thread = threading.Thread(target=self._run, name="nvidia-smi-stream", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        delay = self.restart_delay
+        while not self._stop.is_set():
+            proc = self.proc
+            got_output = False
+            for line in proc.stdout:
+                record = parse_query_line(line, self.fields)
+                if record is None:
+                    continue
+                record["timestamp"] = time.time()
+                samples = dict(self.samples)
+                samples[record.get("index", 0)] = record
+                self.samples = samples
+                got_output = True
+
+            if self._stop.is_set():
+                break
+
+            # 程序結束 (崩潰或被終止) → 退避後重新啟動
+            proc.wait()
+            delay = self.restart_delay if got_output else min(delay * 2, self.restart_max_delay)
+            print(f"⚠️ nvidia-smi 串流已結束 (code={proc.returncode})，{delay:.1f} 秒後重新啟動")
+            if self._stop.wait(delay):
+                break
+            try:
+                self.proc = self._spawn()
+                self.restarts += 1
+            except OSError as e:
+                print(f"❌ 錯誤: 無法重新啟動 nvidia-smi: {e}")
+                delay = min(delay * 2, self.restart_max_delay)
+
+    def latest(self, max_age: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        回傳每張 GPU 的最新樣本 (依 index 排序)。
+
+        參數：
+            max_age (float, optional): 只回傳 max_age 秒內的樣本
+        """
+        samples = self.samples
+        now = time.time()
+        return [
+            samples[i] for i in sorted(samples)
+            if max_age is None or now - samples[i]["timestamp"] <= max_age
+        ]
+
+    def age(self, index: int = 0) -> float:
+        """指定 GPU 最新樣本距今的秒數 (無資料時為 inf)。"""
+        sample = self.samples.get(index)
+        return time.time() - sample["timestamp"] if sample else float("inf")
+
+    def stop(self) -> None:
+        self._stop.set()
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            proc.terminate()
+            try:
+                proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        if self._thread is not None:
+            self._thread.join(timeout=3)
+            self._thread = None
+        self.proc = None
+
+
 # 範例調用 (Example Call)
 if __name__ == "__main__":
-    dgpu_util = get_dgpu_utilization_nvidia_smi()
-    dgpu_memory = get_dgpu_vram()
-    used_vram, free_vram, total_vram = dgpu_memory
-    print(f"💾 NVIDIA dGPU VRAM 使用量: {used_vram:.2f} MB / {total_vram:.2f} MB (剩餘: {free_vram:.2f} MB)")
-    print(f"🚀 NVIDIA dGPU 核心使用率 (GPU-Util): {dgpu_util:.2f}%")
+    for gpu in query_all_gpus():
+        print(f"💾 GPU {gpu['index']} {gpu['name']} VRAM 使用量: {gpu['memory_used_MB']:.2f} MB / "
+              f"{gpu['memory_total_MB']:.2f} MB (剩餘: {gpu['memory_free_MB']:.2f} MB)")
+        print(f"🚀 GPU {gpu['index']} 核心使用率 (GPU-Util): {gpu['utilization']:.2f}%")
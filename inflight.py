@@ -0,0 +1,184 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from throughput_model import DEFAULT_TPS, ThroughputCurves, candidate_pairs
+
+
+DEFAULT_TTFT_S = {"dGPU": 0.2, "iGPU": 0.5, "NPU": 0.8}
+
+
+# ============================================================
+# 📥 各 (裝置, 模型) 的進行中請求與剩餘 token 預算
+# ============================================================
+
+class InflightTracker:
+    """
+    由代理 (smart_router) 或用戶端回報請求的開始、進度與結束，
+    即時反映每個 (device, model) 的佇列深度，不必等使用率計數器反應。
+
+    同時記錄已完成請求的實際 tok/s (EWMA)，作為服務速率的估計。
+
+    參數：
+        alpha (float): 觀測 tok/s 的 EWMA 係數
+    """
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._inflight: Dict[Tuple[str, str], int] = {}
+        self._outstanding: Dict[Tuple[str, str], float] = {}
+        self._observed_tps: Dict[Tuple[str, str], float] = {}
+        self._next_id = 0
+        self._listeners: List[Callable[[str, str], None]] = []
+
+    def add_listener(self, callback: Callable[[str, str], None]) -> None:
+        """請求結束時呼叫 callback(device, model)，例如 scheduler.SelectionScheduler.watch_tracker。"""
+        self._listeners.append(callback)
+
+    def begin(self, device: str, model: str, max_tokens: int) -> Dict[str, Any]:
+        """登記新請求，回傳之後 progress / end 使用的 ticket。"""
+        key = (device, model)
+        with self._lock:
+            self._next_id += 1
+            concurrency = self._inflight.get(key, 0) + 1
+            self._inflight[key] = concurrency
+            self._outstanding[key] = self._outstanding.get(key, 0.0) + max_tokens
+        return {"id": self._next_id, "key": key, "budget": float(max_tokens), "done": 0.0,
+                "start": time.perf_counter(), "concurrency": concurrency}
+
+    def progress(self, ticket: Dict[str, Any], tokens: float) -> None:
+        """回報目前已產生的 token 數 (累計值)，剩餘預算隨之減少。"""
+        tokens = min(tokens, ticket["budget"])
+        delta = tokens - ticket["done"]
+        if delta <= 0:
+            return
+        ticket["done"] = tokens
+        with self._lock:
+            self._outstanding[ticket["key"]] = max(0.0, self._outstanding.get(ticket["key"], 0.0) - delta)
+
+    def end(self, ticket: Dict[str, Any], tokens: Optional[float] = None) -> None:
+        """請求結束 (成功或失敗)；tokens 為實際產生數，用來更新觀測 tok/s。"""
+        if ticket.get("ended"):
+            return
+        ticket["ended"] = True
+        key = ticket["key"]
+        elapsed = time.perf_counter() - ticket["start"]
+        with self._lock:
+            self._inflight[key] = max(0, self._inflight.get(key, 0) - 1)
+            remaining = ticket["budget"] - ticket["done"]
+            self._outstanding[key] = max(0.0, self._outstanding.get(key, 0.0) - remaining)
+            if tokens and elapsed > 0:
+                # 每個串流的速率 × 當時併發數 ≈ 裝置總服務速率
+                rate = tokens / elapsed * ticket["concurrency"]
+                prev = self._observed_tps.get(key)
+                self._observed_tps[key] = rate if prev is None else self.alpha * rate + (1 - self.alpha) * prev
+        for callback in self._listeners:
+            callback(*key)
+
+    def inflight(self, device: str, model: str) -> int:
+        return self._inflight.get((device, model), 0)
+
+    def outstanding_tokens(self, device: str, model: str) -> float:
+        return self._outstanding.get((device, model), 0.0)
+
+    def device_load(self, device: str) -> Tuple[int, float]:
+        """同一裝置所有模型合計 (進行中請求數, 剩餘 token)。"""
+        with self._lock:
+            n = sum(v for (d, _), v in self._inflight.items() if d == device)
+            t = sum(v for (d, _), v in self._outstanding.items() if d == device)
+        return n, t
+
+    def observed_tps(self, device: str, model: str) -> Optional[float]:
+        return self._observed_tps.get((device, model))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {f"{d}/{m}": {"inflight": n, "outstanding_tokens": self._outstanding.get((d, m), 0.0),
+                                 "observed_tps": self._observed_tps.get((d, m))}
+                    for (d, m), n in self._inflight.items()}
+
+
+# ============================================================
+# ⏱️ 預估完成時間最短的裝置
+# ============================================================
+
+class FinishTimeSelector:
+    """
+    結合遙測與佇列深度，估計新請求在每個 (device, model) 的完成時間，選最短者：
+
+        ETA = TTFT + (裝置上剩餘 token + 新請求 token) / 服務速率
+
+    服務速率 (tok/s) 依序取自：
+        1. InflightTracker 觀測到的總吞吐量 (已包含目前負載的影響)
+        2. ThroughputCurves 在目前使用率下的預測值
+        3. DEFAULT_TPS × (1 - 使用率)
+
+    select() 參數與 main.select_best_device_and_model 相同，可直接作為 select_fn。
+
+    參數：
+        tracker (InflightTracker): 進行中請求狀態
+        curves (ThroughputCurves, optional): 量測曲線
+        request_tokens (int): 新請求的預設 token 預算 (呼叫端未指定時)
+    """
+
+    def __init__(self, tracker: InflightTracker, curves: Optional[ThroughputCurves] = None,
+                 request_tokens: int = 256, default_tps: Optional[Dict[str, float]] = None,
+                 default_ttft_s: Optional[Dict[str, float]] = None):
+        self.tracker = tracker
+        self.curves = curves
+        self.request_tokens = request_tokens
+        self.default_tps = default_tps or DEFAULT_TPS
+        self.default_ttft_s = default_ttft_s or DEFAULT_TTFT_S
+        self.last_estimates: List[Tuple[str, str, float]] = []
+
+    def service_rate(self, device: str, model: str, loads: Dict[str, float]) -> float:
+        observed = self.tracker.observed_tps(device, model)
+        if observed:
+            return observed
+        if self.curves is not None:
+            predicted = self.curves.predict(model, device, loads)
+            if predicted:
+                return predicted
+        return self.default_tps.get(device, 10.0) * max(0.1, 1.0 - loads.get(device, 0.0) / 100.0)
+
+    def eta(self, device: str, model: str, loads: Dict[str, float], tokens: Optional[int] = None) -> float:
+        _, outstanding = self.tracker.device_load(device)
+        rate = self.service_rate(device, model, loads)
+        return self.default_ttft_s.get(device, 0.5) + (outstanding + (tokens or self.request_tokens)) / rate
+
+    def select(self, devices, igpu_util, npu_util, dgpu_util, dgpu_mem, usage_threshold, model_list, model_vram,
+               tokens: Optional[int] = None) -> Tuple[str, str]:
+        loads = {"iGPU": igpu_util, "NPU": npu_util, "dGPU": dgpu_util}
+        pairs = candidate_pairs(devices, dgpu_mem, model_list, model_vram)
+        if not pairs:
+            return "iGPU", model_list["iGPU"][0]
+        # 每個裝置只比較第一個可用模型 (model_list 的偏好順序)
+        seen, estimates = set(), []
+        for model, device in pairs:
+            if device in seen:
+                continue
+            seen.add(device)
+            estimates.append((device, model, self.eta(device, model, loads, tokens)))
+        self.last_estimates = estimates
+        device, model, _ = min(estimates, key=lambda e: e[2])
+        return device, model
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    tracker = InflightTracker()
+    selector = FinishTimeSelector(tracker)
+    devices = {"dGPU": False, "iGPU": True, "NPU": True}
+    model_list = {"iGPU": ["OpenVINO/Qwen3-8B-int4-ov"], "NPU": ["OpenVINO/Qwen3-8B-int4-cw-ov"]}
+
+    # 模擬突發：使用率還沒反應 (皆為 10%)，但 iGPU 已經排了 3 個請求
+    tickets = [tracker.begin("iGPU", model_list["iGPU"][0], 512) for _ in range(3)]
+    for n in range(5):
+        device, model = selector.select(devices, 10.0, 10.0, 0.0, 0.0, 0.5, model_list, {})
+        print(" | ".join(f"{d} ETA {eta:6.1f}s" for d, _, eta in selector.last_estimates), f"→ {device}")
+        tickets.append(tracker.begin(device, model, 512))
+    print(tracker.snapshot())
@@ -0,0 +1,93 @@
+import sys
+import platform
+import importlib
+import importlib.util
+from types import ModuleType
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+# ============================================================
+# 💤 延遲載入：第一次存取屬性時才真正執行模組
+# ============================================================
+
+def lazy_import(name: str) -> ModuleType:
+    """
+    回傳延遲載入的模組 (importlib.util.LazyLoader)：找得到模組但尚未執行，
+    第一次存取屬性時才載入。已載入過的模組直接回傳；找不到時拋出 ImportError。
+
+        np = lazy_import("numpy")   # 幾乎不花時間
+        np.zeros(3)                 # 此時才真正 import numpy
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# ============================================================
+# 🗂️ 依平台註冊的後端
+# ============================================================
+
+class PlatformRegistry:
+    """
+    以名稱註冊 "模組:屬性"，只在第一次 get() 時 import，並依平台限制可用性
+    (例如 wmi / winreg 只在 Windows 註冊，其他平台連 import 都不會嘗試)。
+
+        registry.register("counter_sampler", "telemetry_daemon:CounterSampler", platforms=("Windows",))
+        CounterSampler = registry.get("counter_sampler")
+
+    參數：
+        system (str, optional): 平台名稱 (platform.system())，測試時可指定
+    """
+
+    def __init__(self, system: Optional[str] = None):
+        self.system = system or platform.system()
+        self._targets: Dict[str, Tuple[str, Optional[Tuple[str, ...]]]] = {}
+        self._loaded: Dict[str, Any] = {}
+
+    def register(self, name: str, target: str, platforms: Optional[Iterable[str]] = None) -> None:
+        self._targets[name] = (target, tuple(platforms) if platforms is not None else None)
+        self._loaded.pop(name, None)
+
+    def supported(self, name: str) -> bool:
+        if name not in self._targets:
+            return False
+        platforms = self._targets[name][1]
+        return platforms is None or self.system in platforms
+
+    def names(self) -> List[str]:
+        """目前平台可用的後端名稱。"""
+        return [name for name in self._targets if self.supported(name)]
+
+    def get(self, name: str) -> Any:
+        if name in self._loaded:
+            return self._loaded[name]
+        if name not in self._targets:
+            raise KeyError(f"unknown backend: {name}")
+        if not self.supported(name):
+            raise NotImplementedError(f"backend {name!r} is not available on {self.system}")
+        module_name, _, attr = self._targets[name][0].partition(":")
+        obj = importlib.import_module(module_name)
+        if attr:
+            obj = getattr(obj, attr)
+        self._loaded[name] = obj
+        return obj
+
+    def loaded(self) -> List[str]:
+        return list(self._loaded)
+
+
+# 遙測後端：main.py / smart_router.py 只在實際使用時載入
+BACKENDS = PlatformRegistry()
+BACKENDS.register("counter_sampler", "telemetry_daemon:CounterSampler", platforms=("Windows",))
+BACKENDS.register("igpu_npu_poll", "compute_info:get_gpu_utilization_fast")
+BACKENDS.register("linux_gpu_npu", "linux_telemetry:LinuxGpuNpuSampler", platforms=("Linux",))
+BACKENDS.register("dgpu_telemetry", "dgpu_telemetry:DGpuTelemetry")
+BACKENDS.register("telemetry_hub", "telemetry_hub:TelemetryHub")
@@ -0,0 +1,242 @@
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# ============================================================
+# 🐧 Linux 硬體列舉 (純讀 sysfs，不啟動任何子程序)
+# ============================================================
+# /sys/bus/pci/devices/<位址>/
+#   class / vendor / device     PCI class code 與 ID
+#   driver -> .../drivers/<名稱> 目前綁定的驅動
+#   boot_vga                    韌體開機使用的顯示卡為 1
+#   resource                    每個 BAR 一行：start end flags
+#   mem_info_vram_total         amdgpu 回報的 VRAM (bytes)
+# /sys/class/drm/<card*|renderD*>/device  與  /sys/class/accel/accel*/device
+#   指回 PCI 裝置，用來對應 DRM / accel 節點
+
+PCI_IDS_PATHS = ("usr/share/hwdata/pci.ids", "usr/share/misc/pci.ids", "usr/share/pci.ids")
+
+VENDORS = {"0x8086": "Intel", "0x10de": "NVIDIA", "0x1002": "AMD", "0x1022": "AMD"}
+GPU_VENDORS = ("0x8086", "0x10de", "0x1002")
+
+# PCI class (前 16 bits)：0x0300 VGA、0x0302 3D controller (多數 NVIDIA 運算卡與混合式筆電的 dGPU)、
+# 0x0380 其他顯示控制器、0x1200 Processing accelerator (Intel NPU)
+DISPLAY_CLASSES = (0x0300, 0x0302, 0x0380)
+ACCELERATOR_CLASS = 0x1200
+NPU_DRIVERS = ("intel_vpu", "amdxdna")
+
+IORESOURCE_MEM = 0x00000200
+# AMD APU 的 VRAM 只是 BIOS 切出的系統記憶體 (通常 512 MB ~ 2 GB)
+AMD_APU_MAX_VRAM_MB = 4096
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _read_int(path: str, base: int = 0) -> Optional[int]:
+    text = _read_text(path)
+    if not text:
+        return None
+    try:
+        return int(text, base)
+    except ValueError:
+        return None
+
+
+def _listdir(path: str) -> List[str]:
+    try:
+        return sorted(os.listdir(path))
+    except OSError:
+        return []
+
+
+def memory_bars_MB(device_dir: str) -> List[float]:
+    """由 resource 檔案取得各記憶體 BAR 大小 (MB)。"""
+    sizes = []
+    for line in (_read_text(os.path.join(device_dir, "resource")) or "").splitlines():
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        try:
+            start, end, flags = (int(f, 16) for f in fields[:3])
+        except ValueError:
+            continue
+        if flags & IORESOURCE_MEM and end > start:
+            sizes.append((end - start + 1) / 1024 ** 2)
+    return sizes
+
+
+# ============================================================
+# 🏷️ 裝置名稱 (pci.ids，可選)
+# ============================================================
+
+_pci_names: Dict[str, Dict[Tuple[str, str], str]] = {}
+
+
+def pci_name(root: str, vendor_id: str, device_id: str) -> Optional[str]:
+    """查 pci.ids 取得 "廠商 裝置" 名稱；沒有 pci.ids 時回傳 None。"""
+    if root not in _pci_names:
+        names: Dict[Tuple[str, str], str] = {}
+        for rel in PCI_IDS_PATHS:
+            path = os.path.join(root, rel)
+            if not os.path.isfile(path):
+                continue
+            wanted = {v[2:] for v in GPU_VENDORS} | {"1022"}
+            vendor = None
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    if not line.strip() or line.startswith("#"):
+                        continue
+                    if not line.startswith("\t"):
+                        # 廠商行："8086  Intel Corporation"；只收集 GPU/NPU 廠商
+                        vid, _, name = line.strip().partition(" ")
+                        vendor = vid.lower() if vid.lower() in wanted else None
+                        if vendor:
+                            names[(vendor, "")] = name.strip()
+                    elif vendor and not line.startswith("\t\t"):
+                        did, _, name = line.strip().partition(" ")
+                        names[(vendor, did.lower())] = name.strip()
+            break
+        _pci_names[root] = names
+    names = _pci_names[root]
+    vid, did = vendor_id[2:].lower(), device_id[2:].lower()
+    if (vid, did) not in names:
+        return None
+    return f"{names.get((vid, ''), VENDORS.get(vendor_id, vendor_id))} {names[(vid, did)]}"
+
+
+# ============================================================
+# 🔎 列舉 PCI 裝置
+# ============================================================
+
+def _node_map(root: str, class_dir: str) -> Dict[str, List[str]]:
+    """DRM / accel 節點 → PCI 位址的反向對應：{位址: [card0, renderD128, ...]}。"""
+    nodes: Dict[str, List[str]] = {}
+    base = os.path.join(root, class_dir)
+    for node in _listdir(base):
+        if "-" in node:   # 例如 card0-eDP-1 (connector)
+            continue
+        target = os.path.realpath(os.path.join(base, node, "device"))
+        nodes.setdefault(os.path.basename(target), []).append(node)
+    return nodes
+
+
+def _is_integrated(address: str, vendor_id: str, vram_MB: Optional[float], boot_vga: Optional[int]) -> bool:
+    """
+    判斷顯示卡是否為內建：
+        NVIDIA — 一律為獨立顯卡
+        Intel  — 內建顯卡固定位於 root bus 00 (0000:00:02.0)；Arc 獨立顯卡在 PCIe 橋接器之後
+        AMD    — amdgpu 回報的 VRAM ≤ 4 GB 視為 APU 切出的共用記憶體；沒有 VRAM 資訊時以 boot_vga 判斷
+    """
+    if vendor_id == "0x10de":
+        return False
+    if vendor_id == "0x8086":
+        parts = address.split(":")
+        return len(parts) == 3 and parts[1] == "00"
+    if vendor_id == "0x1002":
+        if vram_MB is not None:
+            return vram_MB <= AMD_APU_MAX_VRAM_MB
+        return boot_vga == 1
+    return False
+
+
+def enumerate_linux_devices(root: str = "/") -> List[Dict[str, Any]]:
+    """
+    列出所有顯示卡與 AI 加速器。
+
+    參數：
+        root (str): 檔案系統根目錄 (測試時可指向假的 sysfs 目錄)
+
+    回傳：
+        list of dict，每個裝置一筆：
+            {"address", "vendor_id", "device_id", "vendor", "name", "class",
+             "kind": "iGPU" | "dGPU" | "NPU" | "display",
+             "driver", "vram_MB", "bar_MB", "boot_vga", "drm": [...], "accel": [...]}
+    """
+    pci_dir = os.path.join(root, "sys/bus/pci/devices")
+    drm_nodes = _node_map(root, "sys/class/drm")
+    accel_nodes = _node_map(root, "sys/class/accel")
+    devices = []
+    for address in _listdir(pci_dir):
+        device_dir = os.path.join(pci_dir, address)
+        pci_class = _read_int(os.path.join(device_dir, "class"), 16)
+        if pci_class is None:
+            continue
+        base_class = pci_class >> 8
+        driver_link = os.path.join(device_dir, "driver")
+        driver = os.path.basename(os.path.realpath(driver_link)) if os.path.islink(driver_link) else None
+        accel = accel_nodes.get(address, [])
+        if base_class not in DISPLAY_CLASSES and base_class != ACCELERATOR_CLASS and \
+                not accel and driver not in NPU_DRIVERS:
+            continue
+
+        vendor_id = (_read_text(os.path.join(device_dir, "vendor")) or "").lower()
+        device_id = (_read_text(os.path.join(device_dir, "device")) or "").lower()
+        vram_bytes = _read_int(os.path.join(device_dir, "mem_info_vram_total"), 10)
+        vram_MB = vram_bytes / 1024 ** 2 if vram_bytes is not None else None
+        boot_vga = _read_int(os.path.join(device_dir, "boot_vga"), 10)
+        bars = memory_bars_MB(device_dir)
+
+        if base_class in DISPLAY_CLASSES and vendor_id in GPU_VENDORS:
+            kind = "iGPU" if _is_integrated(address, vendor_id, vram_MB, boot_vga) else "dGPU"
+        elif base_class in DISPLAY_CLASSES:
+            kind = "display"   # 例如伺服器 BMC (ASPEED) 的顯示控制器
+        else:
+            kind = "NPU"
+
+        vendor = VENDORS.get(vendor_id, vendor_id)
+        devices.append({
+            "address": address,
+            "vendor_id": vendor_id,
+            "device_id": device_id,
+            "vendor": vendor,
+            "name": pci_name(root, vendor_id, device_id) or f"{vendor} [{vendor_id[2:]}:{device_id[2:]}]",
+            "class": f"0x{pci_class:06x}",
+            "kind": kind,
+            "driver": driver,
+            "vram_MB": vram_MB,
+            "bar_MB": max(bars) if bars else None,
+            "boot_vga": boot_vga,
+            "drm": drm_nodes.get(address, []),
+            "accel": accel,
+        })
+    return devices
+
+
+def detect_linux_devices(root: str = "/") -> Dict[str, Any]:
+    """回傳與 detect_hw.detect_compute_devices() 相同格式的結果，另在 detail["devices"] 附上每個裝置的紀錄。"""
+    records = enumerate_linux_devices(root)
+    result = {"dGPU": False, "iGPU": False, "NPU": False,
+              "detail": {"gpus": [], "npu": None, "devices": records}}
+    for record in records:
+        if record["kind"] in ("iGPU", "dGPU"):
+            result[record["kind"]] = True
+            result["detail"]["gpus"].append(record["name"])
+        elif record["kind"] == "NPU":
+            result["NPU"] = True
+            if result["detail"]["npu"] is None:
+                result["detail"]["npu"] = record["name"]
+    return result
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    start = time.perf_counter()
+    result = detect_linux_devices(sys.argv[1] if len(sys.argv) > 1 else "/")
+    elapsed = time.perf_counter() - start
+    for d in result["detail"]["devices"]:
+        vram = f"{d['vram_MB']:.0f} MB" if d["vram_MB"] is not None else "-"
+        print(f"🔹 {d['kind']:7s} {d['address']}  {d['name']:40s} driver={d['driver'] or '-':10s} "
+              f"VRAM={vram} BAR={d['bar_MB'] or 0:.0f} MB nodes={','.join(d['drm'] + d['accel']) or '-'}")
+    print(f"⏱️ {elapsed * 1000:.2f} ms")
@@ -0,0 +1,313 @@
+import os
+import time
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+from linux_hw import enumerate_linux_devices
+
+
+# ============================================================
+# 🐧 Linux iGPU / NPU 使用率 (純讀檔，不啟動任何子程序)
+# ============================================================
+# iGPU：/proc/<pid>/fdinfo/<fd> 的 DRM 用量統計
+#   i915 : drm-engine-<engine>: <ns> ns  (+ drm-engine-capacity-<engine>)
+#   xe   : drm-cycles-<engine>: <n>  /  drm-total-cycles-<engine>: <n>
+#   記憶體: drm-total-<region>: <n> [KiB|MiB]
+# NPU ：/sys/class/accel/accel*/device/npu_busy_time_us (累計 µs)
+#       /sys/class/accel/accel*/device/npu_memory_utilization (bytes)
+#
+# 所有計數器皆為累計值，使用率 = 兩次讀取之間的差值 / 經過時間；
+# 第一次呼叫只建立基準值，使用率回傳 0。
+#
+# 記錄沿用 Windows 版本的 "luid" 欄位以維持相同格式，但 Linux 上沒有 LUID，
+# 這裡放的是 PCI 位址 (例如 "0000:00:02.0"，另外也放在 "pci_address")；
+# compute_info.luid_to_int 以 PCI 位址排序，iGPU / NPU 主要仍依 "type" 標記判斷。
+# iGPU / dGPU 分類沿用 linux_hw 的每個裝置紀錄 (以 PCI 位址對應)，與 detect_hw 的結果一致。
+
+DRM_DRIVERS = ("i915", "xe", "amdgpu")
+
+GPU_LABELS = {"iGPU": "iGPU - 內建顯卡", "dGPU": "dGPU - 獨立顯卡/其他元件"}
+
+_UNITS = {"": 1, "B": 1, "KiB": 1024, "MiB": 1024 * 1024, "GiB": 1024 * 1024 * 1024}
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def parse_fdinfo(text: str) -> Dict[str, Any]:
+    """解析單一 DRM fdinfo 內容。
+
+    回傳: {"driver", "pdev", "client_id", "engines": {name: ns},
+           "capacity": {name: n}, "cycles": {name: n}, "total_cycles": {name: n},
+           "memory_bytes": float}
+    """
+    info = {
+        "driver": None, "pdev": None, "client_id": None,
+        "engines": {}, "capacity": {}, "cycles": {}, "total_cycles": {},
+        "memory_bytes": 0.0,
+    }
+    for line in text.splitlines():
+        if ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        key = key.strip()
+        value = value.strip()
+        if not key.startswith("drm-"):
+            continue
+
+        if key == "drm-driver":
+            info["driver"] = value
+        elif key == "drm-pdev":
+            info["pdev"] = value
+        elif key == "drm-client-id":
+            info["client_id"] = value
+        else:
+            fields = value.split()
+            if not fields:
+                continue
+            try:
+                number = int(fields[0])
+            except ValueError:
+                continue
+            unit = fields[1] if len(fields) > 1 else ""
+
+            if key.startswith("drm-engine-capacity-"):
+                info["capacity"][key[len("drm-engine-capacity-"):]] = number
+            elif key.startswith("drm-engine-"):
+                info["engines"][key[len("drm-engine-"):]] = number
+            elif key.startswith("drm-total-cycles-"):
+                info["total_cycles"][key[len("drm-total-cycles-"):]] = number
+            elif key.startswith("drm-cycles-"):
+                info["cycles"][key[len("drm-cycles-"):]] = number
+            elif key.startswith("drm-total-"):
+                info["memory_bytes"] += number * _UNITS.get(unit, 1)
+    return info
+
+
+class LinuxGpuNpuSampler:
+    """
+    以 DRM fdinfo 與 /sys/class/accel 計算 iGPU / NPU 使用率。
+
+    參數：
+        root (str): 檔案系統根目錄 (測試時可指向假的 sysfs/procfs 目錄)
+        rescan_interval (float): 重新掃描 /proc 以尋找新 DRM client 的間隔秒數；
+            期間只重讀已知的 fdinfo 檔案，單次取樣遠低於 1 ms
+        full_rescan_interval (float): 完整重新掃描的間隔秒數。其餘的重新掃描是增量的：
+            只對新的 fd 編號呼叫 readlink (已檢查過的 fd 不重複檢查，已結束的程序直接移除)，
+            桌面環境數千個 fd 也只需要每個程序一次 listdir
+    """
+
+    def __init__(self, root: str = "/", rescan_interval: float = 2.0, full_rescan_interval: float = 60.0):
+        self.root = root
+        self.rescan_interval = rescan_interval
+        self.full_rescan_interval = full_rescan_interval
+        self._fdinfo_paths: List[str] = []
+        self._seen_fds: Dict[str, Set[str]] = {}     # pid → 已檢查過的 fd
+        self._drm_fds: Dict[str, Dict[str, str]] = {}  # pid → {fd: fdinfo 路徑}
+        self._last_scan = float("-inf")
+        self._last_full_scan = float("-inf")
+        self._prev_engine: Dict[Tuple[str, str, str], int] = {}
+        self._prev_cycles: Dict[Tuple[str, str, str], Tuple[int, int]] = {}
+        self._prev_npu: Dict[str, int] = {}
+        self._prev_time: Optional[int] = None
+        self._kinds: Optional[Dict[str, str]] = None   # PCI 位址 → "iGPU" / "dGPU" (linux_hw)
+
+    # --------------------------------------------------------
+    # DRM client 掃描
+    # --------------------------------------------------------
+    def _scan_drm_clients(self) -> None:
+        now = time.monotonic()
+        if now - self._last_full_scan >= self.full_rescan_interval:
+            # 完整掃描：fd 編號可能被關閉後重新用於 /dev/dri
+            self._seen_fds, self._drm_fds = {}, {}
+            self._kinds = None
+            self._last_full_scan = now
+
+        proc_dir = os.path.join(self.root, "proc")
+        try:
+            pids = {p for p in os.listdir(proc_dir) if p.isdigit()}
+        except OSError:
+            pids = set()
+
+        for pid in list(self._seen_fds):
+            if pid not in pids:
+                self._seen_fds.pop(pid, None)
+                self._drm_fds.pop(pid, None)
+
+        for pid in pids:
+            fd_dir = os.path.join(proc_dir, pid, "fd")
+            try:
+                fds = set(os.listdir(fd_dir))
+            except OSError:
+                continue
+            seen = self._seen_fds.setdefault(pid, set())
+            drm = self._drm_fds.setdefault(pid, {})
+            for fd in list(drm):
+                if fd not in fds:
+                    del drm[fd]
+            for fd in fds - seen:
+                try:
+                    target = os.readlink(os.path.join(fd_dir, fd))
+                except OSError:
+                    continue
+                if target.startswith("/dev/dri/"):
+                    drm[fd] = os.path.join(proc_dir, pid, "fdinfo", fd)
+            # 只記住目前還開著的 fd；關閉後重新開啟的編號下次會再檢查
+            self._seen_fds[pid] = fds
+
+        self._fdinfo_paths = [path for fds in self._drm_fds.values() for path in fds.values()]
+        self._last_scan = now
+
+    def _read_drm_clients(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """讀取所有 DRM client，以 (pdev, client_id) 去除重複的 fd。"""
+        if time.monotonic() - self._last_scan >= self.rescan_interval:
+            self._scan_drm_clients()
+
+        clients = {}
+        for path in self._fdinfo_paths:
+            text = _read_text(path)
+            if not text:
+                continue
+            info = parse_fdinfo(text)
+            if info["driver"] not in DRM_DRIVERS or not info["pdev"]:
+                continue
+            clients[(info["pdev"], info["client_id"] or path)] = info
+        return clients
+
+    # --------------------------------------------------------
+    # 取樣
+    # --------------------------------------------------------
+    def sample(self) -> List[Dict[str, Any]]:
+        """
+        回傳格式與 compute_info.get_gpu_utilization_fast 相同：
+        [{"luid": "0000:00:02.0", "utilization": 35.0, "memory_usage_MB": 512.0, "type": "iGPU - 內建顯卡"}, ...]
+        """
+        now = time.monotonic_ns()
+        elapsed_ns = (now - self._prev_time) if self._prev_time is not None else 0
+        self._prev_time = now
+
+        results = []
+        results.extend(self._sample_gpus(elapsed_ns))
+        results.extend(self._sample_npus(elapsed_ns))
+        return results
+
+    def _sample_gpus(self, elapsed_ns: int) -> List[Dict[str, Any]]:
+        engine_busy: Dict[str, Dict[str, float]] = {}
+        memory: Dict[str, float] = {}
+        prev_engine, prev_cycles = self._prev_engine, self._prev_cycles
+        self._prev_engine, self._prev_cycles = {}, {}
+
+        for (pdev, client_id), info in self._read_drm_clients().items():
+            busy = engine_busy.setdefault(pdev, {})
+            memory[pdev] = memory.get(pdev, 0.0) + info["memory_bytes"]
+
+            # i915：引擎忙碌時間 (ns)
+            for engine, ns in info["engines"].items():
+                key = (pdev, client_id, engine)
+                self._prev_engine[key] = ns
+                if key in prev_engine and elapsed_ns > 0:
+                    capacity = info["capacity"].get(engine, 1) or 1
+                    delta = max(0, ns - prev_engine[key])
+                    busy[engine] = busy.get(engine, 0.0) + delta / (elapsed_ns * capacity)
+
+            # xe：引擎 cycles / GPU 總 cycles
+            for engine, cycles in info["cycles"].items():
+                total = info["total_cycles"].get(engine)
+                if total is None:
+                    continue
+                key = (pdev, client_id, engine)
+                self._prev_cycles[key] = (cycles, total)
+                if key in prev_cycles:
+                    prev_c, prev_t = prev_cycles[key]
+                    if total > prev_t:
+                        busy[engine] = busy.get(engine, 0.0) + max(0, cycles - prev_c) / (total - prev_t)
+
+        results = []
+        kinds = self._device_kinds()
+        for pdev in sorted(engine_busy):
+            # 與 Windows 版本一致：取各引擎最大值
+            utilization = min(100.0, max(engine_busy[pdev].values(), default=0.0) * 100.0)
+            label = GPU_LABELS.get(kinds.get(pdev), GPU_LABELS["dGPU"])
+            results.append({
+                "luid": pdev,               # PCI 位址 (Linux 沒有 LUID)
+                "pci_address": pdev,
+                "utilization": utilization,
+                "memory_usage_MB": memory.get(pdev, 0.0) / (1024 * 1024),
+                "type": label
+            })
+        return results
+
+    def _device_kinds(self) -> Dict[str, str]:
+        """linux_hw 的 iGPU / dGPU 分類，完整重新掃描時一併更新。"""
+        if self._kinds is None:
+            self._kinds = {d["address"]: d["kind"] for d in enumerate_linux_devices(self.root)
+                           if d["kind"] in GPU_LABELS}
+        return self._kinds
+
+    def _sample_npus(self, elapsed_ns: int) -> List[Dict[str, Any]]:
+        accel_dir = os.path.join(self.root, "sys/class/accel")
+        try:
+            accels = sorted(os.listdir(accel_dir))
+        except OSError:
+            return []
+
+        prev_npu = self._prev_npu
+        self._prev_npu = {}
+        results = []
+        for accel in accels:
+            device_dir = os.path.join(accel_dir, accel, "device")
+            busy_text = _read_text(os.path.join(device_dir, "npu_busy_time_us"))
+            if busy_text is None:
+                continue
+            try:
+                busy_us = int(busy_text.strip())
+            except ValueError:
+                continue
+
+            luid = os.path.basename(os.path.realpath(device_dir))
+            if luid == "device":
+                luid = accel
+
+            self._prev_npu[luid] = busy_us
+            utilization = 0.0
+            if luid in prev_npu and elapsed_ns > 0:
+                delta_us = max(0, busy_us - prev_npu[luid])
+                utilization = min(100.0, delta_us * 1000.0 / elapsed_ns * 100.0)
+
+            mem_text = _read_text(os.path.join(device_dir, "npu_memory_utilization"))
+            try:
+                mem_bytes = float(mem_text.strip()) if mem_text else 0.0
+            except ValueError:
+                mem_bytes = 0.0
+
+            results.append({
+                "luid": luid,               # PCI 位址 (找不到時為 accel 名稱)
+                "pci_address": luid,
+                "utilization": utilization,
+                "memory_usage_MB": mem_bytes / (1024 * 1024),
+                "type": "NPU - 神經處理單元"
+            })
+        return results
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import sys
+
+    sampler = LinuxGpuNpuSampler(sys.argv[1] if len(sys.argv) > 1 else "/")
+    sampler.sample()
+    while True:
+        time.sleep(1)
+        start = time.perf_counter()
+        data = sampler.sample()
+        elapsed = time.perf_counter() - start
+        for entry in data:
+            print(f"🔹 {entry['type']:24s} | {entry['luid']:14s} | 利用率: {entry['utilization']:6.2f}% | MEM: {entry['memory_usage_MB']:8.2f} MB")
+        print(f"⏱️ 取樣耗時: {elapsed * 1000:.3f} ms\n")
@@ -0,0 +1,205 @@
+import json
+import time
+import asyncio
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from async_http import AsyncHTTPPool, HTTPError
+from ovms_client import CHAT_PATH, base_url, chat_payload
+
+
+# ============================================================
+# 🚦 OVMS 併發壓測 (continuous batching 吞吐量)
+# ============================================================
+# 兩種負載模式：
+#   concurrency - 封閉迴圈：N 個用戶端各自「送出 → 等完成 → 再送」
+#   rate        - 開放迴圈：依 Poisson 過程以 λ req/s 到達，不等前一個請求完成
+#
+# 每個請求以 SSE 串流送出，記錄：
+#   queue_s   - 預定到達時間 → 取得連線並送出的等待 (用戶端排隊)
+#   ttft_s    - 送出 → 第一個 token (包含 OVMS 內部排隊與 prefill)
+#   latency_s - 預定到達時間 → 最後一個 token
+#   tokens    - usage.completion_tokens (沒有時以 chunk 數計)
+
+
+async def _one_request(pool: AsyncHTTPPool, payload: Dict[str, Any], scheduled: float) -> Dict[str, Any]:
+    record = {"ok": False, "queue_s": 0.0, "ttft_s": None, "latency_s": None, "tokens": 0}
+    try:
+        response = await pool.post_json(CHAT_PATH, payload)
+        sent = response.sent_at
+        record["queue_s"] = max(0.0, sent - scheduled)
+        if response.status != 200:
+            record["error"] = f"HTTP {response.status}: {(await response.read())[:200]!r}"
+            return record
+
+        chunks, usage_tokens, first = 0, None, None
+        async for data in response.iter_sse():
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            if chunk.get("usage"):
+                usage_tokens = chunk["usage"].get("completion_tokens", usage_tokens)
+            if any(c.get("delta", {}).get("content") for c in chunk.get("choices", [])):
+                chunks += 1
+                if first is None:
+                    first = time.perf_counter()
+        end = time.perf_counter()
+
+        record["tokens"] = usage_tokens or chunks
+        record["ttft_s"] = (first - sent) if first is not None else None
+        record["latency_s"] = end - scheduled
+        record["ok"] = record["tokens"] > 0
+    except (HTTPError, asyncio.TimeoutError, OSError, ValueError) as e:
+        # 連線被重設、狀態列無法解析等都只算這一個請求失敗，不中斷整個 sweep
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+async def run_concurrency(url: str, model: str, prompt: str, max_tokens: int, concurrency: int,
+                          duration: float = 30.0, max_requests: Optional[int] = None,
+                          pool: Optional[AsyncHTTPPool] = None) -> Dict[str, Any]:
+    """
+    封閉迴圈：concurrency 個用戶端持續送請求 duration 秒 (或直到 max_requests)。
+    url 可為 base URL、連接埠或裝置名稱 (見 ovms_client.base_url)。
+    """
+    own_pool = pool is None
+    pool = pool or AsyncHTTPPool(base_url(url), max_connections=concurrency)
+    payload = chat_payload(model, prompt, max_tokens, stream=True)
+    records: List[Dict[str, Any]] = []
+    start = time.perf_counter()
+    deadline = start + duration
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            records.append(await _one_request(pool, payload, time.perf_counter()))
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - start
+    if own_pool:
+        await pool.close()
+    return summarize(records, wall, mode="concurrency", level=concurrency)
+
+
+async def run_rate(url: str, model: str, prompt: str, max_tokens: int, rate: float,
+                   duration: float = 30.0, seed: int = 0, max_connections: int = 256,
+                   pool: Optional[AsyncHTTPPool] = None) -> Dict[str, Any]:
+    """開放迴圈：以 Poisson 過程 (平均 rate req/s) 送請求 duration 秒，並等待全部完成。"""
+    own_pool = pool is None
+    pool = pool or AsyncHTTPPool(base_url(url), max_connections=max_connections)
+    payload = chat_payload(model, prompt, max_tokens, stream=True)
+
+    rng = np.random.default_rng(seed)
+    gaps = rng.exponential(1.0 / rate, size=max(1, int(rate * duration * 2) + 10))
+    arrivals = np.cumsum(gaps)
+    arrivals = arrivals[arrivals < duration]
+
+    start = time.perf_counter()
+    tasks = []
+    for offset in arrivals:
+        scheduled = start + float(offset)
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(_one_request(pool, payload, scheduled)))
+    records = list(await asyncio.gather(*tasks))
+    wall = time.perf_counter() - start
+    if own_pool:
+        await pool.close()
+    return summarize(records, wall, mode="rate", level=rate)
+
+
+def _pct(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+def summarize(records: List[Dict[str, Any]], wall_s: float, mode: str, level: float) -> Dict[str, Any]:
+    """把單一負載等級的所有請求彙整成一筆結果。"""
+    ok = [r for r in records if r["ok"]]
+    latency = [r["latency_s"] for r in ok]
+    ttft = [r["ttft_s"] for r in ok if r["ttft_s"] is not None]
+    queue = [r["queue_s"] for r in ok]
+    tokens = sum(r["tokens"] for r in ok)
+    errors = [r.get("error", "") for r in records if not r["ok"]]
+    return {
+        "mode": mode,
+        "level": level,
+        "requests": len(ok),
+        "errors": len(errors),
+        "first_error": errors[0] if errors else None,
+        "wall_s": wall_s,
+        "agg_tps": tokens / wall_s if wall_s > 0 else 0.0,
+        "req_per_s": len(ok) / wall_s if wall_s > 0 else 0.0,
+        "latency_p50_s": _pct(latency, 50),
+        "latency_p95_s": _pct(latency, 95),
+        "latency_p99_s": _pct(latency, 99),
+        "ttft_p50_s": _pct(ttft, 50),
+        "ttft_p95_s": _pct(ttft, 95),
+        "queue_p50_ms": _pct(queue, 50) * 1000.0,
+        "queue_p95_ms": _pct(queue, 95) * 1000.0,
+    }
+
+
+async def sweep(url: str, model: str, prompt: str, max_tokens: int,
+                concurrency: Optional[List[int]] = None, rates: Optional[List[float]] = None,
+                duration: float = 30.0) -> List[Dict[str, Any]]:
+    """依序跑每個負載等級，回傳每個等級的彙整結果。"""
+    results = []
+    for n in concurrency or []:
+        results.append(await run_concurrency(url, model, prompt, max_tokens, n, duration))
+    for r in rates or []:
+        results.append(await run_rate(url, model, prompt, max_tokens, r, duration))
+    return results
+
+
+def find_saturation(results: List[Dict[str, Any]], min_gain: float = 0.05) -> Optional[float]:
+    """回傳第一個 agg_tps 比前一級成長不到 min_gain 的負載等級 (同一 mode 內比較)。"""
+    prev = None
+    for res in results:
+        if prev is not None and res["mode"] == prev["mode"] and prev["agg_tps"] > 0:
+            if res["agg_tps"] < prev["agg_tps"] * (1.0 + min_gain):
+                return prev["level"]
+        prev = res
+    return None
+
+
+def print_sweep(label: str, results: List[Dict[str, Any]]) -> None:
+    print(f"\n📊 {label}")
+    print(f"{'mode':12s} {'level':>6s} {'req':>5s} {'err':>4s} {'tok/s':>9s} {'req/s':>7s} "
+          f"{'lat p50/p95/p99 (s)':>22s} {'TTFT p50/p95 (s)':>17s} {'queue p95 (ms)':>15s}")
+    for r in results:
+        print(f"{r['mode']:12s} {r['level']:6g} {r['requests']:5d} {r['errors']:4d} {r['agg_tps']:9.2f} "
+              f"{r['req_per_s']:7.2f} "
+              f"{r['latency_p50_s']:7.2f}/{r['latency_p95_s']:6.2f}/{r['latency_p99_s']:6.2f} "
+              f"{r['ttft_p50_s']:8.3f}/{r['ttft_p95_s']:7.3f} {r['queue_p95_ms']:15.1f}")
+        if r["first_error"]:
+            print(f"   ⚠️ {r['first_error']}")
+    saturated = find_saturation(results)
+    if saturated is not None:
+        print(f"🧱 吞吐量在負載 {saturated:g} 附近飽和")
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OVMS concurrent load generator")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--model", default="OpenVINO/Qwen3-4B-int4-ov")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated client counts")
+    parser.add_argument("--rate", default="", help="comma-separated Poisson arrival rates (req/s)")
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--max-tokens", type=int, default=256)
+    args = parser.parse_args()
+
+    levels = [int(x) for x in args.concurrency.split(",") if x]
+    rates = [float(x) for x in args.rate.split(",") if x]
+    res = asyncio.run(sweep(args.url, args.model, "Hello, how are you today?", args.max_tokens,
+                            levels, rates, args.duration))
+    print_sweep(f"{args.model} @ {args.url}", res)
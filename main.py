@@ -1,39 +1,37 @@
-import time
-from detect_hw import detect_compute_devices
-from compute_info import get_gpu_utilization_fast, luid_to_int
-from get_dgpu_usage import get_dgpu_utilization_nvidia_smi, get_dgpu_vram
-from benchmark_final import auto_find_threshold
+import os
+import argparse
+from functools import partial
+from lazy_import import BACKENDS
+# 選擇邏輯本身只需要標準函式庫；numpy / requests / asyncio 與各遙測後端在主程式內才載入
+# (python benchmark_imports.py 檢查 import 時間)
+
+# 各裝置可用模型 (smart_router 也使用同一份設定)
+MODEL_LIST = {
+    "dGPU": ["gpt-oss:20b", "qwen3:14b", "qwen3:8b"],
+    "iGPU": ["OpenVINO/Qwen3-8B-int4-ov"],
+    "NPU":  ["OpenVINO/Qwen3-8B-int4-cw-ov"]
+}
+MODEL_VRAM = {
+    "gpt-oss:20b": 15,
+    "qwen3:14b": 12,
+    "qwen3:8b": 6,
+    "OpenVINO/Qwen3-8B-int4-ov": 0,
+    "OpenVINO/Qwen3-8B-int4-cw-ov": 0
+}
 
-def get_igpu_npu_usage():
-    """使用快速版本獲取 iGPU 和 NPU 的使用率與記憶體 (MB)
 
-    回傳: (igpu_util, npu_util, igpu_mem_MB, npu_mem_MB)
+def igpu_npu_source(sampler=None):
     """
-    igpu_util = npu_util = 0.0
-    igpu_mem = npu_mem = 0.0
-
-    try:
-        luid_utilization_data = get_gpu_utilization_fast()
-        if not luid_utilization_data:
-            print("⚠️ 無法取得 GPU/NPU 使用率資料。")
-            return igpu_util, npu_util, igpu_mem, npu_mem
-
-        # 按 LUID 排序
-        luid_utilization_data.sort(key=lambda d: luid_to_int(d["luid"]))
-
-        # 最小 LUID → iGPU
-        igpu_util = luid_utilization_data[0]["utilization"]
-        igpu_mem = luid_utilization_data[0].get("memory_usage_MB", 0.0)
-
-        # 最大 LUID → NPU（如果有多個設備）
-        if len(luid_utilization_data) > 1:
-            npu_util = luid_utilization_data[-1]["utilization"]
-            npu_mem = luid_utilization_data[-1].get("memory_usage_MB", 0.0)
+    iGPU/NPU 遙測來源 (由 BACKENDS 依平台載入)：
+    Windows 常駐 CounterSampler → Linux DRM fdinfo / accel sysfs 取樣器 → 單次輪詢。
+    """
+    if sampler is not None:
+        return sampler.latest
+    if BACKENDS.supported("linux_gpu_npu"):
+        return BACKENDS.get("linux_gpu_npu")().sample
+    return BACKENDS.get("igpu_npu_poll")
 
-    except Exception as e:
-        print(f"⚠️ 無法取得使用率資訊: {e}")
 
-    return igpu_util, npu_util, igpu_mem, npu_mem
 def pick_best_dgpu_model(dgpu_mem, model_list, model_vram):
     """
     根據 dGPU 可用 VRAM 選擇最佳模型
@@ -76,9 +74,9 @@ def select_best_device_and_model(devices, igpu_util, npu_util, dgpu_util, dgpu_m
     參數：
         devices (dict): 偵測到的硬體設備
             例如 {"dGPU": True, "iGPU": True, "NPU": True}
-        igpu_util (float): iGPU 當前使用率 (0~100)
-        npu_util (float): NPU 當前使用率 (0~100)
-        dgpu_util (float): dGPU 當前使用率 (0~100)
+        igpu_util (float): iGPU 使用率 (0~100)，可為瞬時值或平滑後的訊號 (見 signal_smoothing)
+        npu_util (float): NPU 使用率 (0~100)
+        dgpu_util (float): dGPU 使用率 (0~100)
         dgpu_mem (float): dGPU 可用 VRAM (GB)
         usage_threshold (float): iGPU / NPU 最大可接受使用率門檻 (0~1，例如 0.5 表示 50%)
 
@@ -117,64 +115,185 @@ def select_best_device_and_model(devices, igpu_util, npu_util, dgpu_util, dgpu_m
             print("⚠️ dGPU 使用率過高，跳過 dGPU")
     # 2. iGPU
     if devices.get("iGPU", False) and igpu_util <= usage_threshold * 100:
-        model = MODEL_LIST["iGPU"][0]
+        model = model_list["iGPU"][0]
         print(f"➡️ iGPU 使用率 OK，使用 {model}")
         return "iGPU", model
     # 3. NPU
     if devices.get("NPU", False) and npu_util <= usage_threshold * 100:
-        model = MODEL_LIST["NPU"][0]
+        model = model_list["NPU"][0]
         print(f"➡️ NPU 使用率 OK，使用 {model}")
         return "NPU", model
     # 4. fallback
     print("⚠️ 全部裝置都繁忙，fallback 至 iGPU")
-    return "iGPU", MODEL_LIST["iGPU"][0]
+    return "iGPU", model_list["iGPU"][0]
 
 
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="智能裝置選擇系統")
+    parser.add_argument("--recalibrate", action="store_true", help="忽略快取，重新執行 iGPU/NPU 切換門檻校正")
+    parser.add_argument("--no-calibration", dest="calibrate", action="store_false", help="不校正，使用預設門檻 0.5")
+    parser.add_argument("--prewarm", action="store_true", help="預熱下一個可能的裝置/模型，並在記憶體預算內淘汰冷模型")
+    parser.add_argument("--ovms-config", default="config.json", help="OVMS 使用的 config.json (--prewarm)")
+    parser.add_argument("--ovms-url", default="http://localhost:8000", help="OVMS REST 位址 (--prewarm 與記憶體配置查詢已載入模型)")
+    parser.add_argument("--ov-cache-dir", default=None, help="export_model warm_cache 的 CACHE_DIR；優先選擇已有預先編譯 blob 的裝置")
+    parser.add_argument("--heartbeat", type=float, default=10.0, help="閒置時最長的取樣 / 重新選擇間隔秒數")
+    parser.add_argument("--memory-budget", type=float, default=None, help="iGPU/NPU 模型可用的系統記憶體 (GB)")
+    args = parser.parse_args()
+
+    from detect_hw import detect_compute_devices
+    from signal_smoothing import DeviceSignals, HysteresisSelector
+    from throughput_model import ThroughputCurves, CURVES_FILE, select_by_throughput
+    from calibration_cache import get_or_calibrate
+    from scheduler import SelectionScheduler
+    from multi_dgpu import MultiDGpuSelector, card_free_GB
+
     print("=== 智能裝置選擇系統啟動 ===")
     
-    # ⬅️ 初始化：只偵測一次硬體
-    devices = detect_compute_devices()
-    # if devices['iGPU'] is True and devices['NPU'] is True:
-        # usage = auto_find_threshold("Qwen3-8B-int4-cw-ov", "Qwen3-8B-int4-ov")
-    MODEL_LIST = {
-    "dGPU": ["gpt-oss:20b", "qwen3:14b", "qwen3:8b"],
-    "iGPU": ["OpenVINO/Qwen3-8B-int4-ov"],
-    "NPU":  ["OpenVINO/Qwen3-8B-int4-cw-ov"]
-    }
-    MODEL_VRAM = {
-    "gpt-oss:20b": 15,
-    "qwen3:14b": 12,
-    "qwen3:8b": 6,
-    "OpenVINO/Qwen3-8B-int4-ov": 0,
-    "OpenVINO/Qwen3-8B-int4-cw-ov": 0
-    }
-    while True:
+    # ⬅️ 初始化：只偵測一次硬體；命中快取時立即回傳，背景重新偵測發現差異就就地更新 devices
+    def on_device_change(new):
+        # dGPU 遙測只在啟動時開啟；執行中新出現的 dGPU 沒有 VRAM 資料，保持停用直到重新啟動
+        if new.get("dGPU") and dgpu_telemetry is None:
+            print("⚠️ 背景偵測發現新的 dGPU，但 dGPU 遙測未開啟；請重新啟動以使用 dGPU")
+            new = dict(new, dGPU=False)
+        changed = {k: v for k, v in new.items() if devices.get(k) != v}
+        if changed:
+            print(f"🔄 硬體偵測結果已更新: {changed}")
+        devices.update(new)
+
+    dgpu_telemetry = None
+    devices = detect_compute_devices(on_change=on_device_change)
+    # ⬅️ 常駐取樣器：只啟動一次 PowerShell 收集程序
+    sampler = BACKENDS.get("counter_sampler")().start() if BACKENDS.supported("counter_sampler") else None
+    # ⬅️ dGPU：NVML handle 只開啟一次
+    dgpu_telemetry = BACKENDS.get("dgpu_telemetry")().open() if devices.get("dGPU", False) else None
+    # ⬅️ iGPU/NPU 切換門檻：依硬體/模型/驅動/OVMS 版本快取，只在變更或 --recalibrate 時重新校正
+    usage_threshold = 0.5
+    if args.calibrate and devices.get('iGPU') and devices.get('NPU'):
+        usage_threshold = get_or_calibrate(devices, "Qwen3-8B-int4-cw-ov", "Qwen3-8B-int4-ov",
+                                           recalibrate=args.recalibrate)
+    # ⬅️ 平滑訊號：以 p95 決策，候選裝置連續 3 次勝出才切換
+    SIGNAL_MODE = "p95"
+    CONFIRM_SAMPLES = 3
+    signals = DeviceSignals(size=30, mode=SIGNAL_MODE)
+    # ⬅️ 有 benchmark_final 量測的吞吐量曲線時，改以預測 tok/s 選擇；否則使用固定門檻規則
+    curves = ThroughputCurves.load(CURVES_FILE)
+    if len(curves):
+        print(f"📊 已載入 {len(curves)} 條吞吐量曲線: {CURVES_FILE}")
+        select_fn = partial(select_by_throughput, curves=curves, fallback=select_best_device_and_model)
+    else:
+        select_fn = select_best_device_and_model
+    # ⬅️ 有預先編譯的 blob 時，避免切換到需要重新編譯數分鐘的裝置
+    if args.ov_cache_dir:
+        from blob_cache import load_manifest, prefer_warm
+        # 模型被重新匯出 (雜湊改變) 或 OpenVINO 版本不同的 blob 不算已預熱
+        blobs, ov_version = load_manifest(args.ov_cache_dir, args.ovms_config)
+        if len(blobs):
+            print(f"📦 已載入 {len(blobs)} 筆預先編譯 blob 紀錄: {blobs.path}")
+            select_fn = prefer_warm(select_fn, blobs, ov_version)
+    selector = HysteresisSelector(select_fn, confirm_samples=CONFIRM_SAMPLES)
+    # ⬅️ 多張 NVIDIA 卡：逐卡評估，依預測 tok/s 與可用 VRAM 分散到各張卡
+    dgpu_selector = MultiDGpuSelector(selector.select, curves if len(curves) else None)
+    # ⬅️ 所有來源同時取樣，單一來源卡住不會拖慢決策
+    hub = BACKENDS.get("telemetry_hub")(
+        dgpu=dgpu_telemetry.sample if dgpu_telemetry is not None else None,
+        igpu_npu=igpu_npu_source(sampler),
+    )
+    # ⬅️ 記憶體配置：iGPU/NPU 模型的 MODEL_VRAM 為 0，改以權重 + KV cache (--cache_size) 估計，
+    #    只選擇放得下、不會造成 swap 的模型
+    placement = None
+    if os.path.isfile(args.ovms_config):
+        from placement import MemoryPlacement, system_memory_GB
+        from config_store import ovms_loaded_servables
+        placement = MemoryPlacement.from_config(args.ovms_config, MODEL_VRAM)
+        if not placement.profiles:
+            placement = None
+    # ⬅️ 模型生命週期：切換前先載入下一個可能的候選，避免第一個請求負擔載入/編譯時間
+    manager = None
+    if args.prewarm:
+        from model_manager import OVMSModelHost, OllamaModelHost, ModelManager, predict_next_candidates
+        ovms_host = OVMSModelHost(args.ovms_config, args.ovms_url)
+        budget = {"system": args.memory_budget} if args.memory_budget else {}
+        model_mem = {m: gb for m, gb in MODEL_VRAM.items() if gb}
+        if placement is not None:
+            model_mem.update({m: placement.need_GB(m, d) for d in ("iGPU", "NPU") for m in MODEL_LIST[d]})
+        manager = ModelManager({"iGPU": ovms_host, "NPU": ovms_host, "dGPU": OllamaModelHost()},
+                               budget_GB=budget,
+                               # 沒有 placement 時 OVMS 模型由模型資料夾大小估計
+                               model_mem_GB=model_mem)
+    def sample():
         # 獲取各裝置的使用率
         # 預設為 0.0（若沒有 dGPU 或無法取得則維持 0）
-        dgpu_util = 0.0
-        dgpu_util_vram = 0.0
-        usage = 0.0
-        if devices.get("dGPU", False):
-            try:
-                dgpu_util = get_dgpu_utilization_nvidia_smi()
-                dgpu_util_vram = get_dgpu_vram()
-                print(f"NVIDIA dGPU VRAM 使用量: {dgpu_util_vram:.2f} GB ")
-            except Exception as e:
-                print(f"⚠️ 無法取得 dGPU 使用率: {e}")
-                dgpu_util = 0.0
         print("=== 取得各裝置使用率 ===")
-        # igpu_util, npu_util, igpu_mem, npu_mem = get_igpu_npu_usage()
-        igpu_util = 51
-        npu_util = 25
-        igpu_mem = 0.0
-        dgpu_util = 51
-        # print(f"🎮 iGPU 使用率: {igpu_util:.2f}%, 記憶體使用: {igpu_mem:.2f} MB")
-        best, model = select_best_device_and_model(devices, igpu_util, npu_util, dgpu_util, dgpu_util_vram ,0.5, MODEL_LIST, MODEL_VRAM)
-        print(f"建議使用裝置: {best}, 模型: {model}")
-        time.sleep(10)
+        snap = hub.sample_sync()
+        for name, err in snap.errors.items():
+            print(f"⚠️ 無法取得 {name} 使用率: {err}")
+        if dgpu_telemetry is not None:
+            print(f"NVIDIA dGPU VRAM 剩餘: {snap.dgpu_free_GB:.2f} GB ")
+        # print(f"🎮 iGPU 使用率: {snap.igpu_util:.2f}%, 記憶體使用: {snap.igpu_mem_MB:.2f} MB")
+        # 失敗的來源不寫入訊號視窗，沿用先前的樣本
+        signals.update_from_snapshot(snap)
+        return snap
+
+    def smoothed_levels(snap):
+        igpu_util, npu_util, dgpu_util = signals.values()
+        levels = {d: v for d, v in (("dGPU", dgpu_util), ("iGPU", igpu_util), ("NPU", npu_util)) if devices.get(d)}
+        if len(snap.dgpus) > 1:
+            # 多張卡：每張卡各自的門檻帶
+            levels.update({f"dGPU:{c.get('index', 0)}": c.get("utilization", 0.0) for c in snap.dgpus})
+        # 選擇也取決於可用 VRAM 與記憶體配置：變化超過 MEMORY_DELTA_GB 時重新選擇
+        if snap.dgpus:
+            levels["dGPU_free_GB"] = max(card_free_GB(c) for c in snap.dgpus)
+        if placement is not None:
+            levels["system_free_GB"] = system_memory_GB()[1]
+        return levels
+
+    def evaluate(snap):
+        dgpu_util_vram, igpu_mem = snap.dgpu_free_GB, snap.igpu_mem_MB
+        if len(snap.dgpus) > 1:
+            dgpu_util_vram = max(card_free_GB(c) for c in snap.dgpus)
+        igpu_util, npu_util, dgpu_util = signals.values()
+        print(f"📈 {SIGNAL_MODE} 訊號 → iGPU {igpu_util:.1f}% | NPU {npu_util:.1f}% | dGPU {dgpu_util:.1f}%")
+        usable, model_list = devices, MODEL_LIST
+        if placement is not None:
+            # 已載入的模型記憶體已不在可用記憶體中，不能再計算一次
+            plan = placement.plan(devices, MODEL_LIST, dgpu_util_vram, igpu_mem,
+                                  loaded=ovms_loaded_servables(args.ovms_config, args.ovms_url))
+            print(f"📐 記憶體配置 → {placement.report(plan)}")
+            usable, model_list = placement.apply(devices, MODEL_LIST, plan)
+            if len(snap.dgpus) > 1 and usable.get("dGPU"):
+                # 多張卡時由 MultiDGpuSelector 逐卡檢查 VRAM，保留完整的 dGPU 模型清單
+                model_list = dict(model_list, dGPU=MODEL_LIST["dGPU"])
+        index = 0
+        if len(snap.dgpus) > 1:
+            best, index, model = dgpu_selector.select(usable, igpu_util, npu_util, snap.dgpus, usage_threshold,
+                                                      model_list, MODEL_VRAM)
+            print(f"建議使用裝置: {best}{f' #{index}' if best == 'dGPU' else ''}, 模型: {model}")
+        else:
+            best, model = selector.select(usable, igpu_util, npu_util, dgpu_util, dgpu_util_vram, usage_threshold, model_list, MODEL_VRAM)
+            print(f"建議使用裝置: {best}, 模型: {model}")
+        if manager is not None:
+            next_likely = predict_next_candidates(select_fn, usable, (best, model), igpu_util, npu_util, dgpu_util,
+                                                  dgpu_util_vram, usage_threshold, model_list, MODEL_VRAM)
+            manager.on_selection(best, model, next_likely)
+        return best, index, model
+
+    # ⬅️ 事件驅動：訊號跨越門檻帶、可用 VRAM / 系統記憶體變化超過 1 GB 或有待確認的切換時每秒重新選擇，
+    #    閒置時取樣間隔拉長到 --heartbeat (預設 10 秒，與原本固定輪詢相同的最長反應時間)
+    MEMORY_DELTA_GB = 1.0
+    scheduler = SelectionScheduler(
+        sample, evaluate,
+        thresholds={"dGPU": 50.0, "iGPU": usage_threshold * 100, "NPU": usage_threshold * 100},
+        levels_fn=smoothed_levels, pending_fn=lambda: selector.pending, heartbeat=args.heartbeat,
+        deltas={"dGPU_free_GB": MEMORY_DELTA_GB, "system_free_GB": MEMORY_DELTA_GB},
+    )
+    scheduler.subscribe(lambda e: print(f"🔔 裝置變更: {e['previous'][0] if e['previous'] else '-'} → "
+                                        f"{e['device']} #{e['index']} ({e['model']})，原因: {e['reason']}"))
+    try:
+        scheduler.run()
+    except KeyboardInterrupt:
+        pass
 
 
 # import time
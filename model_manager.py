@@ -0,0 +1,380 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from config_store import ConfigStore, LIST_NAMES
+from lazy_import import lazy_import
+from throughput_model import model_key
+
+
+# placement 只用到 model_disk_size_GB，第一次送出 HTTP 請求時才載入 requests
+requests = lazy_import("requests")
+
+# 裝置 → 記憶體池：iGPU / NPU 共用系統記憶體，dGPU 使用自己的 VRAM
+MEMORY_POOL = {"dGPU": "dGPU", "iGPU": "system", "NPU": "system"}
+READY_TIMEOUT_S = 600.0
+
+
+def model_disk_size_GB(base_path: str) -> float:
+    """以模型資料夾內 .bin 權重大小估計載入後的記憶體用量 (GB)。"""
+    total = 0
+    for root, _, files in os.walk(base_path):
+        for name in files:
+            if name.endswith(".bin"):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total / 1024 ** 3
+
+
+# ============================================================
+# 🗄️ 模型主機：OVMS (config.json + reload API) 與 Ollama
+# ============================================================
+
+class OVMSModelHost:
+    """
+    以改寫 config.json (config_store，與 export_model 共用檔案鎖) 控制 OVMS 載入哪些 servable。
+
+    格式與 export_model.add_servable_to_config 相同 ({"name", "base_path"})，
+    卸載時把條目從 config 移除，並記住 base_path 以便之後重新載入。
+
+    參數：
+        config_path (str): OVMS 使用的 config.json
+        base_url (str): OVMS REST 位址，例如 "http://localhost:8000"
+        reload_api (bool): True 時寫入後呼叫 POST /v1/config/reload；
+            False 時依賴 OVMS 的檔案輪詢 (--file_system_poll_wait_seconds)
+    """
+
+    def __init__(self, config_path: str = "config.json", base_url: str = "http://localhost:8000",
+                 reload_api: bool = True, timeout: float = 5.0):
+        self.config_path = config_path
+        self.base_url = base_url.rstrip("/")
+        self.reload_api = reload_api
+        self.timeout = timeout
+        self.session = requests.Session()
+        # config 內容真的改變時才觸發一次 reload
+        self.store = ConfigStore(config_path, on_change=lambda config, changed: self.reload())
+        # 名稱 → (清單名稱, 條目)；包含目前已卸載的 servable
+        self.catalog: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        for list_name, entry in ConfigStore.entries(self.store.read()):
+            self.catalog[entry["name"]] = (list_name, dict(entry))
+
+    def resolve(self, model: str) -> Optional[str]:
+        """MODEL_LIST 名稱 ("OpenVINO/Qwen3-8B-int4-ov") → config 中的 servable 名稱。"""
+        for name in (model, model_key(model)):
+            if name in self.catalog:
+                return name
+        return None
+
+    def loaded(self) -> List[str]:
+        return self.store.names()
+
+    def register(self, name: str, base_path: str, list_name: str = "mediapipe_config_list") -> None:
+        """加入尚未出現在 config 中的 servable (不會立即載入)。"""
+        self.catalog[name] = (list_name, {"name": name, "base_path": Path(base_path).as_posix()})
+
+    def size_GB(self, model: str) -> float:
+        name = self.resolve(model)
+        if name is None:
+            return 0.0
+        base_path = self.catalog[name][1].get("base_path", "")
+        if not os.path.isabs(base_path):
+            base_path = os.path.join(os.path.dirname(os.path.abspath(self.config_path)), base_path)
+        return model_disk_size_GB(base_path)
+
+    def set_loaded(self, load: List[str] = (), unload: List[str] = ()) -> None:
+        """一次改寫 config.json：加入 load、移除 unload；內容有變才觸發 reload。"""
+        load = [n for n in (self.resolve(m) for m in load) if n]
+        unload = {n for n in (self.resolve(m) for m in unload) if n}
+        with self.store.transaction() as config:
+            present = {entry["name"] for _, entry in ConfigStore.entries(config)}
+            for list_name in LIST_NAMES:
+                config[list_name] = [item for item in config[list_name]
+                                     if item.get("config", item)["name"] not in unload]
+            for name in load:
+                if name in present:
+                    continue
+                list_name, entry = self.catalog[name]
+                config[list_name].append({"config": entry} if list_name == "model_config_list" else entry)
+
+    def reload(self) -> None:
+        if not self.reload_api:
+            return
+        try:
+            # OVMS 在新模型載入完成後才回應 reload
+            self.session.post(f"{self.base_url}/v1/config/reload", timeout=(self.timeout, READY_TIMEOUT_S))
+        except requests.RequestException as e:
+            print(f"⚠️ OVMS config reload 失敗: {e}")
+
+    def is_ready(self, model: str) -> bool:
+        name = self.resolve(model) or model
+        try:
+            r = self.session.get(f"{self.base_url}/v2/models/{name}/ready", timeout=self.timeout)
+            return r.status_code == 200
+        except requests.RequestException:
+            return False
+
+    # ModelManager 介面
+    def load(self, model: str) -> None:
+        self.set_loaded(load=[model])
+
+    def unload(self, model: str) -> None:
+        self.set_loaded(unload=[model])
+
+
+class OllamaModelHost:
+    """
+    以 Ollama API 預熱 / 卸載 dGPU 模型：
+    POST /api/generate {"model", "keep_alive"} 只載入模型不生成；keep_alive=0 立即卸載。
+    """
+
+    def __init__(self, base_url: str = "http://localhost:11434", keep_alive: str = "30m", timeout: float = 600.0):
+        self.base_url = base_url.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = timeout
+        self.session = requests.Session()
+        self._loaded: set = set()
+
+    def resolve(self, model: str) -> Optional[str]:
+        return model
+
+    def loaded(self) -> List[str]:
+        try:
+            r = self.session.get(f"{self.base_url}/api/ps", timeout=5)
+            return [m["name"] for m in r.json().get("models", [])]
+        except (requests.RequestException, ValueError, KeyError):
+            return list(self._loaded)
+
+    def size_GB(self, model: str) -> float:
+        return 0.0
+
+    def load(self, model: str) -> None:
+        # 同步呼叫：Ollama 在模型載入完成後才回應
+        self.session.post(f"{self.base_url}/api/generate",
+                          json={"model": model, "keep_alive": self.keep_alive}, timeout=self.timeout)
+        self._loaded.add(model)
+
+    def unload(self, model: str) -> None:
+        try:
+            self.session.post(f"{self.base_url}/api/generate", json={"model": model, "keep_alive": 0}, timeout=30)
+        except requests.RequestException as e:
+            print(f"⚠️ Ollama 卸載 {model} 失敗: {e}")
+        self._loaded.discard(model)
+
+    def is_ready(self, model: str) -> bool:
+        return model in self._loaded
+
+
+# ============================================================
+# 🔥 模型生命週期：預熱下一個可能的裝置、在記憶體預算內淘汰冷模型
+# ============================================================
+
+class ModelManager:
+    """
+    裝置切換時：
+        1. 確保選中的 (device, model) 已載入；原本是冷的就等待並記錄暖機延遲
+        2. 預熱「下一個最可能」的候選 (目前裝置不可用時 select_fn 會選的組合)
+        3. 各記憶體池超出預算時，依最近使用時間淘汰其他模型
+
+    參數：
+        hosts (dict): 裝置 → OVMSModelHost / OllamaModelHost
+        budget_GB (dict): 記憶體池預算，例如 {"system": 12, "dGPU": 16}
+        model_mem_GB (dict, optional): 模型記憶體用量 (GB)；未列出時由 host.size_GB() 估計
+        ready_timeout (float): 等待模型就緒的秒數上限
+        poll_interval (float): 就緒輪詢間隔
+    """
+
+    def __init__(self, hosts: Dict[str, Any], budget_GB: Optional[Dict[str, float]] = None,
+                 model_mem_GB: Optional[Dict[str, float]] = None, ready_timeout: float = READY_TIMEOUT_S,
+                 poll_interval: float = 0.2):
+        self.hosts = hosts
+        self.budget_GB = budget_GB or {}
+        self.model_mem_GB = dict(model_mem_GB or {})
+        self.ready_timeout = ready_timeout
+        self.poll_interval = poll_interval
+
+        # (記憶體池, servable 名稱) → 最近使用時間：iGPU / NPU 共用同一個 OVMS 時，
+        # 同一個 servable 只算一次，不論是以哪個裝置選到
+        self.resident: Dict[Tuple[str, str], float] = {}
+        self._owner: Dict[Tuple[str, str], Any] = {}        # 同上的鍵 → 負責載入/卸載的 host
+        self.pinned: set = set()
+        self.current: Optional[Tuple[str, str]] = None
+        self.switches: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str], Any] = {}
+        # 單一背景工作執行緒：載入/卸載依序執行，不阻塞主迴圈
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-manager")
+
+        seen = set()
+        for device, host in hosts.items():
+            # 多個裝置共用同一個 OVMS 時，已載入的模型只記一次
+            if id(host) in seen:
+                continue
+            seen.add(id(host))
+            for name in host.loaded():
+                key = self._key(device, name)
+                self.resident[key] = 0.0
+                self._owner[key] = host
+
+    def _mem(self, key: Tuple[str, str]) -> float:
+        name = key[1]
+        if name not in self.model_mem_GB:
+            # model_mem_GB 可能以 MODEL_LIST 名稱 ("OpenVINO/Qwen3-8B-int4-ov") 為鍵
+            alias = next((m for m in self.model_mem_GB if model_key(m) == model_key(name)), None)
+            self.model_mem_GB[name] = (self.model_mem_GB[alias] if alias is not None
+                                       else self._owner[key].size_GB(name))
+        return self.model_mem_GB[name]
+
+    def _key(self, device: str, model: str) -> Tuple[str, str]:
+        """(記憶體池, servable 名稱)：共用 host 的裝置選到同一個模型時得到相同的鍵。"""
+        name = self.hosts[device].resolve(model) or model
+        return MEMORY_POOL.get(device, device), name
+
+    def is_resident(self, device: str, model: str) -> bool:
+        return self._key(device, model) in self.resident
+
+    # --------------------------------------------------------
+    # 載入 / 等待就緒 / 淘汰
+    # --------------------------------------------------------
+    def _load_and_wait(self, device: str, model: str) -> Tuple[float, float]:
+        """回傳 (暖機秒數, 淘汰秒數)：暖機只計載入到就緒，不含卸載其他模型的時間。"""
+        host = self.hosts[device]
+        key = self._key(device, model)
+        self._owner.setdefault(key, host)
+        evict_start = time.perf_counter()
+        self._evict_for(key)
+        start = time.perf_counter()
+        host.load(model)
+        deadline = start + self.ready_timeout
+        while not host.is_ready(model):
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"{device}/{model} not ready after {self.ready_timeout:.0f}s")
+            time.sleep(self.poll_interval)
+        with self._lock:
+            self.resident[key] = time.monotonic()
+        return time.perf_counter() - start, start - evict_start
+
+    def _evict_for(self, key: Tuple[str, str]) -> None:
+        pool = key[0]
+        budget = self.budget_GB.get(pool)
+        if budget is None:
+            return
+        need = self._mem(key)
+        with self._lock:
+            in_pool = [(k, t) for k, t in self.resident.items() if k[0] == pool]
+            used = sum(self._mem(k) for k, _ in in_pool)
+            # 要載入的模型若已常駐就不重複計算
+            if key in self.resident:
+                need = 0.0
+            # 最久未使用的先淘汰；要載入的模型、目前使用中與預熱目標不淘汰
+            victims = [k for k, _ in sorted(in_pool, key=lambda x: x[1]) if k != key and k not in self.pinned]
+        for victim in victims:
+            if used + need <= budget:
+                break
+            print(f"🧊 淘汰冷模型 {victim[1]} ({victim[0]}, {self._mem(victim):.1f} GB)")
+            self._owner[victim].unload(victim[1])
+            used -= self._mem(victim)
+            with self._lock:
+                self.resident.pop(victim, None)
+
+    def ensure_loaded(self, device: str, model: str):
+        """在背景載入 (已載入或已排程時不重複)，回傳 Future。"""
+        key = self._key(device, model)
+        with self._lock:
+            if key in self.resident:
+                self.resident[key] = time.monotonic()
+                return None
+            future = self._pending.get(key)
+            if future is not None and not future.done():
+                return future
+            future = self._executor.submit(self._load_and_wait, device, model)
+            self._pending[key] = future
+        return future
+
+    # --------------------------------------------------------
+    # 給 main.py 呼叫
+    # --------------------------------------------------------
+    def on_selection(self, device: str, model: str, next_candidates: List[Tuple[str, str]] = ()) -> None:
+        """
+        每次決策後呼叫。裝置/模型改變時記錄一次切換與其暖機延遲 warmup_s
+        (目標已預熱時為 0；淘汰冷模型的時間另記於 evict_s)，並預熱 next_candidates。
+        """
+        choice = (device, model)
+        self.pinned = {self._key(*choice)} | {self._key(*c) for c in next_candidates if c[0] in self.hosts}
+
+        if choice != self.current and device in self.hosts:
+            record = {"from": self.current, "to": choice, "timestamp": time.time(),
+                      "warm": self.is_resident(device, model), "warmup_s": 0.0, "evict_s": 0.0}
+            self.switches.append(record)
+            future = self.ensure_loaded(device, model)
+            if future is not None:
+                future.add_done_callback(lambda f, r=record: self._finish_switch(r, f))
+            else:
+                print(f"🔥 切換到 {device}/{model}：模型已預熱，暖機延遲 0 s")
+        self.current = choice
+
+        for cand in next_candidates:
+            if cand != choice and cand[0] in self.hosts:
+                self.ensure_loaded(*cand)
+
+    @staticmethod
+    def _finish_switch(record: Dict[str, Any], future) -> None:
+        try:
+            record["warmup_s"], record["evict_s"] = future.result()
+            print(f"⏱️ 切換到 {record['to'][0]}/{record['to'][1]}：冷啟動暖機 {record['warmup_s']:.2f} s"
+                  + (f" (另淘汰冷模型 {record['evict_s']:.2f} s)" if record["evict_s"] >= 0.01 else ""))
+        except Exception as e:
+            record["error"] = str(e)
+            print(f"❌ 載入 {record['to'][1]} 失敗: {e}")
+
+    def wait_idle(self, timeout: Optional[float] = None) -> None:
+        """等待所有排程中的載入完成 (測試與關閉時使用)。"""
+        for future in list(self._pending.values()):
+            future.exception(timeout=timeout)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def predict_next_candidates(select_fn: Callable[..., Tuple[str, str]], devices: Dict[str, Any],
+                            current: Tuple[str, str], *args, **kwargs) -> List[Tuple[str, str]]:
+    """
+    預測下一個最可能的 (device, model)：假設目前裝置不可用 (例如負載升高)，
+    select_fn 會改選哪個組合。參數與 select_best_device_and_model 相同 (devices 之後)。
+    """
+    others = dict(devices)
+    others[current[0]] = False
+    if not any(others.get(d, False) for d in ("dGPU", "iGPU", "NPU")):
+        return []
+    candidate = select_fn(others, *args, **kwargs)
+    return [candidate] if candidate != current and others.get(candidate[0], False) else []
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="OVMS model prewarm / evict demo")
+    parser.add_argument("--config", default="config.json")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--budget", type=float, default=12.0, help="system memory budget for iGPU+NPU models (GB)")
+    args = parser.parse_args()
+
+    host = OVMSModelHost(args.config, args.url)
+    manager = ModelManager({"iGPU": host, "NPU": host}, budget_GB={"system": args.budget})
+    print(f"📦 已知 servable: {list(host.catalog)}")
+    print(f"📦 目前載入: {host.loaded()}")
+    manager.on_selection("iGPU", "Qwen3-8B-int4-ov", [("NPU", "Qwen3-8B-int4-cw-ov")])
+    manager.wait_idle()
+    manager.on_selection("NPU", "Qwen3-8B-int4-cw-ov", [("iGPU", "Qwen3-8B-int4-ov")])
+    manager.wait_idle()
+    for s in manager.switches:
+        print(s)
+    manager.close()
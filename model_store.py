@@ -0,0 +1,261 @@
+import os
+import sys
+import json
+import errno
+import shutil
+import hashlib
+import platform
+from typing import Any, Dict, List
+
+# ============================================================
+# 🗃️ 以內容雜湊儲存模型檔案 (跨模型資料夾去重)
+# ============================================================
+# models/ 之下 Qwen3-4B / 8B 的 -ov 與 -cw-ov 版本、各裝置副本常有相同的
+# tokenizer / detokenizer 檔案。每個檔案依 SHA-256 存一份到 <store>/sha256/ab/<digest>，
+# 模型資料夾內的檔案改成指向它的 hardlink：
+#   - 磁碟只存一份
+#   - OVMS 以 mmap 讀取時同一個 inode 共用 page cache
+# reflink (btrfs / XFS 的 copy-on-write 複製) 只共用磁碟區塊、不共用 page cache，
+# 但之後就地修改檔案也不會影響其他模型。
+
+STORE_DIR = ".blobs"
+INDEX_FILE = "index.json"
+MIN_SIZE = 4096   # 太小的檔案去重沒有意義
+# 會被 export_model 就地改寫的檔案不可共用
+SKIP_FILES = {"graph.pbtxt", "config.json"}
+_FICLONE = 0x40049409  # Linux ioctl: reflink 整個檔案
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 22), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _reflink(src: str, dst: str) -> None:
+    if platform.system() != "Linux":
+        raise OSError(errno.EOPNOTSUPP, "reflink is only supported on Linux")
+    import fcntl
+    with open(src, "rb") as s, open(dst, "wb") as d:
+        try:
+            fcntl.ioctl(d.fileno(), _FICLONE, s.fileno())
+        except OSError:
+            d.close()
+            os.unlink(dst)
+            raise
+
+
+def unshare_links(model_dir: str) -> int:
+    """
+    把資料夾內的 hardlink 換成獨立的複本，回傳處理的檔案數。
+    export_model 以 --overwrite_models 重新匯出前呼叫，避免就地寫入時改到其他模型共用的檔案。
+    """
+    count = 0
+    for root, _, files in os.walk(model_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.islink(path) or os.stat(path).st_nlink <= 1:
+                continue
+            tmp_path = path + ".unshare.tmp"
+            shutil.copy2(path, tmp_path)
+            os.replace(tmp_path, path)
+            count += 1
+    return count
+
+
+class ContentStore:
+    """
+    內容定址的檔案庫。
+
+    index.json 記錄每個被連結的模型檔案：{"paths": {絕對路徑: {"digest", "size", "mtime_ns"}}}，
+    用來在重複執行 dedup 時略過沒有變動的檔案，以及判斷 blob 是否已無人使用。
+
+    參數：
+        root (str): 儲存位置，需與模型資料夾在同一個檔案系統 (hardlink 限制)
+        mode (str): "hardlink" (預設，共用 page cache) 或 "reflink"
+    """
+
+    def __init__(self, root: str, mode: str = "hardlink"):
+        if mode not in ("hardlink", "reflink"):
+            raise ValueError(f"unknown link mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.index_path = os.path.join(root, INDEX_FILE)
+        self.paths: Dict[str, Dict[str, Any]] = {}
+        os.makedirs(os.path.join(root, "sha256"), exist_ok=True)
+        if os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path, "r", encoding="utf-8") as f:
+                    self.paths = json.load(f).get("paths", {})
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 檔案庫索引損毀，將重新建立: {e}", file=sys.stderr)
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, "sha256", digest[:2], digest)
+
+    def save(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"paths": self.paths}, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    # --------------------------------------------------------
+    # 去重
+    # --------------------------------------------------------
+    def _unchanged(self, path: str, st: os.stat_result) -> bool:
+        entry = self.paths.get(path)
+        if entry is None or not os.path.isfile(self.blob_path(entry["digest"])):
+            return False
+        if self.mode == "hardlink":
+            return os.path.samefile(self.blob_path(entry["digest"]), path)
+        return entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns
+
+    def _link(self, blob: str, path: str) -> None:
+        tmp_path = path + ".dedup.tmp"
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        if self.mode == "reflink":
+            _reflink(blob, tmp_path)
+            shutil.copystat(blob, tmp_path)
+        else:
+            os.link(blob, tmp_path)
+        os.replace(tmp_path, path)
+
+    def ingest(self, path: str) -> int:
+        """把單一檔案放入檔案庫並換成連結，回傳省下的位元組數 (已存在相同內容時)。"""
+        path = os.path.abspath(path)
+        st = os.stat(path)
+        if self._unchanged(path, st):
+            return 0
+        digest = file_digest(path)
+        blob = self.blob_path(digest)
+        saved = 0
+        if not os.path.isfile(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            # 第一份內容：hardlink 直接讓檔案庫指向同一個 inode，不必複製
+            if self.mode == "reflink":
+                _reflink(path, blob)
+                shutil.copystat(path, blob)
+            else:
+                os.link(path, blob)
+        elif not os.path.samefile(blob, path):
+            self._link(blob, path)
+            saved = st.st_size
+        st = os.stat(path)
+        self.paths[path] = {"digest": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        return saved
+
+    def dedup(self, model_dir: str, min_size: int = MIN_SIZE) -> Dict[str, Any]:
+        """
+        把模型資料夾內的檔案換成檔案庫中的連結。
+
+        回傳：
+            dict：{"files": 處理的檔案數, "linked": 換成共用連結的檔案數, "saved_MB": 省下的空間}
+        """
+        stats = {"files": 0, "linked": 0, "saved_MB": 0.0}
+        store = os.path.abspath(self.root)
+        for root, dirs, files in os.walk(model_dir):
+            # 不處理檔案庫自己 (預設放在 models/.blobs)
+            dirs[:] = [d for d in dirs if os.path.abspath(os.path.join(root, d)) != store]
+            for name in files:
+                path = os.path.join(root, name)
+                if name in SKIP_FILES or name.endswith(".tmp") or os.path.islink(path):
+                    continue
+                if os.path.getsize(path) < min_size:
+                    continue
+                try:
+                    saved = self.ingest(path)
+                except OSError as e:
+                    if e.errno == errno.EXDEV:
+                        print(f"⚠️ {path} 與檔案庫不在同一個檔案系統，無法連結")
+                        continue
+                    raise
+                stats["files"] += 1
+                if saved:
+                    stats["linked"] += 1
+                    stats["saved_MB"] += saved / 1024 ** 2
+        self.save()
+        return stats
+
+    # --------------------------------------------------------
+    # 清理
+    # --------------------------------------------------------
+    def _live_digests(self) -> set:
+        """仍有模型檔案使用的內容；同時移除已不存在或已被改寫的索引項目。"""
+        live = set()
+        for path, entry in list(self.paths.items()):
+            blob = self.blob_path(entry["digest"])
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self.paths[path]
+                continue
+            if self.mode == "hardlink":
+                linked = os.path.isfile(blob) and os.path.samefile(blob, path)
+            else:
+                # reflink 沒有共用 inode，只能以大小與修改時間判斷檔案沒被改寫
+                linked = st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]
+            if linked:
+                live.add(entry["digest"])
+            else:
+                del self.paths[path]
+        return live
+
+    def gc(self, dry_run: bool = False) -> List[str]:
+        """刪除沒有任何模型檔案使用的 blob，回傳被刪除 (或 dry_run 時將被刪除) 的 digest。"""
+        live = self._live_digests()
+        removed, freed = [], 0
+        blob_root = os.path.join(self.root, "sha256")
+        for prefix in sorted(os.listdir(blob_root)):
+            for digest in sorted(os.listdir(os.path.join(blob_root, prefix))):
+                blob = os.path.join(blob_root, prefix, digest)
+                # hardlink 模式下 st_nlink > 1 代表仍有資料夾連結到這個 inode
+                if digest in live or (self.mode == "hardlink" and os.stat(blob).st_nlink > 1):
+                    continue
+                removed.append(digest)
+                freed += os.path.getsize(blob)
+                if not dry_run:
+                    os.unlink(blob)
+        if not dry_run:
+            self.save()
+        print(f"🗑️ {'將' if dry_run else '已'}移除 {len(removed)} 個孤立 blob ({freed / 1024 ** 2:.1f} MB)")
+        return removed
+
+    def usage(self) -> Dict[str, float]:
+        """檔案庫大小與所有連結檔案的邏輯大小 (MB)。"""
+        stored = 0
+        for root, _, files in os.walk(os.path.join(self.root, "sha256")):
+            stored += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        logical = sum(entry["size"] for entry in self.paths.values())
+        return {"stored_MB": stored / 1024 ** 2, "logical_MB": logical / 1024 ** 2}
+
+
+def default_store(model_repository_path: str) -> str:
+    return os.path.join(model_repository_path, STORE_DIR)
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Content-addressed dedup of model files")
+    parser.add_argument("command", choices=["dedup", "gc", "usage"])
+    parser.add_argument("model_repository_path", nargs="?", default="models")
+    parser.add_argument("--store", default=None, help="default: <model_repository_path>/.blobs")
+    parser.add_argument("--mode", choices=["hardlink", "reflink"], default="hardlink")
+    parser.add_argument("--dry-run", action="store_true", help="gc: only list orphaned blobs")
+    args = parser.parse_args()
+
+    store = ContentStore(args.store or default_store(args.model_repository_path), args.mode)
+    if args.command == "dedup":
+        stats = store.dedup(args.model_repository_path)
+        print(f"🔗 {stats['files']} 個檔案，{stats['linked']} 個換成共用連結，省下 {stats['saved_MB']:.1f} MB")
+    elif args.command == "gc":
+        store.gc(args.dry_run)
+    usage = store.usage()
+    print(f"📦 檔案庫 {usage['stored_MB']:.1f} MB，模型檔案合計 {usage['logical_MB']:.1f} MB")
@@ -0,0 +1,165 @@
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from inflight import DEFAULT_TPS
+from throughput_model import ThroughputCurves
+
+
+# dGPU 使用率超過此值 (%) 時不再放新的請求 (與 select_best_device_and_model 相同)
+DGPU_UTIL_LIMIT = 50.0
+# 新卡的分數需高出目前的卡這個比例才切換，避免兩張負載相近的卡來回切換
+STICKINESS = 0.10
+
+
+# ============================================================
+# 🧮 每張 dGPU 的評分
+# ============================================================
+
+def card_free_GB(card: Dict[str, Any]) -> float:
+    return card.get("memory_free_MB", 0.0) / 1024.0
+
+
+def predicted_tps(model: str, util: float, curves: Optional[ThroughputCurves] = None) -> float:
+    """
+    模型在某張卡目前使用率下的預測 tokens/s：有 benchmark_final 量測的曲線時內插，
+    否則以 DEFAULT_TPS × 剩餘使用率估計。
+    """
+    if curves is not None:
+        value = curves.predict(model, "dGPU", {"dGPU": util})
+        if value is not None:
+            return value
+    return DEFAULT_TPS["dGPU"] * max(0.0, 1.0 - util / 100.0)
+
+
+def rank_cards(dgpus: List[Dict[str, Any]], model: str, model_vram: Dict[str, float],
+               utils: Dict[int, float], curves: Optional[ThroughputCurves] = None,
+               util_limit: float = DGPU_UTIL_LIMIT) -> List[Tuple[float, float, int]]:
+    """
+    列出放得下 model 且使用率 ≤ util_limit 的卡，依 (預測 tok/s, 可用 VRAM) 由高到低排序。
+
+    回傳：
+        [(預測 tok/s, 可用 VRAM GB, index), ...]
+    """
+    need = model_vram.get(model, 0)
+    ranked = []
+    for card in dgpus:
+        index = card.get("index", 0)
+        util = utils.get(index, card.get("utilization", 0.0))
+        if util > util_limit or card_free_GB(card) < need:
+            continue
+        ranked.append((predicted_tps(model, util, curves), card_free_GB(card), index))
+    return sorted(ranked, reverse=True)
+
+
+# ============================================================
+# 🎯 (裝置, 卡號, 模型) 選擇
+# ============================================================
+
+class MultiDGpuSelector:
+    """
+    多張 NVIDIA 卡時逐卡評估，回傳 (device, index, model)；iGPU / NPU 的 index 為 0。
+
+    流程：
+        1. 每張卡的使用率先做 EWMA 平滑
+        2. 找出可放在任何一張卡上的最大 dGPU 模型 (與 pick_best_dgpu_model 相同的偏好)，
+           把最適合的那張卡的使用率與可用 VRAM 交給原本的 select_fn
+           (select_by_throughput、prefer_warm、HysteresisSelector.select 等都能直接沿用)
+        3. select_fn 選了 dGPU 時，在放得下該模型的卡中選預測 tok/s 最高者
+           (平手時選可用 VRAM 較多者)，藉此把負載分散到各張卡
+
+    參數：
+        select_fn (callable): 與 main.select_best_device_and_model 相同簽名
+        curves (ThroughputCurves, optional): dGPU 吞吐量曲線
+        util_limit (float): 單卡使用率上限 (%)
+        alpha (float): 每張卡使用率的 EWMA 係數
+        stickiness (float): 換卡需要的最低分數優勢 (比例)
+    """
+
+    def __init__(self, select_fn: Callable[..., Tuple[str, str]], curves: Optional[ThroughputCurves] = None,
+                 util_limit: float = DGPU_UTIL_LIMIT, alpha: float = 0.3, stickiness: float = STICKINESS):
+        self.select_fn = select_fn
+        self.curves = curves
+        self.util_limit = util_limit
+        self.alpha = alpha
+        self.stickiness = stickiness
+        self.utils: Dict[int, float] = {}
+        self.current_index: Optional[int] = None
+
+    def update(self, dgpus: List[Dict[str, Any]]) -> Dict[int, float]:
+        for card in dgpus:
+            index, util = card.get("index", 0), card.get("utilization", 0.0)
+            prev = self.utils.get(index)
+            self.utils[index] = util if prev is None else self.alpha * util + (1 - self.alpha) * prev
+        return self.utils
+
+    def pick_card(self, model: str, dgpus: List[Dict[str, Any]], model_vram: Dict[str, float]) -> Optional[int]:
+        ranked = rank_cards(dgpus, model, model_vram, self.utils, self.curves, self.util_limit)
+        if not ranked:
+            return None
+        best_tps, _, best = ranked[0]
+        # 目前的卡仍放得下且分數差距不大 → 留在原卡
+        for tps, _, index in ranked:
+            if index == self.current_index and tps >= best_tps * (1 - self.stickiness):
+                return index
+        return best
+
+    def select(self, devices, igpu_util, npu_util, dgpus, usage_threshold, model_list,
+               model_vram) -> Tuple[str, int, str]:
+        """
+        參數與 select_best_device_and_model 相同，但 dgpu_util / dgpu_mem 換成
+        dgpus (TelemetrySnapshot.dgpus：每張卡的 utilization / memory_free_MB)。
+
+        回傳：
+            tuple (str, int, str): (裝置名稱, 卡號, 模型名稱)
+        """
+        self.update(dgpus)
+        # 代表卡：可以放下最大 dGPU 模型的卡
+        lead = None
+        for model in sorted(model_list.get("dGPU", []), key=lambda m: model_vram.get(m, 0), reverse=True):
+            lead = self.pick_card(model, dgpus, model_vram)
+            if lead is not None:
+                break
+        if lead is None and dgpus:
+            lead = min(dgpus, key=lambda c: self.utils.get(c.get("index", 0), 0.0)).get("index", 0)
+        card = next((c for c in dgpus if c.get("index", 0) == lead), None)
+        dgpu_util = self.utils.get(lead, 100.0) if card is not None else 0.0
+        dgpu_mem = card_free_GB(card) if card is not None else 0.0
+
+        device, model = self.select_fn(devices, igpu_util, npu_util, dgpu_util, dgpu_mem,
+                                       usage_threshold, model_list, model_vram)
+        if device != "dGPU":
+            return device, 0, model
+        index = self.pick_card(model, dgpus, model_vram)
+        index = lead if index is None else index
+        if index != self.current_index and self.current_index is not None:
+            print(f"🔀 dGPU 換卡: GPU {self.current_index} → GPU {index}")
+        self.current_index = index
+        print(f"🎯 dGPU {index} ({self.utils.get(index, 0.0):.1f}%)，模型 {model}")
+        return device, index, model
+
+
+# ============================================================
+# 🧾 主程式：以 fake_nvidia_smi 模擬多張卡
+# ============================================================
+
+if __name__ == "__main__":
+    import os
+    import sys
+    import argparse
+    from main import select_best_device_and_model, MODEL_LIST, MODEL_VRAM
+    from get_dgpu_usage import query_all_gpus
+
+    parser = argparse.ArgumentParser(description="Multi-dGPU selection demo")
+    parser.add_argument("--gpus", type=int, default=None, help="simulate N GPUs with fake_nvidia_smi.py")
+    args = parser.parse_args()
+
+    cmd = None
+    if args.gpus:
+        os.environ["FAKE_NVIDIA_SMI_GPUS"] = str(args.gpus)
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_nvidia_smi.py")]
+    dgpus = query_all_gpus(cmd)
+    for card in dgpus:
+        print(f"💾 GPU {card['index']} {card['name']}: {card['utilization']:.0f}% "
+              f"| free {card_free_GB(card):.1f} GB / {card['memory_total_MB'] / 1024:.1f} GB")
+    selector = MultiDGpuSelector(select_best_device_and_model)
+    devices = {"dGPU": bool(dgpus), "iGPU": True, "NPU": True}
+    print(selector.select(devices, 30.0, 10.0, dgpus, 0.5, MODEL_LIST, MODEL_VRAM))
@@ -0,0 +1,256 @@
+import json
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# httpx + h2 為選用套件，有安裝時才能使用 HTTP/2
+try:
+    import httpx
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+
+OVMS_PORTS = {"iGPU": 8000, "NPU": 8001}
+CHAT_PATH = "/v3/chat/completions"
+HEALTH_PATH = "/v2/health/ready"
+
+CONNECT_TIMEOUT = 3.0     # 建立連線逾時 (秒)
+READ_TIMEOUT = 600.0      # 等待回應逾時 (秒)；長生成可能需要數分鐘
+KEEPALIVE_IDLE_S = 30.0   # 閒置超過此秒數視為連線可能已被關閉，下次請求前重新暖機
+
+
+def chat_payload(model: str, prompt: str, max_tokens: int, stream: bool = False, **extra) -> Dict[str, Any]:
+    """OVMS /v3/chat/completions 的請求內容。"""
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": "You are a helpful assistant."},
+            {"role": "user", "content": prompt}
+        ],
+        "max_new_tokens": max_tokens,
+        "max_tokens": max_tokens,
+        "temperature": 0
+    }
+    if stream:
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+    payload.update(extra)
+    return payload
+
+
+# ============================================================
+# 🔗 單一 OVMS 端點的 keep-alive 用戶端
+# ============================================================
+
+class OVMSClient:
+    """
+    共用的 OVMS 用戶端：每個端點一個連線池 (requests.Session，或 HTTP/2 的 httpx.Client)。
+
+    計時時先呼叫 ensure_warm() 以健康檢查建立連線，
+    建立連線的時間記在 connect_s，不會落在推論計時區間內。
+
+    參數：
+        base_url (str): 例如 "http://localhost:8000"
+        connect_timeout / read_timeout (float): 逾時秒數
+        http2 (bool): 使用 HTTP/2 (需要 httpx 與 h2，否則退回 HTTP/1.1 keep-alive)
+        pool_size (int): 連線池大小
+    """
+
+    def __init__(self, base_url: str = "http://localhost:8000", connect_timeout: float = CONNECT_TIMEOUT,
+                 read_timeout: float = READ_TIMEOUT, http2: bool = False, pool_size: int = 8,
+                 keepalive_idle_s: float = KEEPALIVE_IDLE_S):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.keepalive_idle_s = keepalive_idle_s
+        self.connect_s = 0.0          # 最近一次建立連線 (暖機) 的耗時
+        self._last_used: Optional[float] = None
+
+        if http2 and not HTTP2_AVAILABLE:
+            print("⚠️ 未安裝 httpx[http2]，改用 HTTP/1.1 keep-alive")
+        self.http2 = http2 and HTTP2_AVAILABLE
+
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            )
+            self._errors = (httpx.HTTPError,)
+        else:
+            self._client = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self._client.mount("http://", adapter)
+            self._client.mount("https://", adapter)
+            self._errors = (requests.RequestException,)
+
+    # --------------------------------------------------------
+    # 基本請求
+    # --------------------------------------------------------
+    def get(self, path: str, timeout: Optional[Tuple[float, float]] = None):
+        response = self._client.get(self.base_url + path, timeout=self._timeout(timeout))
+        self._last_used = time.monotonic()
+        return response
+
+    def post(self, path: str, payload: Dict[str, Any], timeout: Optional[Tuple[float, float]] = None):
+        response = self._client.post(self.base_url + path, json=payload, timeout=self._timeout(timeout))
+        self._last_used = time.monotonic()
+        return response
+
+    def _timeout(self, timeout: Optional[Tuple[float, float]]):
+        connect, read = timeout or self.timeout
+        if self.http2:
+            return httpx.Timeout(read, connect=connect)
+        return (connect, read)
+
+    def ensure_warm(self) -> float:
+        """
+        若尚未連線或閒置太久，先送一次健康檢查建立連線。
+        回傳這次建立連線花費的秒數 (已經是熱連線時回傳 0)。
+        """
+        now = time.monotonic()
+        if self._last_used is not None and now - self._last_used < self.keepalive_idle_s:
+            return 0.0
+        start = time.perf_counter()
+        try:
+            self.get(HEALTH_PATH, timeout=(self.timeout[0], self.timeout[0]))
+        except self._errors as e:
+            print(f"⚠️ OVMS {self.base_url} 暖機失敗: {e}")
+            return 0.0
+        self.connect_s = time.perf_counter() - start
+        return self.connect_s
+
+    def ready(self) -> bool:
+        try:
+            return self.get(HEALTH_PATH).status_code == 200
+        except self._errors:
+            return False
+
+    # --------------------------------------------------------
+    # Chat completions
+    # --------------------------------------------------------
+    def chat(self, model: str, prompt: str, max_tokens: int, **extra) -> Tuple[Optional[Dict[str, Any]], Dict[str, float]]:
+        """
+        非串流請求。
+
+        回傳：
+            (data, timing) — data 為 OVMS 回應 JSON (失敗時為 None)；
+            timing = {"connect_s": 連線建立時間, "inference_s": 熱連線上的請求時間}
+        """
+        connect_s = self.ensure_warm()
+        start = time.perf_counter()
+        try:
+            response = self.post(CHAT_PATH, chat_payload(model, prompt, max_tokens, **extra))
+        except self._errors as e:
+            print(f"❌ Model request error from {self.base_url}: {e}")
+            return None, {"connect_s": connect_s, "inference_s": time.perf_counter() - start}
+        timing = {"connect_s": connect_s, "inference_s": time.perf_counter() - start}
+
+        if response.status_code != 200:
+            print(f"❌ Model request error from {self.base_url}: {response.text}")
+            return None, timing
+        return response.json(), timing
+
+    def stream_chat(self, model: str, prompt: str, max_tokens: int, **extra) -> Iterator[Tuple[float, Dict[str, Any]]]:
+        """
+        串流請求 (SSE)；逐一產生 (抵達時間 perf_counter, chunk JSON)。
+        計時的呼叫端應先呼叫 ensure_warm() 再記錄起始時間。
+        HTTP 錯誤時拋出 RuntimeError。
+        """
+        self.ensure_warm()
+        payload = chat_payload(model, prompt, max_tokens, stream=True, **extra)
+        url = self.base_url + CHAT_PATH
+
+        if self.http2:
+            ctx = self._client.stream("POST", url, json=payload, timeout=self._timeout(None))
+        else:
+            ctx = self._client.post(url, json=payload, stream=True, timeout=self._timeout(None))
+
+        with ctx as response:
+            if response.status_code != 200:
+                if self.http2:
+                    response.read()   # httpx 串流回應需先讀取本體才能取得 text
+                raise RuntimeError(f"Model request error from {self.base_url}: {response.text}")
+            for line in response.iter_lines():
+                if isinstance(line, str):
+                    line = line.encode("utf-8")
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                now = time.perf_counter()
+                try:
+                    yield now, json.loads(data)
+                except ValueError:
+                    continue
+        self._last_used = time.monotonic()
+
+    @property
+    def errors(self):
+        """此用戶端可能拋出的傳輸層例外 (requests 或 httpx)。"""
+        return self._errors
+
+    def close(self) -> None:
+        self._client.close()
+
+
+# ============================================================
+# 🗂️ 每個端點共用一個用戶端
+# ============================================================
+
+_clients: Dict[str, OVMSClient] = {}
+
+
+def base_url(port_or_device=8000, host: str = "localhost") -> str:
+    """連接埠 (8000)、裝置名稱 ("iGPU" / "NPU") 或完整 URL → "http://host:port"。"""
+    if isinstance(port_or_device, str) and port_or_device.startswith("http"):
+        return port_or_device.rstrip("/")
+    port = OVMS_PORTS.get(port_or_device, port_or_device)
+    return f"http://{host}:{port}"
+
+
+def chat_url(port_or_device=8000, host: str = "localhost") -> str:
+    """同 base_url，另加上 /v3/chat/completions。"""
+    return base_url(port_or_device, host) + CHAT_PATH
+
+
+def get_client(port_or_device=8000, host: str = "localhost", **kwargs) -> OVMSClient:
+    """
+    取得 (或建立) 指定端點的共用 OVMSClient。
+
+    參數：
+        port_or_device: 連接埠 (8000)、裝置名稱 ("iGPU" / "NPU") 或完整 base URL
+        kwargs: 第一次建立時傳給 OVMSClient 的參數 (http2、timeout 等)
+    """
+    url = base_url(port_or_device, host)
+    client = _clients.get(url)
+    if client is None:
+        client = OVMSClient(url, **kwargs)
+        _clients[url] = client
+    return client
+
+
+def close_all() -> None:
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import sys
+
+    client = get_client(sys.argv[1] if len(sys.argv) > 1 else 8000)
+    print(f"🔗 {client.base_url} (HTTP/2: {client.http2})")
+    print(f"   首次連線: {client.ensure_warm() * 1000:.2f} ms")
+    for _ in range(3):
+        start = time.perf_counter()
+        ok = client.ready()
+        print(f"   熱連線健康檢查: {ok} ({(time.perf_counter() - start) * 1000:.2f} ms)")
@@ -0,0 +1,248 @@
+import os
+import json
+import ctypes
+import platform
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from blob_cache import read_graph_options
+from config_store import ConfigStore
+from model_manager import model_disk_size_GB
+from throughput_model import model_key
+
+# psutil 為選用套件
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# KV cache 每個元素的位元組數；未指定 kv_cache_precision 時 CPU 預設 u8、GPU/NPU 為 f16
+KV_BYTES = {"u8": 1, "i8": 1, "f16": 2, "bf16": 2, "f32": 4}
+DEFAULT_KV_PRECISION = {"CPU": "u8", "GPU": "f16", "NPU": "f16"}
+# NPU 為靜態形狀：KV cache 長度 = MAX_PROMPT_LEN + MIN_RESPONSE_LEN
+NPU_MAX_PROMPT_LEN = 1024
+NPU_MIN_RESPONSE_LEN = 128
+# 保留給作業系統與其他程式的記憶體，避免開始 swap
+MIN_RESERVE_GB = 2.0
+RESERVE_FRACTION = 0.10
+# Windows 預設 iGPU 共用記憶體上限為系統記憶體的一半
+IGPU_SHARED_FRACTION = 0.5
+DGPU_RESERVE_GB = 0.5
+
+
+def system_memory_GB() -> Tuple[float, float]:
+    """回傳 (總記憶體, 可用記憶體) GB；可用量包含可回收的 page cache。"""
+    if psutil is not None:
+        vm = psutil.virtual_memory()
+        return vm.total / 1024 ** 3, vm.available / 1024 ** 3
+    if platform.system() == "Windows":
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                        ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                        ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                        ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                        ("ullAvailExtendedVirtual", ctypes.c_ulonglong)]
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(MEMORYSTATUSEX)
+        ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status))
+        return status.ullTotalPhys / 1024 ** 3, status.ullAvailPhys / 1024 ** 3
+    meminfo = {}
+    with open("/proc/meminfo", "r") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            meminfo[key] = float(value.split()[0]) / 1024 ** 2   # kB → GB
+    return meminfo["MemTotal"], meminfo.get("MemAvailable", meminfo.get("MemFree", 0.0))
+
+
+# ============================================================
+# 📏 模型記憶體用量：權重 + KV cache
+# ============================================================
+
+def kv_bytes_per_token(hf_config: Dict[str, Any], precision: str) -> int:
+    """每個 token 的 KV cache 大小 = 2 (K, V) × 層數 × KV heads × head_dim × 元素大小。"""
+    layers = hf_config.get("num_hidden_layers", 0)
+    heads = hf_config.get("num_attention_heads", 1)
+    kv_heads = hf_config.get("num_key_value_heads", heads)
+    head_dim = hf_config.get("head_dim") or hf_config.get("hidden_size", 0) // max(1, heads)
+    return 2 * layers * kv_heads * head_dim * KV_BYTES.get(precision, 2)
+
+
+def model_footprint(model_dir: str, device: Optional[str] = None) -> Dict[str, Any]:
+    """
+    估計 OVMS 載入一個 export_model 匯出的 servable 所需記憶體。
+
+    KV cache：
+        GPU/CPU (continuous batching) — graph.pbtxt 的 cache_size (GB，--cache_size) 會預先配置；
+            可容納的 token 數取決於 kv_cache_precision (--kv_cache_precision u8 約為 f16 的兩倍)
+        NPU — 靜態長度 MAX_PROMPT_LEN + MIN_RESPONSE_LEN
+
+    回傳：
+        dict：{"weights_GB", "kv_GB", "kv_tokens", "kv_precision", "total_GB"}
+    """
+    options = read_graph_options(model_dir)
+    weights_dir = os.path.normpath(os.path.join(model_dir, options["models_path"]))
+    device = (device or options["device"] or "CPU").upper()
+    plugin_config = options["plugin_config"]
+    precision = str(plugin_config.get("KV_CACHE_PRECISION", DEFAULT_KV_PRECISION.get(device, "f16"))).lower()
+
+    hf_config = {}
+    config_path = os.path.join(weights_dir, "config.json")
+    if os.path.isfile(config_path):
+        with open(config_path, "r", encoding="utf-8") as f:
+            hf_config = json.load(f)
+    per_token = kv_bytes_per_token(hf_config, precision)
+
+    if device == "NPU":
+        tokens = int(plugin_config.get("MAX_PROMPT_LEN", NPU_MAX_PROMPT_LEN)) + \
+            int(plugin_config.get("MIN_RESPONSE_LEN", NPU_MIN_RESPONSE_LEN))
+        kv_GB = per_token * tokens / 1024 ** 3
+    else:
+        kv_GB = float(options["cache_size"] if options["cache_size"] is not None else 10)
+        tokens = int(kv_GB * 1024 ** 3 / per_token) if per_token else 0
+
+    weights_GB = model_disk_size_GB(weights_dir)
+    return {"weights_GB": weights_GB, "kv_GB": kv_GB, "kv_tokens": tokens,
+            "kv_precision": precision, "total_GB": weights_GB + kv_GB}
+
+
+# ============================================================
+# 📐 依可用記憶體決定各裝置的模型
+# ============================================================
+
+class MemoryPlacement:
+    """
+    依各記憶體池的可用量，為每個裝置選出放得下的最大模型。
+
+    記憶體池：
+        dGPU   — 可用 VRAM (telemetry)，模型需求取自 MODEL_VRAM
+        system — iGPU 與 NPU 共用的系統記憶體 (扣除保留量)；iGPU 另受共用記憶體上限限制
+                 (系統記憶體的一半，扣掉 compute_info 回報的 iGPU memory_usage_MB)
+
+    已載入的模型不再需要額外記憶體。
+
+    參數：
+        profiles (dict): 模型名稱 → model_footprint() 結果 (OVMS 模型)
+        model_vram (dict): main.MODEL_VRAM (dGPU 模型)
+        reserve_GB (float, optional): 系統記憶體保留量，預設 max(2 GB, 10%)
+    """
+
+    def __init__(self, profiles: Dict[str, Dict[str, Any]], model_vram: Dict[str, float],
+                 reserve_GB: Optional[float] = None):
+        self.profiles = profiles
+        self.model_vram = model_vram
+        self.reserve_GB = reserve_GB
+        self.last_plan: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    @classmethod
+    def from_config(cls, config_path: str, model_vram: Dict[str, float], **kwargs) -> "MemoryPlacement":
+        """由 OVMS config.json 中每個 servable 的資料夾建立 profiles。"""
+        store = ConfigStore(config_path)
+        base_dir = os.path.dirname(os.path.abspath(config_path))
+        profiles = {}
+        for _, entry in store.entries(store.read()):
+            model_dir = os.path.join(base_dir, entry["base_path"])
+            if os.path.isdir(model_dir):
+                profiles[entry["name"]] = model_footprint(model_dir)
+        return cls(profiles, model_vram, **kwargs)
+
+    def need_GB(self, model: str, device: str) -> float:
+        if device == "dGPU":
+            return float(self.model_vram.get(model, 0.0))
+        profile = self.profiles.get(model) or self.profiles.get(model_key(model))
+        if profile is not None:
+            return profile["total_GB"]
+        return float(self.model_vram.get(model, 0.0))
+
+    def free_GB(self, dgpu_free_GB: float = 0.0, igpu_mem_MB: float = 0.0) -> Dict[str, float]:
+        total, available = system_memory_GB()
+        reserve = self.reserve_GB if self.reserve_GB is not None else max(MIN_RESERVE_GB, total * RESERVE_FRACTION)
+        system = max(0.0, available - reserve)
+        igpu_cap = max(0.0, total * IGPU_SHARED_FRACTION - igpu_mem_MB / 1024)
+        return {"dGPU": max(0.0, dgpu_free_GB - DGPU_RESERVE_GB), "system": system, "iGPU": min(system, igpu_cap)}
+
+    def plan(self, devices: Dict[str, Any], model_list: Dict[str, List[str]], dgpu_free_GB: float = 0.0,
+             igpu_mem_MB: float = 0.0, loaded: Iterable[str] = ()) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        回傳 {裝置: {"model", "need_GB", "free_GB", "headroom_GB"} 或 None (放不下任何模型)}。
+        iGPU 先配置，NPU 使用 iGPU 配置後剩下的系統記憶體 (兩者可能同時載入以便快速切換)。
+        """
+        loaded = {model_key(m) for m in loaded}
+        free = self.free_GB(dgpu_free_GB, igpu_mem_MB)
+        system_used = 0.0
+        plan = {}
+        for device in ("dGPU", "iGPU", "NPU"):
+            if not devices.get(device, False) or not model_list.get(device):
+                continue
+            if device == "dGPU":
+                budget = free["dGPU"]
+            elif device == "iGPU":
+                budget = free["iGPU"]
+            else:
+                budget = free["system"] - system_used
+            # 需求大的模型優先 (通常品質較好)
+            candidates = sorted(model_list[device], key=lambda m: self.need_GB(m, device), reverse=True)
+            plan[device] = None
+            for model in candidates:
+                need = 0.0 if device != "dGPU" and model_key(model) in loaded else self.need_GB(model, device)
+                if need <= budget:
+                    plan[device] = {"model": model, "need_GB": need, "free_GB": budget, "headroom_GB": budget - need}
+                    if device != "dGPU":
+                        system_used += need
+                    break
+        self.last_plan = plan
+        return plan
+
+    def apply(self, devices: Dict[str, Any], model_list: Dict[str, List[str]],
+              plan: Dict[str, Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], Dict[str, List[str]]]:
+        """
+        依配置結果縮小選擇範圍：放不下任何模型的裝置視為不可用，其餘只留配置的模型。
+        回傳可直接傳給 select_best_device_and_model 的 (devices, model_list)。
+        iGPU 是最後的 fallback，放不下時保留其最小的模型。
+        """
+        devices = dict(devices)
+        model_list = dict(model_list)
+        for device, placed in plan.items():
+            if placed is not None:
+                model_list[device] = [placed["model"]]
+            elif device == "iGPU":
+                model_list[device] = [min(model_list[device], key=lambda m: self.need_GB(m, device))]
+                devices[device] = False
+            else:
+                devices[device] = False
+        return devices, model_list
+
+    def report(self, plan: Optional[Dict[str, Optional[Dict[str, Any]]]] = None) -> str:
+        plan = self.last_plan if plan is None else plan
+        parts = []
+        for device, placed in plan.items():
+            if placed is None:
+                parts.append(f"{device}: 記憶體不足")
+            else:
+                parts.append(f"{device}: {model_key(placed['model'])} "
+                             f"(需 {placed['need_GB']:.1f} GB，剩餘 {placed['headroom_GB']:.1f} GB)")
+        return " | ".join(parts)
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Memory-budget placement report")
+    parser.add_argument("--config", default="config.json", help="OVMS config.json with exported servables")
+    parser.add_argument("--dgpu-free", type=float, default=0.0, help="free dGPU VRAM (GB)")
+    args = parser.parse_args()
+
+    total, available = system_memory_GB()
+    print(f"💾 系統記憶體 {total:.1f} GB，可用 {available:.1f} GB")
+    placement = MemoryPlacement.from_config(args.config, {"gpt-oss:20b": 15, "qwen3:14b": 12, "qwen3:8b": 6})
+    for name, p in placement.profiles.items():
+        print(f"📏 {name:28s} 權重 {p['weights_GB']:5.1f} GB + KV {p['kv_GB']:5.1f} GB "
+              f"({p['kv_precision']}, {p['kv_tokens']} tokens)")
+    model_list = {"dGPU": ["gpt-oss:20b", "qwen3:14b", "qwen3:8b"],
+                  "iGPU": [n for n in placement.profiles if "cw" not in n],
+                  "NPU": [n for n in placement.profiles if "cw" in n]}
+    plan = placement.plan({"dGPU": args.dgpu_free > 0, "iGPU": True, "NPU": True}, model_list, args.dgpu_free)
+    print(f"📐 {placement.report(plan)}")
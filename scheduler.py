@@ -0,0 +1,258 @@
+import time
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+# ============================================================
+# 📶 門檻帶：只有跨越門檻才需要重新選擇
+# ============================================================
+
+BAND_LOW, BAND_NEAR, BAND_HIGH = 0, 1, 2
+
+
+def band_of(value: float, threshold: float, margin: float) -> int:
+    """
+    把使用率分成三段：低於 threshold - margin、門檻附近、高於 threshold + margin。
+    兩次取樣落在同一段時，選擇結果不會因這個裝置而改變。
+    """
+    if value < threshold - margin:
+        return BAND_LOW
+    if value > threshold + margin:
+        return BAND_HIGH
+    return BAND_NEAR
+
+
+def snapshot_levels(snapshot: Any) -> Dict[str, float]:
+    """由 TelemetrySnapshot 取出各裝置使用率。"""
+    return {"dGPU": snapshot.dgpu_util, "iGPU": snapshot.igpu_util, "NPU": snapshot.npu_util}
+
+
+# ============================================================
+# ⏰ 事件驅動的選擇排程
+# ============================================================
+
+class SelectionScheduler:
+    """
+    取代固定 time.sleep(10) 的輪詢：
+
+        - 任一裝置使用率跨越門檻帶、deltas 中的數值 (例如可用 VRAM / 系統記憶體 GB)
+          與上次選擇時相差超過設定值、呼叫 notify() (例如進行中的請求結束)、
+          或 pending_fn() 為真 (HysteresisSelector 尚有待確認的候選) → 立即重新選擇，
+          取樣間隔回到 fast_interval
+        - 使用率停在門檻附近 → 維持 fast_interval 取樣
+        - 其餘時間取樣間隔逐次 × backoff，最長到 heartbeat；
+          距上次選擇超過 heartbeat 也會重新選擇一次
+
+    裝置、卡號或模型改變時發佈事件給訂閱者 (callback 或 asyncio.Queue)：
+        {"device", "index", "model", "previous", "reason", "levels", "timestamp"}
+
+    參數：
+        sample_fn (callable): 取得一次遙測 (例如 TelemetryHub.sample_sync)
+        evaluate_fn (callable): evaluate_fn(sample) → (device, model) 或 (device, index, model) (多張 dGPU)
+        thresholds (dict): 各裝置切換門檻 (%)，例如 {"dGPU": 50, "iGPU": 50, "NPU": 50}；
+            "dGPU:1" 之類的個別卡沒有設定時使用 "dGPU" 的門檻
+        levels_fn (callable): levels_fn(sample) → {裝置: 使用率 %}，預設讀 TelemetrySnapshot 欄位；
+            也可以包含 deltas 中的其他數值
+        deltas (dict, optional): 數值 → 觸發重新選擇的變化量，例如 {"dGPU_free_GB": 1.0}
+        pending_fn (callable, optional): 回傳 True 時每次取樣都重新選擇
+        margin (float): 門檻帶半寬 (%)
+        fast_interval (float): 有變化或接近門檻時的取樣間隔秒數
+        heartbeat (float): 閒置時最長的取樣 / 重新選擇間隔秒數
+        backoff (float): 閒置時取樣間隔的倍增係數
+    """
+
+    def __init__(self, sample_fn: Callable[[], Any], evaluate_fn: Callable[[Any], Tuple[str, str]],
+                 thresholds: Dict[str, float], levels_fn: Callable[[Any], Dict[str, float]] = snapshot_levels,
+                 deltas: Optional[Dict[str, float]] = None,
+                 pending_fn: Optional[Callable[[], bool]] = None, margin: float = 10.0,
+                 fast_interval: float = 1.0, heartbeat: float = 30.0, backoff: float = 2.0):
+        self.sample_fn = sample_fn
+        self.evaluate_fn = evaluate_fn
+        self.thresholds = thresholds
+        self.levels_fn = levels_fn
+        self.deltas = dict(deltas or {})
+        self.pending_fn = pending_fn
+        self.margin = margin
+        self.fast_interval = fast_interval
+        self.heartbeat = heartbeat
+        self.backoff = backoff
+
+        self.current: Optional[Tuple[str, str]] = None
+        self.interval = fast_interval
+        self.evaluations = 0
+        self.samples = 0
+        self._bands: Dict[str, int] = {}
+        self._evaluated: Dict[str, float] = {}   # 上次選擇時 deltas 中各數值
+        self._near = False
+        self._last_eval = 0.0
+        self._reasons: List[str] = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+        self._thread: Optional[threading.Thread] = None
+
+    # --------------------------------------------------------
+    # 訂閱
+    # --------------------------------------------------------
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> Callable[[Dict[str, Any]], None]:
+        with self._lock:
+            self._subscribers.append(callback)
+        return callback
+
+    def unsubscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def subscribe_queue(self, loop: Optional["asyncio.AbstractEventLoop"] = None, maxsize: int = 0) -> "asyncio.Queue":
+        """
+        回傳接收裝置切換事件的 asyncio.Queue。排程在其他執行緒執行，
+        事件以 call_soon_threadsafe 放入 queue；需在事件迴圈內呼叫或指定 loop。
+        """
+        import asyncio   # 只有 asyncio 訂閱者需要，main 的同步迴圈不必載入
+        loop = loop or asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=maxsize)
+
+        def _put(event: Dict[str, Any]) -> None:
+            def _put_nowait():
+                if queue.full():
+                    queue.get_nowait()   # 只保留最新的事件
+                queue.put_nowait(event)
+            loop.call_soon_threadsafe(_put_nowait)
+
+        self.subscribe(_put)
+        return queue
+
+    def _publish(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"⚠️ 訂閱者處理裝置切換事件失敗: {e}")
+
+    # --------------------------------------------------------
+    # 觸發
+    # --------------------------------------------------------
+    def notify(self, reason: str = "notify") -> None:
+        """要求立即重新選擇 (可從任何執行緒呼叫)。"""
+        with self._lock:
+            self._reasons.append(reason)
+        self._wake.set()
+
+    def watch_tracker(self, tracker) -> None:
+        """inflight.InflightTracker 的請求結束時重新選擇。"""
+        tracker.add_listener(lambda device, model: self.notify(f"request_done:{device}"))
+
+    def _band_changes(self, levels: Dict[str, float]) -> List[str]:
+        changed, near = [], False
+        for device, value in levels.items():
+            threshold = self.thresholds.get(device, self.thresholds.get(device.split(":")[0]))
+            if threshold is None:
+                continue
+            band = band_of(value, threshold, self.margin)
+            previous = self._bands.get(device)
+            if previous is not None and band != previous:
+                changed.append(f"band:{device}")
+            near = near or band == BAND_NEAR
+            self._bands[device] = band
+        self._near = near
+        return changed
+
+    def _delta_changes(self, levels: Dict[str, float]) -> List[str]:
+        return [f"delta:{name}" for name, delta in self.deltas.items()
+                if name in levels and name in self._evaluated and abs(levels[name] - self._evaluated[name]) >= delta]
+
+    # --------------------------------------------------------
+    # 執行
+    # --------------------------------------------------------
+    def step(self) -> Optional[Dict[str, Any]]:
+        """取樣一次，需要時重新選擇；回傳這次發佈的事件 (沒有切換時為 None)。"""
+        self._wake.clear()
+        with self._lock:
+            reasons, self._reasons = self._reasons, []
+        sample = self.sample_fn()
+        self.samples += 1
+        levels = self.levels_fn(sample)
+        reasons += self._band_changes(levels)
+        reasons += self._delta_changes(levels)
+        now = time.monotonic()
+        if self.current is None:
+            reasons.append("start")
+        if self.pending_fn is not None and self.pending_fn():
+            reasons.append("pending")
+        if not reasons and now - self._last_eval >= self.heartbeat:
+            reasons.append("heartbeat")
+
+        # 有事件或接近門檻 → 快速取樣；否則逐步拉長到 heartbeat
+        if (reasons and reasons != ["heartbeat"]) or self._near:
+            self.interval = self.fast_interval
+        else:
+            self.interval = min(self.heartbeat, self.interval * self.backoff)
+
+        if not reasons:
+            return None
+        self._last_eval = now
+        self._evaluated = {name: levels[name] for name in self.deltas if name in levels}
+        self.evaluations += 1
+        choice = tuple(self.evaluate_fn(sample))
+        if choice == self.current:
+            return None
+        event = {"device": choice[0], "index": choice[1] if len(choice) == 3 else 0, "model": choice[-1],
+                 "previous": self.current, "reason": ",".join(reasons),
+                 "levels": levels, "timestamp": time.time()}
+        self.current = choice
+        self._publish(event)
+        return event
+
+    def run(self) -> None:
+        """在目前執行緒執行，直到 stop()。"""
+        while not self._stop.is_set():
+            try:
+                self.step()
+            except Exception as e:
+                print(f"⚠️ 排程取樣/選擇失敗: {e}")
+                self.interval = self.fast_interval
+            # notify() 會提前喚醒
+            self._wake.wait(self.interval)
+
+    def start(self) -> "SelectionScheduler":
+        self._thread = threading.Thread(target=self.run, name="selection-scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+# ============================================================
+# 🧾 主程式：以模擬使用率示範
+# ============================================================
+
+if __name__ == "__main__":
+    import math
+
+    start = time.monotonic()
+
+    def fake_sample() -> Dict[str, float]:
+        t = time.monotonic() - start
+        # 前 4 秒閒置，之後 iGPU 突然滿載
+        return {"dGPU": 0.0, "iGPU": 95.0 if t > 4 else 5.0 + math.sin(t), "NPU": 10.0}
+
+    def evaluate(levels: Dict[str, float]) -> Tuple[str, str]:
+        if levels["iGPU"] <= 50:
+            return "iGPU", "OpenVINO/Qwen3-8B-int4-ov"
+        return "NPU", "OpenVINO/Qwen3-8B-int4-cw-ov"
+
+    scheduler = SelectionScheduler(fake_sample, evaluate, {"iGPU": 50, "NPU": 50},
+                                   levels_fn=lambda s: s, fast_interval=0.2, heartbeat=2.0)
+    scheduler.subscribe(lambda e: print(f"🔀 {e['previous']} → {e['device']} ({e['reason']})"))
+    scheduler.start()
+    time.sleep(8)
+    scheduler.stop()
+    print(f"📊 取樣 {scheduler.samples} 次，選擇 {scheduler.evaluations} 次")
@@ -0,0 +1,199 @@
+import time
+import numpy as np
+from typing import Callable, Dict, Optional, Tuple
+
+
+DEVICES = ("dGPU", "iGPU", "NPU")
+SIGNAL_MODES = ("instant", "ewma", "p50", "p95", "trend")
+
+
+# ============================================================
+# 📈 單一裝置的滾動視窗 (固定大小 NumPy 環狀緩衝區)
+# ============================================================
+
+class UtilizationWindow:
+    """
+    保存最近 size 筆使用率樣本，提供 EWMA、百分位數與斜率。
+
+    參數：
+        size (int): 視窗大小 (樣本數)
+        alpha (float): EWMA 平滑係數 (0~1，越大越貼近最新值)
+    """
+
+    def __init__(self, size: int = 30, alpha: float = 0.3):
+        self.size = size
+        self.alpha = alpha
+        self._values = np.zeros(size, dtype=np.float64)
+        self._times = np.zeros(size, dtype=np.float64)
+        self._pos = 0
+        self._count = 0
+        self._ewma: Optional[float] = None
+
+    def push(self, value: float, timestamp: Optional[float] = None) -> None:
+        self._values[self._pos] = value
+        self._times[self._pos] = time.monotonic() if timestamp is None else timestamp
+        self._pos = (self._pos + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+        self._ewma = value if self._ewma is None else self.alpha * value + (1 - self.alpha) * self._ewma
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _ordered(self, arr: np.ndarray) -> np.ndarray:
+        if self._count < self.size:
+            return arr[:self._count]
+        return np.roll(arr, -self._pos)
+
+    def values(self) -> np.ndarray:
+        """依時間排序 (舊 → 新) 的樣本。"""
+        return self._ordered(self._values)
+
+    def last(self) -> float:
+        return float(self._values[(self._pos - 1) % self.size]) if self._count else 0.0
+
+    def ewma(self) -> float:
+        return float(self._ewma) if self._ewma is not None else 0.0
+
+    def percentile(self, q: float) -> float:
+        if not self._count:
+            return 0.0
+        return float(np.percentile(self._values[:self._count] if self._count < self.size else self._values, q))
+
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    def p95(self) -> float:
+        return self.percentile(95)
+
+    def slope(self) -> float:
+        """最小平方法斜率 (每秒變化的百分點)，樣本不足時回傳 0。"""
+        if self._count < 2:
+            return 0.0
+        t = self._ordered(self._times)
+        v = self._ordered(self._values)
+        t = t - t.mean()
+        denom = float(np.dot(t, t))
+        if denom <= 0.0:
+            return 0.0
+        return float(np.dot(t, v - v.mean()) / denom)
+
+    def value(self, mode: str = "ewma", horizon_s: float = 5.0) -> float:
+        """
+        依 mode 回傳訊號值：
+            instant - 最新一筆
+            ewma    - 指數加權移動平均
+            p50/p95 - 視窗百分位數
+            trend   - EWMA + 斜率 × horizon_s (預測 horizon_s 秒後的使用率)
+        """
+        if mode == "instant":
+            return self.last()
+        if mode == "ewma":
+            return self.ewma()
+        if mode == "p50":
+            return self.p50()
+        if mode == "p95":
+            return self.p95()
+        if mode == "trend":
+            return float(np.clip(self.ewma() + self.slope() * horizon_s, 0.0, 100.0))
+        raise ValueError(f"Unknown signal mode: {mode}")
+
+
+# ============================================================
+# 🧮 所有裝置的訊號層
+# ============================================================
+
+class DeviceSignals:
+    """
+    為 dGPU / iGPU / NPU 各保存一個 UtilizationWindow。
+
+    參數：
+        size (int): 視窗大小
+        alpha (float): EWMA 係數
+        mode (str): 預設訊號 ("instant", "ewma", "p50", "p95", "trend")
+    """
+
+    def __init__(self, size: int = 30, alpha: float = 0.3, mode: str = "ewma", horizon_s: float = 5.0):
+        if mode not in SIGNAL_MODES:
+            raise ValueError(f"Unknown signal mode: {mode}")
+        self.mode = mode
+        self.horizon_s = horizon_s
+        self.windows: Dict[str, UtilizationWindow] = {d: UtilizationWindow(size, alpha) for d in DEVICES}
+
+    def update(self, dgpu_util: Optional[float], igpu_util: Optional[float], npu_util: Optional[float],
+               timestamp: Optional[float] = None) -> None:
+        """值為 None 的裝置 (沒有新的量測) 不寫入視窗，保留先前的樣本。"""
+        ts = time.monotonic() if timestamp is None else timestamp
+        for device, value in (("dGPU", dgpu_util), ("iGPU", igpu_util), ("NPU", npu_util)):
+            if value is not None:
+                self.windows[device].push(value, ts)
+
+    def update_from_snapshot(self, snapshot) -> None:
+        """
+        由 telemetry_hub.TelemetrySnapshot 更新；來源逾時或失敗的裝置 (snapshot.stale_devices)
+        略過，避免卡住的 PowerShell / nvidia-smi 讓裝置看起來閒置。
+        """
+        stale = getattr(snapshot, "stale_devices", ())
+        self.update(*(None if d in stale else v for d, v in (("dGPU", snapshot.dgpu_util),
+                                                             ("iGPU", snapshot.igpu_util),
+                                                             ("NPU", snapshot.npu_util))))
+
+    def get(self, device: str, mode: Optional[str] = None) -> float:
+        return self.windows[device].value(mode or self.mode, self.horizon_s)
+
+    def values(self, mode: Optional[str] = None) -> Tuple[float, float, float]:
+        """回傳 (igpu_util, npu_util, dgpu_util)，順序與 select_best_device_and_model 參數一致。"""
+        return self.get("iGPU", mode), self.get("NPU", mode), self.get("dGPU", mode)
+
+    def summary(self, device: str) -> Dict[str, float]:
+        w = self.windows[device]
+        return {"last": w.last(), "ewma": w.ewma(), "p50": w.p50(), "p95": w.p95(), "slope": w.slope()}
+
+
+# ============================================================
+# 🔁 遲滯 (hysteresis)：候選裝置連續 N 次勝出才切換
+# ============================================================
+
+class HysteresisSelector:
+    """
+    包裝 select_best_device_and_model，避免 iGPU / NPU 在突發負載下來回切換。
+
+    參數：
+        select_fn (callable): 原始選擇函式，回傳 (device, model)
+        confirm_samples (int): 新裝置需連續勝出幾次才切換
+    """
+
+    def __init__(self, select_fn: Callable[..., Tuple[str, str]], confirm_samples: int = 3):
+        self.select_fn = select_fn
+        self.confirm_samples = max(1, confirm_samples)
+        self.current: Optional[Tuple[str, str]] = None
+        self._candidate: Optional[Tuple[str, str]] = None
+        self._streak = 0
+
+    @property
+    def pending(self) -> bool:
+        """有候選裝置等待確認 (需要繼續取樣才能完成切換)。"""
+        return self._candidate is not None
+
+    def select(self, *args, **kwargs) -> Tuple[str, str]:
+        choice = self.select_fn(*args, **kwargs)
+
+        if self.current is None or choice == self.current:
+            self.current = choice
+            self._candidate = None
+            self._streak = 0
+            return self.current
+
+        if choice == self._candidate:
+            self._streak += 1
+        else:
+            self._candidate = choice
+            self._streak = 1
+
+        if self._streak >= self.confirm_samples:
+            print(f"🔀 切換裝置: {self.current[0]} → {choice[0]} (連續 {self._streak} 次)")
+            self.current = choice
+            self._candidate = None
+            self._streak = 0
+        else:
+            print(f"⏳ 候選裝置 {choice[0]} ({self._streak}/{self.confirm_samples})，維持 {self.current[0]}")
+        return self.current
@@ -0,0 +1,474 @@
+import json
+import time
+import asyncio
+from collections import deque
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from async_http import AsyncHTTPPool, HTTPError
+from telemetry_hub import TelemetrySnapshot
+from inflight import InflightTracker
+from scheduler import SelectionScheduler
+
+
+# ============================================================
+# 🔀 Smart Mode 推論路由器 (OpenAI 相容代理)
+# ============================================================
+# 用戶端只需要把 base_url 指向這個代理：
+#   POST /v3/chat/completions (或 /v1/chat/completions)
+#     "model": "auto"    → 依最新遙測選擇 (裝置, 模型)
+#     "model": <已知模型> → 直接送到該模型所在的裝置
+#   GET  /v1/models       → 可用模型
+#   GET  /router/status   → 目前決策、遙測與路由開銷
+#
+# 決策由 SelectionScheduler 在背景執行緒計算 (使用率跨越門檻帶、可用 VRAM 變化、
+# 進行中的請求結束時立即重新選擇)，經 asyncio.Queue 送回事件迴圈快取，每個請求只需查表；
+# 上游回應逐塊轉送 (不緩衝)，SSE 串流可即時到達用戶端。
+
+BACKENDS = {
+    "dGPU": {"url": "http://localhost:11434", "path": "/v1/chat/completions"},  # Ollama (OpenAI 相容)
+    "iGPU": {"url": "http://localhost:8000", "path": "/v3/chat/completions"},   # OVMS
+    "NPU":  {"url": "http://localhost:8001", "path": "/v3/chat/completions"},   # OVMS
+}
+CHAT_PATHS = ("/v3/chat/completions", "/v1/chat/completions")
+AUTO_MODEL = "auto"
+ROUTER_PORT = 9000
+DEFAULT_MAX_TOKENS = 256   # 請求沒有指定 max_tokens 時的 token 預算
+
+
+def _status_line(status: int) -> str:
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = "Unknown"
+    return f"HTTP/1.1 {status} {reason}"
+
+
+def _token_budget(payload: Dict[str, Any]) -> int:
+    return int(payload.get("max_tokens") or payload.get("max_completion_tokens")
+               or payload.get("max_new_tokens") or DEFAULT_MAX_TOKENS)
+
+
+class SmartRouter:
+    """
+    依快取的遙測決策把聊天請求轉送到 dGPU (Ollama) / iGPU / NPU (OVMS)。
+
+    參數：
+        devices (dict): detect_compute_devices() 的結果
+        model_list (dict): 各裝置可用模型，例如 main.MODEL_LIST
+        model_vram (dict): 各模型所需 VRAM (GB)
+        select_fn (callable): 與 main.select_best_device_and_model 相同簽名的選擇函式
+            (可以是 HysteresisSelector.select)；只用於背景迴圈計算的快取決策 self.decision
+        telemetry (object, optional): 具有 async sample() → TelemetrySnapshot 的來源 (TelemetryHub)；
+            同時具有 sample_sync() 時改由 SelectionScheduler 事件驅動更新決策，否則每 refresh_interval 秒更新
+        signals (DeviceSignals, optional): 平滑訊號層；None 時使用瞬時值
+        usage_threshold (float): iGPU / NPU 門檻 (0~1)
+        backends (dict): 各裝置上游 {"url", "path"}
+        refresh_interval (float): 遙測更新間隔秒數 (SelectionScheduler 接近門檻或有事件時的取樣間隔)
+        heartbeat (float): SelectionScheduler 閒置時最長的取樣 / 重新選擇間隔秒數
+        pending_fn (callable, optional): 回傳 True 時每次取樣都重新選擇 (例如 HysteresisSelector.pending)
+        tracker (InflightTracker, optional): 記錄各裝置進行中請求與剩餘 token
+        eta_selector (FinishTimeSelector, optional): 提供時每個請求都以 route_fn 重新選擇
+            (預估完成時間結合快取遙測與 tracker 的佇列深度)，不再只用快取決策
+        route_fn (callable, optional): 每個請求帶 tokens= 呼叫的選擇函式，預設 eta_selector.select；
+            可包 prefer_warm，但不應包 HysteresisSelector (連續確認會讓請求延後反映 ETA，
+            且與背景迴圈共用狀態)
+    """
+
+    def __init__(self, devices: Dict[str, Any], model_list: Dict[str, List[str]], model_vram: Dict[str, float],
+                 select_fn: Callable[..., Tuple[str, str]], telemetry=None, signals=None,
+                 usage_threshold: float = 0.5, backends: Optional[Dict[str, Dict[str, str]]] = None,
+                 refresh_interval: float = 1.0, heartbeat: float = 10.0,
+                 pending_fn: Optional[Callable[[], bool]] = None, max_upstream_connections: int = 64,
+                 tracker: Optional[InflightTracker] = None, eta_selector=None,
+                 route_fn: Optional[Callable[..., Tuple[str, str]]] = None):
+        self.devices = devices
+        self.model_list = model_list
+        self.model_vram = model_vram
+        self.select_fn = select_fn
+        self.telemetry = telemetry
+        self.signals = signals
+        self.usage_threshold = usage_threshold
+        self.backends = backends or BACKENDS
+        self.refresh_interval = refresh_interval
+        self.heartbeat = heartbeat
+        self.pending_fn = pending_fn
+        self.eta_selector = eta_selector
+        self.route_fn = route_fn or (eta_selector.select if eta_selector is not None else None)
+        self.tracker = tracker or (eta_selector.tracker if eta_selector is not None else InflightTracker())
+
+        self.pools = {d: AsyncHTTPPool(b["url"], max_connections=max_upstream_connections)
+                      for d, b in self.backends.items()}
+        # 指定模型名稱時直接對應到裝置
+        self._model_device = {m: d for d, models in model_list.items() if devices.get(d, False) for m in models}
+
+        self.snapshot = TelemetrySnapshot()
+        self._signal = (0.0, 0.0, 0.0)
+        self.decision: Tuple[str, str] = self._select(self.snapshot)
+        self.requests_routed: Dict[str, int] = {d: 0 for d in self.backends}
+        self._overhead_us: deque = deque(maxlen=1000)
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.scheduler: Optional[SelectionScheduler] = None
+
+    # --------------------------------------------------------
+    # 決策
+    # --------------------------------------------------------
+    def _observe(self, snapshot: TelemetrySnapshot) -> None:
+        self.snapshot = snapshot
+        if self.signals is not None:
+            self.signals.update_from_snapshot(snapshot)
+            self._signal = self.signals.values()
+        else:
+            # 來源失敗的裝置沿用上一次的值
+            stale = snapshot.stale_devices
+            self._signal = tuple(prev if d in stale else v for d, v, prev in zip(
+                ("iGPU", "NPU", "dGPU"), (snapshot.igpu_util, snapshot.npu_util, snapshot.dgpu_util), self._signal))
+
+    def _evaluate(self, snapshot: TelemetrySnapshot) -> Tuple[str, str]:
+        igpu, npu, dgpu = self._signal
+        return self.select_fn(self.devices, igpu, npu, dgpu, snapshot.dgpu_free_GB,
+                              self.usage_threshold, self.model_list, self.model_vram)
+
+    def _select(self, snapshot: TelemetrySnapshot) -> Tuple[str, str]:
+        self._observe(snapshot)
+        return self._evaluate(snapshot)
+
+    def update(self, snapshot: TelemetrySnapshot) -> None:
+        """以新的遙測快照重新計算決策 (由背景迴圈呼叫)。"""
+        self.snapshot = snapshot
+        self.decision = self._select(snapshot)
+
+    async def refresh_loop(self) -> None:
+        while True:
+            try:
+                self.update(await self.telemetry.sample())
+            except Exception as e:
+                print(f"⚠️ 遙測更新失敗: {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def _scheduler_sample(self) -> TelemetrySnapshot:
+        # 每次取樣都更新快照與平滑訊號 (route() 的 ETA 選擇使用)，是否重新選擇由排程決定
+        snapshot = self.telemetry.sample_sync()
+        self._observe(snapshot)
+        return snapshot
+
+    def _scheduler_levels(self, snapshot: TelemetrySnapshot) -> Dict[str, float]:
+        igpu, npu, dgpu = self._signal
+        levels = {d: v for d, v in (("dGPU", dgpu), ("iGPU", igpu), ("NPU", npu)) if self.devices.get(d)}
+        if self.devices.get("dGPU"):
+            levels["dGPU_free_GB"] = snapshot.dgpu_free_GB
+        return levels
+
+    def make_scheduler(self) -> SelectionScheduler:
+        """
+        建立驅動快取決策的 SelectionScheduler：使用率跨越門檻帶、可用 VRAM 變化 1 GB 以上、
+        有待確認的切換或 tracker 中的請求結束時重新選擇。
+        """
+        threshold = self.usage_threshold * 100
+        scheduler = SelectionScheduler(
+            self._scheduler_sample, self._evaluate,
+            thresholds={"dGPU": 50.0, "iGPU": threshold, "NPU": threshold},
+            levels_fn=self._scheduler_levels, deltas={"dGPU_free_GB": 1.0},
+            pending_fn=self.pending_fn, fast_interval=self.refresh_interval, heartbeat=self.heartbeat,
+        )
+        scheduler.watch_tracker(self.tracker)
+        return scheduler
+
+    async def _apply_events(self, queue: "asyncio.Queue") -> None:
+        while True:
+            event = await queue.get()
+            self.decision = (event["device"], event["model"])
+
+    def route(self, payload: Dict[str, Any]) -> Tuple[str, str]:
+        """
+        回傳 (裝置, 模型)；指定已知模型時直接使用。
+        否則有 route_fn 時以這個請求的 token 預算直接選擇預估完成時間最短者
+        (不經過切換抑制)，沒有時使用快取決策。
+        """
+        requested = payload.get("model") or AUTO_MODEL
+        if requested != AUTO_MODEL:
+            device = self._model_device.get(requested)
+            if device is not None:
+                return device, requested
+        if self.route_fn is not None:
+            igpu, npu, dgpu = self._signal
+            return self.route_fn(self.devices, igpu, npu, dgpu, self.snapshot.dgpu_free_GB,
+                                  self.usage_threshold, self.model_list, self.model_vram,
+                                  tokens=_token_budget(payload))
+        return self.decision
+
+    # --------------------------------------------------------
+    # HTTP 伺服器
+    # --------------------------------------------------------
+    async def start(self, host: str = "127.0.0.1", port: int = ROUTER_PORT) -> "SmartRouter":
+        if self.telemetry is not None:
+            self.update(await self.telemetry.sample())
+            if hasattr(self.telemetry, "sample_sync"):
+                self.scheduler = self.make_scheduler()
+                self._refresh_task = asyncio.ensure_future(self._apply_events(self.scheduler.subscribe_queue()))
+                self.scheduler.start()
+            else:
+                self._refresh_task = asyncio.ensure_future(self.refresh_loop())
+        self._server = await asyncio.start_server(self._handle, host, port, backlog=256)
+        return self
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            # 關閉仍保持 keep-alive 的用戶端連線，讓連線處理程序結束
+            for writer in list(self._connections.values()):
+                writer.close()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+        for pool in self.pools.values():
+            await pool.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body, received = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self._dispatch(writer, method, path, headers, body, received)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, path, _ = line.decode("latin-1").split(" ", 2)
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise ConnectionError("chunked request bodies are not supported")
+        length = int(headers.get("content-length", 0))
+        body = await reader.readexactly(length) if length else b""
+        return method, path, headers, body, time.perf_counter()
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, obj: Any) -> None:
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        writer.write((f"{_status_line(status)}\r\nContent-Type: application/json\r\n"
+                      f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def _dispatch(self, writer, method, path, headers, body, received) -> None:
+        if method == "POST" and path in CHAT_PATHS:
+            await self._proxy_chat(writer, body, received)
+        elif method == "GET" and path == "/v1/models":
+            models = [AUTO_MODEL] + sorted(self._model_device)
+            await self._send_json(writer, 200, {"object": "list", "data": [
+                {"id": m, "object": "model", "owned_by": self._model_device.get(m, "smart-router")} for m in models]})
+        elif method == "GET" and path == "/router/status":
+            await self._send_json(writer, 200, self.status())
+        elif method == "GET" and path in ("/v2/health/ready", "/health"):
+            await self._send_json(writer, 200, {})
+        else:
+            await self._send_json(writer, 404, {"error": f"not found: {method} {path}"})
+
+    async def _proxy_chat(self, writer: asyncio.StreamWriter, body: bytes, received: float) -> None:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            await self._send_json(writer, 400, {"error": "invalid json"})
+            return
+
+        device, model = self.route(payload)
+        backend = self.backends.get(device)
+        if backend is None:
+            await self._send_json(writer, 503, {"error": f"no backend configured for {device}"})
+            return
+        payload["model"] = model
+        upstream_body = json.dumps(payload).encode("utf-8")
+        self._overhead_us.append((time.perf_counter() - received) * 1e6)
+        self.requests_routed[device] = self.requests_routed.get(device, 0) + 1
+
+        ticket = self.tracker.begin(device, model, _token_budget(payload))
+        tokens = None
+        try:
+            try:
+                response = await self.pools[device].request(
+                    "POST", backend["path"], upstream_body, {"Content-Type": "application/json"})
+            except HTTPError as e:
+                await self._send_json(writer, 502, {"error": f"{device} upstream error: {e}"})
+                return
+            tokens = await self._relay(writer, response, device, model, ticket)
+        finally:
+            # 唯一結束 ticket 的地方；失敗或中斷時 tokens 為 None，不更新觀測 tok/s
+            self.tracker.end(ticket, tokens)
+
+    async def _relay(self, writer: asyncio.StreamWriter, response, device: str, model: str,
+                     ticket: Optional[Dict[str, Any]] = None) -> Optional[float]:
+        """
+        逐塊轉送上游回應 (有 Content-Length 時原樣轉送，否則以 chunked 轉送)。
+        串流時以 SSE delta 數回報進度；非串流時由 usage 取得實際 token 數。
+
+        回傳：成功 (200) 時的實際 token 數，否則 None
+        """
+        length = response.headers.get("content-length")
+        head = [_status_line(response.status),
+                f"Content-Type: {response.headers.get('content-type', 'application/json')}",
+                f"X-Smart-Device: {device}",
+                f"X-Smart-Model: {model}",
+                f"Content-Length: {length}" if length is not None else "Transfer-Encoding: chunked"]
+        if "event-stream" in response.headers.get("content-type", ""):
+            head.append("Cache-Control: no-cache")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+        deltas = 0
+        body = [] if length is not None and int(length) <= 1 << 20 else None
+        try:
+            async for chunk in response.iter_raw():
+                if length is None:
+                    writer.write(f"{len(chunk):X}\r\n".encode("ascii") + chunk + b"\r\n")
+                else:
+                    writer.write(chunk)
+                await writer.drain()
+                if ticket is not None:
+                    if body is not None:
+                        body.append(chunk)
+                    else:
+                        deltas += chunk.count(b'"delta"')
+                        self.tracker.progress(ticket, deltas)
+            if length is None:
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except HTTPError:
+            # 上游中斷：標頭已送出，只能關閉用戶端連線
+            response.close()
+            raise ConnectionError("upstream closed mid-response")
+        except BaseException:
+            # 用戶端中斷：放棄上游連線
+            response.close()
+            raise
+
+        if ticket is None or response.status != 200:
+            return None
+        tokens = deltas
+        if body is not None:
+            try:
+                tokens = json.loads(b"".join(body)).get("usage", {}).get("completion_tokens", 0)
+            except ValueError:
+                tokens = 0
+        return tokens
+
+    # --------------------------------------------------------
+    # 狀態
+    # --------------------------------------------------------
+    def status(self) -> Dict[str, Any]:
+        overhead = np.array(self._overhead_us) if self._overhead_us else np.zeros(1)
+        snap = self.snapshot
+        return {
+            "decision": {"device": self.decision[0], "model": self.decision[1]},
+            "telemetry": {"timestamp": snap.timestamp, "dgpu_util": snap.dgpu_util, "dgpu_free_GB": snap.dgpu_free_GB,
+                          "igpu_util": snap.igpu_util, "npu_util": snap.npu_util, "errors": snap.errors,
+                          "stale_devices": snap.stale_devices},
+            "requests_routed": self.requests_routed,
+            "inflight": self.tracker.snapshot(),
+            "routing_overhead_us": {"p50": float(np.percentile(overhead, 50)),
+                                    "p99": float(np.percentile(overhead, 99))},
+        }
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    import argparse
+    from functools import partial
+    from main import select_best_device_and_model, igpu_npu_source, MODEL_LIST, MODEL_VRAM
+    from lazy_import import BACKENDS as TELEMETRY_BACKENDS
+    from detect_hw import detect_compute_devices
+    from signal_smoothing import DeviceSignals, HysteresisSelector
+    from throughput_model import ThroughputCurves, CURVES_FILE, select_by_throughput
+    from inflight import FinishTimeSelector
+    from blob_cache import load_manifest, prefer_warm
+
+    parser = argparse.ArgumentParser(description="Smart Mode OpenAI-compatible router")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=ROUTER_PORT)
+    parser.add_argument("--threshold", type=float, default=0.5, help="iGPU/NPU usage threshold (0~1)")
+    parser.add_argument("--interval", type=float, default=1.0, help="telemetry interval near a threshold (s)")
+    parser.add_argument("--heartbeat", type=float, default=10.0, help="longest idle re-selection interval (s)")
+    parser.add_argument("--ov-cache-dir", default=None,
+                        help="CACHE_DIR filled by export_model warm_cache; prefer devices with a precompiled blob")
+    parser.add_argument("--ovms-config", default="config.json",
+                        help="OVMS config.json; its model dirs are re-hashed to drop stale blob records")
+    parser.add_argument("--queue-aware", action="store_true",
+                        help="pick the device with the lowest expected finish time (in-flight requests + telemetry)")
+    args = parser.parse_args()
+
+    devices = detect_compute_devices()
+    # 遙測後端與 main.py 相同，由 lazy_import.BACKENDS 依平台載入
+    sampler = (TELEMETRY_BACKENDS.get("counter_sampler")().start()
+               if TELEMETRY_BACKENDS.supported("counter_sampler") else None)
+    dgpu_telemetry = TELEMETRY_BACKENDS.get("dgpu_telemetry")().open() if devices.get("dGPU", False) else None
+    hub = TELEMETRY_BACKENDS.get("telemetry_hub")(
+        dgpu=dgpu_telemetry.sample if dgpu_telemetry is not None else None,
+        igpu_npu=igpu_npu_source(sampler),
+    )
+    curves = ThroughputCurves.load(CURVES_FILE)
+    select_fn = (partial(select_by_throughput, curves=curves, fallback=select_best_device_and_model)
+                 if len(curves) else select_best_device_and_model)
+    blobs, ov_version = load_manifest(args.ov_cache_dir, args.ovms_config) if args.ov_cache_dir else (None, None)
+
+    tracker = InflightTracker()
+    eta_selector = None
+    route_fn = None
+    if args.queue_aware:
+        # 每個請求直接選預估完成時間最短者 (只保留 blob 預熱偏好)；
+        # HysteresisSelector 只用於背景迴圈的快取決策
+        eta_selector = FinishTimeSelector(tracker, curves if len(curves) else None)
+        select_fn = eta_selector.select
+        route_fn = (prefer_warm(select_fn, blobs, ov_version, verbose=False)
+                    if blobs is not None and len(blobs) else select_fn)
+    if blobs is not None and len(blobs):
+        select_fn = prefer_warm(select_fn, blobs, ov_version)
+
+    async def _main():
+        selector = HysteresisSelector(select_fn)
+        router = SmartRouter(devices, MODEL_LIST, MODEL_VRAM, selector.select,
+                             telemetry=hub, signals=DeviceSignals(mode="p95"),
+                             usage_threshold=args.threshold, refresh_interval=args.interval,
+                             heartbeat=args.heartbeat, pending_fn=lambda: selector.pending,
+                             tracker=tracker, eta_selector=eta_selector, route_fn=route_fn)
+        await router.start(args.host, args.port)
+        print(f"🔀 Smart router listening on http://{args.host}:{router.port}/v3/chat/completions")
+        await router.serve_forever()
+
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,241 @@
+import sys
+import time
+import threading
+import subprocess
+from collections import deque, defaultdict
+from typing import List, Dict, Any, Iterator, Optional
+
+from compute_info import extract_luid, label_luid_records
+
+
+# ============================================================
+# 🧩 樣本格式
+# ============================================================
+# 收集程序每行輸出一筆計數器：
+#   U|<InstanceName>|<CookedValue>   → GPU Engine 使用率 (%)
+#   M|<InstanceName>|<CookedValue>   → GPU Adapter Memory Shared Usage (bytes)
+# 每個取樣週期結束輸出一行 "#"。
+SAMPLE_END = "#"
+
+PS_CONTINUOUS_CMD = (
+    "$ErrorActionPreference = 'SilentlyContinue'; "
+    "Get-Counter -Counter '\\GPU Engine(*)\\Utilization Percentage','\\GPU Adapter Memory(*)\\Shared Usage' "
+    "-SampleInterval {interval} -Continuous | "
+    "ForEach-Object { "
+    "  foreach ($s in $_.CounterSamples) { "
+    "    if ($s.InstanceName -match 'luid_0x[0-9a-fA-F]+_0x[0-9a-fA-F]+') { "
+    "      $k = if ($s.Path -like '*utilization percentage') { 'U' } else { 'M' }; "
+    "      [Console]::Out.WriteLine($k + '|' + $s.InstanceName + '|' + $s.CookedValue) "
+    "    } "
+    "  }; "
+    "  [Console]::Out.WriteLine('#'); "
+    "  [Console]::Out.Flush() "
+    "}"
+)
+
+
+# ============================================================
+# 🔌 收集來源 (可插拔)
+# ============================================================
+
+class PowerShellCounterSource:
+    """長駐的 PowerShell Get-Counter -Continuous 收集程序 (只啟動一次)。"""
+
+    restartable = True
+
+    def __init__(self, interval: int = 1):
+        self.interval = interval
+        self.proc: Optional[subprocess.Popen] = None
+
+    def open(self) -> None:
+        self.proc = subprocess.Popen(
+            ["powershell", "-NoProfile", "-NonInteractive", "-Command",
+             PS_CONTINUOUS_CMD.format(interval=self.interval)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            errors="ignore",
+            bufsize=1,
+        )
+
+    def lines(self) -> Iterator[str]:
+        if self.proc is None or self.proc.stdout is None:
+            return
+        for line in self.proc.stdout:
+            yield line
+
+    def close(self) -> None:
+        if self.proc is not None and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=2)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        self.proc = None
+
+
+class ReplayCounterSource:
+    """從檔案重播計數器樣本 (可於 Linux 上測試)。
+
+    參數：
+        path (str): 與收集程序輸出格式相同的文字檔
+        interval (float): 每個樣本之間的間隔秒數
+        loop (bool): 檔案讀完後是否從頭重播
+    """
+
+    restartable = False
+
+    def __init__(self, path: str, interval: float = 0.0, loop: bool = False):
+        self.path = path
+        self.interval = interval
+        self.loop = loop
+        self._closed = threading.Event()
+
+    def open(self) -> None:
+        self._closed.clear()
+
+    def lines(self) -> Iterator[str]:
+        while not self._closed.is_set():
+            with open(self.path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    if self._closed.is_set():
+                        return
+                    yield line
+                    if line.strip() == SAMPLE_END and self.interval > 0:
+                        self._closed.wait(self.interval)
+            if not self.loop:
+                return
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+# ============================================================
+# 🧠 常駐取樣器：背景執行緒 + 環狀緩衝區
+# ============================================================
+
+class CounterSampler:
+    """
+    啟動一個收集程序並持續讀取其輸出，每個樣本以
+    (timestamp, [{"luid", "utilization", "memory_usage_MB", "type"}, ...])
+    存入固定長度的環狀緩衝區；latest() 直接回傳最新快照，不需要啟動任何程序。
+    """
+
+    def __init__(self, source=None, history: int = 120, restart_delay: float = 1.0):
+        self.source = source if source is not None else PowerShellCounterSource()
+        self.restart_delay = restart_delay
+        self._ring = deque(maxlen=history)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CounterSampler":
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="counter-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self.source.close()
+        if self._thread is not None:
+            self._thread.join(timeout=3)
+            self._thread = None
+
+    def latest(self) -> List[Dict[str, Any]]:
+        """回傳最新的 LUID 使用率快照 (尚無資料時回傳空 list)。"""
+        try:
+            return self._ring[-1][1]
+        except IndexError:
+            return []
+
+    def latest_timestamp(self) -> float:
+        """最新快照的時間戳 (time.time())，尚無資料時回傳 0.0。"""
+        try:
+            return self._ring[-1][0]
+        except IndexError:
+            return 0.0
+
+    def history(self) -> List[Any]:
+        """回傳環狀緩衝區內所有 (timestamp, records) 樣本 (舊 → 新)。"""
+        return list(self._ring)
+
+    def wait_ready(self, timeout: float = 5.0) -> bool:
+        """等待第一筆樣本進入緩衝區。"""
+        deadline = time.time() + timeout
+        while not self._ring and time.time() < deadline:
+            time.sleep(0.01)
+        return bool(self._ring)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.source.open()
+                self._consume(self.source.lines())
+            except Exception as e:
+                print(f"⚠️ 計數器收集程序錯誤: {e}", file=sys.stderr)
+            finally:
+                self.source.close()
+
+            if not self.source.restartable:
+                break
+            # 收集程序意外結束 → 稍候重新啟動
+            self._stop.wait(self.restart_delay)
+
+    def _consume(self, lines: Iterator[str]) -> None:
+        utilization = defaultdict(float)
+        memory = defaultdict(float)
+
+        for line in lines:
+            if self._stop.is_set():
+                return
+            line = line.strip()
+            if not line:
+                continue
+
+            if line == SAMPLE_END:
+                if utilization or memory:
+                    luids = set(utilization.keys()) | set(memory.keys())
+                    self._ring.append((time.time(), label_luid_records(luids, utilization, memory)))
+                utilization = defaultdict(float)
+                memory = defaultdict(float)
+                continue
+
+            parts = line.split("|", 2)
+            if len(parts) != 3:
+                continue
+            kind, instance_name, value_str = parts
+            luid = extract_luid(instance_name).lower()
+            try:
+                value = float(value_str)
+            except ValueError:
+                continue
+
+            # 與 get_gpu_utilization_fast 相同：使用率取各引擎最大值，記憶體加總
+            if kind == "U":
+                utilization[luid] = max(utilization[luid], value)
+            elif kind == "M":
+                memory[luid] += value / (1024 * 1024)
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    source = ReplayCounterSource(sys.argv[1], interval=1.0, loop=True) if len(sys.argv) > 1 else None
+    sampler = CounterSampler(source).start()
+    sampler.wait_ready(timeout=10)
+
+    try:
+        while True:
+            start = time.perf_counter()
+            data = sampler.latest()
+            elapsed = time.perf_counter() - start
+            for entry in data:
+                print(f"🔹 {entry['type']:24s} | 利用率: {entry['utilization']:6.2f}% | MEM: {entry['memory_usage_MB']:8.2f} MB")
+            print(f"⏱️ 讀取快照耗時: {elapsed * 1e6:.1f} µs\n")
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sampler.stop()
@@ -0,0 +1,194 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+from compute_info import get_gpu_utilization_fast, split_igpu_npu
+
+
+# ============================================================
+# 📦 統一快照
+# ============================================================
+
+@dataclass
+class TelemetrySnapshot:
+    """一次決策所需的所有裝置遙測資料。"""
+    timestamp: float = 0.0
+    dgpu_util: float = 0.0          # 第一張 dGPU 使用率 (%)
+    dgpu_free_GB: float = 0.0       # 第一張 dGPU 可用 VRAM (GB)
+    igpu_util: float = 0.0
+    npu_util: float = 0.0
+    igpu_mem_MB: float = 0.0
+    npu_mem_MB: float = 0.0
+    dgpus: List[Dict[str, Any]] = field(default_factory=list)      # 每張 dGPU 的完整樣本
+    luid_records: List[Dict[str, Any]] = field(default_factory=list)  # iGPU/NPU 原始 LUID 資料
+    latency_s: Dict[str, float] = field(default_factory=dict)      # 各來源耗時
+    errors: Dict[str, str] = field(default_factory=dict)           # 逾時或失敗的來源
+    stale_devices: List[str] = field(default_factory=list)         # 來源失敗，欄位的 0.0 不是量測值
+    extras: Dict[str, Any] = field(default_factory=dict)           # add_backend() 註冊的其他來源
+
+
+# ============================================================
+# 🛰️ TelemetryHub：同時取樣所有來源
+# ============================================================
+
+# 來源 → 其提供使用率的裝置
+BACKEND_DEVICES = {"dgpu": ("dGPU",), "igpu_npu": ("iGPU", "NPU")}
+
+class TelemetryHub:
+    """
+    同時取樣 dGPU 與 iGPU/NPU，每個來源各自有截止時間；
+    單一來源逾時或卡住只會讓該欄位留空，不會拖慢其他來源。
+    決策延遲 = 最慢的單一來源 (上限為 deadline)，而不是所有來源的總和。
+
+    每個來源有自己的單一工作執行緒，且同時最多只有一個呼叫在執行：
+    上一次呼叫還沒回來時，這次不再送出新的呼叫，直接把該來源標為 "stale"，
+    卡住的來源因此不會佔滿執行緒、也不會再讓後續取樣等待它的截止時間。
+
+    參數：
+        dgpu (callable, optional): 回傳 dGPU 樣本 list，例如 DGpuTelemetry().sample
+        igpu_npu (callable, optional): 回傳 LUID 使用率 list，例如 CounterSampler().latest
+            (預設 compute_info.get_gpu_utilization_fast)
+        deadline (float): 每個來源的截止秒數
+        deadlines (dict, optional): 個別來源的截止秒數，例如 {"dgpu": 0.2}
+    """
+
+    def __init__(self, dgpu: Optional[Callable[[], List[Dict[str, Any]]]] = None,
+                 igpu_npu: Optional[Callable[[], List[Dict[str, Any]]]] = get_gpu_utilization_fast,
+                 deadline: float = 1.0, deadlines: Optional[Dict[str, float]] = None):
+        self.backends: Dict[str, Callable[[], Any]] = {}
+        self.deadline = deadline
+        self.deadlines = dict(deadlines or {})
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._running: Dict[str, Tuple[Future, float]] = {}   # 來源 → (執行中的呼叫, 送出時間)
+        self._lock = threading.Lock()
+        if dgpu is not None:
+            self.add_backend("dgpu", dgpu)
+        if igpu_npu is not None:
+            self.add_backend("igpu_npu", igpu_npu)
+
+    def add_backend(self, name: str, func: Callable[[], Any], deadline: Optional[float] = None) -> None:
+        """註冊額外來源，結果放在 snapshot.extras[name]。"""
+        self.backends[name] = func
+        if name not in self._executors:
+            self._executors[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"telemetry-{name}")
+        if deadline is not None:
+            self.deadlines[name] = deadline
+
+    def _submit(self, name: str) -> Tuple[Optional[Future], float]:
+        """
+        送出一次呼叫；上一次呼叫仍在執行時回傳 (None, 已執行秒數)。
+        """
+        now = time.perf_counter()
+        with self._lock:
+            running = self._running.get(name)
+            if running is not None and not running[0].done():
+                return None, now - running[1]
+            future = self._executors[name].submit(self.backends[name])
+            self._running[name] = (future, now)
+        return future, 0.0
+
+    @staticmethod
+    def _outcome(future: Future) -> Tuple[Any, Optional[str]]:
+        error = future.exception()
+        return (None, str(error)) if error is not None else (future.result(), None)
+
+    def sample_sync(self) -> TelemetrySnapshot:
+        """同時取樣所有來源 (不需要事件迴圈；main.py 的同步迴圈使用)。"""
+        start = time.perf_counter()
+        submitted = {name: self._submit(name) for name in self.backends}
+        results = []
+        # 依截止時間由短到長等待；每個來源最多等到 start + 自己的截止時間
+        for name in sorted(submitted, key=lambda n: self.deadlines.get(n, self.deadline)):
+            future, busy_s = submitted[name]
+            if future is None:
+                results.append((name, None, f"stale (previous call running {busy_s:.1f}s)", 0.0))
+                continue
+            remaining = start + self.deadlines.get(name, self.deadline) - time.perf_counter()
+            try:
+                future.result(timeout=max(0.0, remaining))
+            except FutureTimeoutError:
+                results.append((name, None, "timeout", time.perf_counter() - start))
+                continue
+            except Exception:
+                pass
+            results.append((name, *self._outcome(future), time.perf_counter() - start))
+        return self._merge(results)
+
+    async def _run_backend(self, name: str):
+        start = time.perf_counter()
+        future, busy_s = self._submit(name)
+        if future is None:
+            return name, None, f"stale (previous call running {busy_s:.1f}s)", 0.0
+        try:
+            # shield：逾時只放棄等待，不取消 (也無法取消) 執行中的呼叫
+            await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                   timeout=self.deadlines.get(name, self.deadline))
+        except asyncio.TimeoutError:
+            return name, None, "timeout", time.perf_counter() - start
+        except Exception:
+            pass
+        return (name, *self._outcome(future), time.perf_counter() - start)
+
+    async def sample(self) -> TelemetrySnapshot:
+        """asyncio 版本 (smart_router 使用)：同時取樣所有來源並合併成一個 TelemetrySnapshot。"""
+        results = await asyncio.gather(*(self._run_backend(n) for n in self.backends))
+        return self._merge(results)
+
+    def _merge(self, results) -> TelemetrySnapshot:
+        snapshot = TelemetrySnapshot(timestamp=time.time())
+        raw = {}
+        for name, result, error, elapsed in results:
+            snapshot.latency_s[name] = elapsed
+            if error is not None:
+                snapshot.errors[name] = error
+                snapshot.stale_devices.extend(BACKEND_DEVICES.get(name, ()))
+            else:
+                raw[name] = result
+
+        snapshot.extras = {k: v for k, v in raw.items() if k not in ("dgpu", "igpu_npu")}
+
+        dgpus = raw.get("dgpu") or []
+        snapshot.dgpus = list(dgpus)
+        if dgpus:
+            snapshot.dgpu_util = dgpus[0].get("utilization", 0.0)
+            snapshot.dgpu_free_GB = dgpus[0].get("memory_free_MB", 0.0) / 1024.0
+
+        records = raw.get("igpu_npu") or []
+        snapshot.luid_records = list(records)
+        igpu, npu = split_igpu_npu(records)
+        if igpu is not None:
+            snapshot.igpu_util = igpu["utilization"]
+            snapshot.igpu_mem_MB = igpu.get("memory_usage_MB", 0.0)
+        if npu is not None:
+            snapshot.npu_util = npu["utilization"]
+            snapshot.npu_mem_MB = npu.get("memory_usage_MB", 0.0)
+
+        return snapshot
+
+    def close(self) -> None:
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+
+
+# ============================================================
+# 🧾 主程式
+# ============================================================
+
+if __name__ == "__main__":
+    from dgpu_telemetry import DGpuTelemetry
+
+    telemetry = DGpuTelemetry().open()
+    hub = TelemetryHub(dgpu=telemetry.sample)
+    while True:
+        start = time.perf_counter()
+        snap = hub.sample_sync()
+        elapsed = time.perf_counter() - start
+        print(f"💾 dGPU {snap.dgpu_util:5.1f}% ({snap.dgpu_free_GB:.2f} GB free) | "
+              f"🎮 iGPU {snap.igpu_util:5.1f}% | ⚙️ NPU {snap.npu_util:5.1f}%")
+        for name, t in snap.latency_s.items():
+            print(f"   {name:10s} {t * 1000:8.2f} ms {snap.errors.get(name, '')}")
+        print(f"⏱️ 總耗時: {elapsed * 1000:.2f} ms\n")
+        time.sleep(1)
@@ -0,0 +1,41 @@
+import os
+import sys
+import json
+
+import pytest
+
+# 專案模組都在根目錄 (沒有套件結構)，測試直接匯入
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from fake_ovms import FakeOVMS, serve  # noqa: E402
+
+
+# ============================================================
+# 🎭 假上游：fake_ovms 在背景執行緒啟動，測試結束時關閉
+# ============================================================
+
+@pytest.fixture
+def fake_ovms():
+    """回傳 start(**FakeOVMS 參數) → (base_url, FakeOVMS)；伺服器使用隨機埠。"""
+    servers = []
+
+    def start(**kwargs):
+        state = FakeOVMS(**kwargs)
+        server = serve(0, state, background=True)
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}", state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def write_config(path, names):
+    """寫入只有 mediapipe_config_list 的 OVMS config.json。"""
+    config = {"mediapipe_config_list": [{"name": n, "base_path": n} for n in names], "model_config_list": []}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(config, f)
+    return str(path)
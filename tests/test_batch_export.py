@@ -0,0 +1,51 @@
+import sys
+import json
+
+from batch_export import run_batch
+from config_store import ConfigStore
+
+
+# 假的 export_model：記錄呼叫、名稱列在 fail 檔案中時失敗，
+# 否則建立模型資料夾並把 servable 寫入 --config_file_path (與 add_servable_to_config 相同格式)
+STUB = r'''
+import os, sys, json
+args = sys.argv[1:]
+opt = lambda k: args[args.index(k) + 1]
+name, repo, config = opt("--model_name"), opt("--model_repository_path"), opt("--config_file_path")
+here = os.path.dirname(os.path.abspath(__file__))
+with open(os.path.join(here, "calls.log"), "a") as f:
+    f.write(name + "\n")
+fail = os.path.join(here, "fail.txt")
+if os.path.isfile(fail) and name in open(fail).read().split():
+    sys.exit(3)
+os.makedirs(os.path.join(repo, name), exist_ok=True)
+with open(config, "w") as f:
+    json.dump({"mediapipe_config_list": [{"name": name, "base_path": os.path.abspath(os.path.join(repo, name))}],
+               "model_config_list": []}, f)
+'''
+
+
+def test_interrupted_batch_resumes_without_redoing_done_jobs(tmp_path):
+    stub = tmp_path / "stub_export.py"
+    stub.write_text(STUB)
+    (tmp_path / "fail.txt").write_text("m2")
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({
+        "model_repository_path": str(tmp_path / "models"),
+        "config_file_path": str(tmp_path / "models" / "config.json"),
+        "exports": [{"source_model": f"OpenVINO/{n}", "model_name": n} for n in ("m1", "m2", "m3")],
+    }))
+    config_path = tmp_path / "models" / "config.json"
+
+    first = run_batch(str(manifest), max_workers=2, ram_budget_GB=4, converter=[sys.executable, str(stub)])
+    assert sorted(first["done"]) == ["m1", "m3"] and first["failed"] == ["m2"]
+    assert sorted(ConfigStore(str(config_path)).names()) == ["m1", "m3"]
+
+    # 修好失敗的工作後重跑：只執行 m2，已完成的工作直接略過
+    (tmp_path / "fail.txt").write_text("")
+    (tmp_path / "calls.log").write_text("")
+    second = run_batch(str(manifest), max_workers=2, ram_budget_GB=4, converter=[sys.executable, str(stub)])
+    assert second["done"] == ["m2"]
+    assert sorted(second["skipped"]) == ["m1", "m3"]
+    assert (tmp_path / "calls.log").read_text().split() == ["m2"]
+    assert sorted(ConfigStore(str(config_path)).names()) == ["m1", "m2", "m3"]
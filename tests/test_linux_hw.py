@@ -0,0 +1,73 @@
+import os
+import time
+
+from linux_hw import detect_linux_devices, enumerate_linux_devices
+from linux_telemetry import LinuxGpuNpuSampler
+
+
+def make_pci(root, address, pci_class, vendor, device, driver=None, **files):
+    path = root / "sys/bus/pci/devices" / address
+    path.mkdir(parents=True)
+    for name, value in dict({"class": pci_class, "vendor": vendor, "device": device}, **files).items():
+        (path / name).write_text(value)
+    if driver:
+        target = root / "sys/bus/pci/drivers" / driver
+        target.mkdir(parents=True, exist_ok=True)
+        os.symlink(target, path / "driver")
+    return path
+
+
+def link_node(root, class_dir, node, address):
+    path = root / class_dir / node
+    path.mkdir(parents=True)
+    os.symlink(root / "sys/bus/pci/devices" / address, path / "device")
+
+
+def fake_sysfs(root):
+    """Intel iGPU + AMD APU (512 MB VRAM) + NVIDIA 3D controller + Intel NPU + ASPEED BMC。"""
+    make_pci(root, "0000:00:02.0", "0x030000", "0x8086", "0x7d55", "i915", boot_vga="1")
+    make_pci(root, "0000:00:0b.0", "0x120000", "0x8086", "0x7d1d", "intel_vpu",
+             npu_busy_time_us="0")
+    make_pci(root, "0000:01:00.0", "0x030200", "0x10de", "0x2684", "nvidia")
+    make_pci(root, "0000:05:00.0", "0x030000", "0x1002", "0x15bf", "amdgpu",
+             mem_info_vram_total=str(512 * 1024 ** 2))
+    make_pci(root, "0000:06:00.0", "0x030000", "0x1a03", "0x2000", "ast")
+    link_node(root, "sys/class/drm", "card0", "0000:00:02.0")
+    link_node(root, "sys/class/drm", "renderD128", "0000:00:02.0")
+    link_node(root, "sys/class/accel", "accel0", "0000:00:0b.0")
+
+
+def test_devices_are_classified_from_sysfs(tmp_path):
+    fake_sysfs(tmp_path)
+    kinds = {d["address"]: d["kind"] for d in enumerate_linux_devices(str(tmp_path))}
+    assert kinds == {"0000:00:02.0": "iGPU", "0000:00:0b.0": "NPU", "0000:01:00.0": "dGPU",
+                     "0000:05:00.0": "iGPU", "0000:06:00.0": "display"}
+
+    result = detect_linux_devices(str(tmp_path))
+    assert (result["dGPU"], result["iGPU"], result["NPU"]) == (True, True, True)
+    igpu = next(d for d in result["detail"]["devices"] if d["address"] == "0000:00:02.0")
+    assert igpu["driver"] == "i915" and igpu["drm"] == ["card0", "renderD128"]
+
+
+def test_telemetry_labels_match_linux_hw(tmp_path):
+    # AMD APU 的 DRM client：linux_hw 判定為 iGPU，遙測也必須標成 iGPU
+    fake_sysfs(tmp_path)
+    (tmp_path / "proc/42/fd").mkdir(parents=True)
+    (tmp_path / "proc/42/fdinfo").mkdir(parents=True)
+    os.symlink("/dev/dri/renderD129", tmp_path / "proc/42/fd/5")
+    fdinfo = tmp_path / "proc/42/fdinfo/5"
+
+    def write_fdinfo(busy_ns):
+        fdinfo.write_text(f"drm-driver:\tamdgpu\ndrm-pdev:\t0000:05:00.0\ndrm-client-id:\t7\n"
+                          f"drm-engine-gfx:\t{busy_ns} ns\n")
+
+    sampler = LinuxGpuNpuSampler(str(tmp_path))
+    write_fdinfo(0)
+    sampler.sample()
+    time.sleep(0.1)
+    write_fdinfo(50_000_000)
+    records = {r["pci_address"]: r for r in sampler.sample()}
+    apu = records["0000:05:00.0"]
+    assert apu["type"].startswith("iGPU")
+    assert 20.0 < apu["utilization"] <= 100.0
+    assert records["0000:00:0b.0"]["type"].startswith("NPU")
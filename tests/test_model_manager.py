@@ -0,0 +1,48 @@
+from conftest import write_config
+from config_store import ConfigStore
+from model_manager import OVMSModelHost, ModelManager
+
+
+LOAD_TIME = 0.3
+
+
+def make_manager(tmp_path, fake_ovms, loaded, extra=(), budget=10.0):
+    config_path = write_config(tmp_path / "config.json", loaded)
+    url, state = fake_ovms(ttft=0.0, itl=0.0, config_path=config_path, load_time=LOAD_TIME)
+    host = OVMSModelHost(config_path, url)
+    for name in extra:
+        host.register(name, name)
+    manager = ModelManager({"iGPU": host, "NPU": host}, budget_GB={"system": budget},
+                           model_mem_GB={"A": 5.0, "B": 5.0, "C": 5.0}, poll_interval=0.02)
+    return manager, state, config_path
+
+
+def test_cold_switch_evicts_under_budget_and_reports_warmup(tmp_path, fake_ovms):
+    manager, state, config_path = make_manager(tmp_path, fake_ovms, ["A", "B"], extra=["C"])
+    try:
+        manager.on_selection("NPU", "C")
+        manager.wait_idle(timeout=10)
+    finally:
+        manager.close()
+
+    loaded = ConfigStore(config_path).names()
+    assert "C" in loaded and len(loaded) == 2            # 10 GB 預算只放得下兩個 5 GB 模型
+    assert state.model_state("C") == "AVAILABLE"
+    record = manager.switches[-1]
+    assert record["warm"] is False and "error" not in record
+    # 暖機延遲 = fake OVMS 的載入時間 (不含淘汰)
+    assert LOAD_TIME <= record["warmup_s"] < LOAD_TIME + 1.0
+
+
+def test_prewarmed_candidate_switches_without_warmup(tmp_path, fake_ovms):
+    manager, state, _ = make_manager(tmp_path, fake_ovms, ["A"], extra=["C"])
+    try:
+        manager.on_selection("iGPU", "A", [("NPU", "C")])
+        manager.wait_idle(timeout=10)
+        manager.on_selection("NPU", "C")
+    finally:
+        manager.close()
+
+    assert state.model_state("C") == "AVAILABLE"
+    assert manager.switches[-1]["warm"] is True
+    assert manager.switches[-1]["warmup_s"] == 0.0
@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+
+from conftest import ROOT
+from get_dgpu_usage import query_all_gpus, get_dgpu_utilization_all, get_dgpu_vram_all
+from multi_dgpu import MultiDGpuSelector
+
+
+FAKE_SMI = [sys.executable, os.path.join(ROOT, "fake_nvidia_smi.py")]
+MODEL_LIST = {"dGPU": ["Qwen3-14B-int4-ov", "Qwen3-8B-int4-ov"], "iGPU": ["Qwen3-8B-int4-ov"]}
+MODEL_VRAM = {"Qwen3-14B-int4-ov": 9.0, "Qwen3-8B-int4-ov": 5.0}
+
+
+def always_dgpu(devices, igpu, npu, dgpu, dgpu_mem, threshold, model_list, model_vram):
+    return "dGPU", model_list["dGPU"][0]
+
+
+def test_every_gpu_is_reported(monkeypatch):
+    monkeypatch.setenv("FAKE_NVIDIA_SMI_GPUS", "3")
+    records = query_all_gpus(FAKE_SMI)
+    assert [r["index"] for r in records] == [0, 1, 2]
+    assert len(get_dgpu_utilization_all(FAKE_SMI)) == 3
+    assert len(get_dgpu_vram_all(FAKE_SMI)) == 3
+
+
+def test_selector_picks_least_loaded_card_that_fits(monkeypatch, tmp_path):
+    # GPU 0：閒置但 VRAM 不足；GPU 1：忙碌；GPU 2：放得下且較閒
+    script = tmp_path / "frames.json"
+    script.write_text(json.dumps([[
+        {"utilization.gpu": 5, "memory.used": 12288, "memory.total": 16384},
+        {"utilization.gpu": 70, "memory.used": 1024, "memory.total": 16384},
+        {"utilization.gpu": 20, "memory.used": 1024, "memory.total": 16384},
+    ]]))
+    monkeypatch.setenv("FAKE_NVIDIA_SMI_SCRIPT", str(script))
+    dgpus = query_all_gpus(FAKE_SMI)
+    assert len(dgpus) == 3
+
+    selector = MultiDGpuSelector(always_dgpu)
+    devices = {"dGPU": True, "iGPU": True, "NPU": False}
+    device, index, model = selector.select(devices, 0.0, 0.0, dgpus, 80, MODEL_LIST, MODEL_VRAM)
+    assert (device, index, model) == ("dGPU", 2, "Qwen3-14B-int4-ov")
@@ -0,0 +1,107 @@
+import json
+import time
+import asyncio
+
+from smart_router import SmartRouter
+from inflight import InflightTracker, FinishTimeSelector
+from signal_smoothing import HysteresisSelector
+
+
+DEVICES = {"dGPU": False, "iGPU": True, "NPU": True}
+MODEL_LIST = {"iGPU": ["Qwen3-8B-int4-ov"], "NPU": ["Qwen3-8B-int4-cw-ov"]}
+
+
+def always_igpu(devices, igpu, npu, dgpu, dgpu_mem, threshold, model_list, model_vram, tokens=None):
+    return "iGPU", model_list["iGPU"][0]
+
+
+async def post_chat(port, payload):
+    """
+    以原始 socket 送出請求，回傳 (標頭 dict, [(抵達時間, 資料)], 送出時間)；
+    逐次讀取 chunked 回應，可看出資料是否逐塊到達。
+    """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    body = json.dumps(payload).encode("utf-8")
+    sent = time.perf_counter()
+    writer.write(b"POST /v3/chat/completions HTTP/1.1\r\nHost: x\r\nConnection: close\r\n"
+                 b"Content-Type: application/json\r\n" + f"Content-Length: {len(body)}\r\n\r\n".encode() + body)
+    await writer.drain()
+    headers = {}
+    await reader.readline()
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        k, _, v = line.decode("latin-1").partition(":")
+        headers[k.strip().lower()] = v.strip()
+    chunks = []
+    while True:
+        data = await reader.read(65536)
+        if not data:
+            break
+        chunks.append((time.perf_counter(), data))
+    writer.close()
+    return headers, chunks, sent
+
+
+def test_stream_is_relayed_unbuffered(fake_ovms):
+    # 10 個 token，間隔 0.1 s：完整回應約 1 s
+    igpu_url, _ = fake_ovms(ttft=0.05, itl=0.1)
+    npu_url, _ = fake_ovms()
+
+    async def scenario():
+        router = SmartRouter(DEVICES, MODEL_LIST, {}, always_igpu,
+                             backends={"iGPU": {"url": igpu_url, "path": "/v3/chat/completions"},
+                                       "NPU": {"url": npu_url, "path": "/v3/chat/completions"}})
+        await router.start(port=0)
+        try:
+            return await post_chat(router.port, {"model": "auto", "stream": True, "max_tokens": 10,
+                                                 "messages": [{"role": "user", "content": "hi"}]})
+        finally:
+            await router.close()
+
+    headers, chunks, sent = asyncio.run(scenario())
+    body = b"".join(data for _, data in chunks)
+    first_token = next(t for t, data in chunks if b'"delta"' in data)
+    assert headers["x-smart-device"] == "iGPU"
+    assert body.count(b'"delta"') == 10
+    # 第一個 token 在上游送出後立即到達，而不是等整個回應結束
+    assert first_token - sent < 0.5
+    assert chunks[-1][0] - first_token > 0.5
+
+
+def test_known_model_pins_device(fake_ovms):
+    igpu_url, igpu = fake_ovms(ttft=0.0, itl=0.0)
+    npu_url, npu = fake_ovms(ttft=0.0, itl=0.0)
+
+    async def scenario():
+        router = SmartRouter(DEVICES, MODEL_LIST, {}, always_igpu,
+                             backends={"iGPU": {"url": igpu_url, "path": "/v3/chat/completions"},
+                                       "NPU": {"url": npu_url, "path": "/v3/chat/completions"}})
+        await router.start(port=0)
+        try:
+            return await post_chat(router.port, {"model": "Qwen3-8B-int4-cw-ov", "max_tokens": 4,
+                                                 "messages": [{"role": "user", "content": "hi"}]})
+        finally:
+            await router.close()
+
+    headers, chunks, _ = asyncio.run(scenario())
+    assert headers["x-smart-device"] == "NPU"
+    assert json.loads(b"".join(d for _, d in chunks))["usage"]["completion_tokens"] == 4
+    assert (npu.requests_served, igpu.requests_served) == (1, 0)
+
+
+def test_queue_aware_routes_each_request_by_eta():
+    # 每個請求都依 ETA 選擇，不經過 HysteresisSelector 的連續確認
+    tracker = InflightTracker()
+    eta = FinishTimeSelector(tracker)
+    router = SmartRouter(DEVICES, MODEL_LIST, {}, HysteresisSelector(eta.select).select,
+                         tracker=tracker, eta_selector=eta)
+    routed = []
+    for _ in range(12):
+        expected = min(eta.eta(d, MODEL_LIST[d][0], {}, 512) for d in ("iGPU", "NPU"))
+        device, model = router.route({"model": "auto", "max_tokens": 512})
+        assert eta.eta(device, model, {}, 512) == expected
+        tracker.begin(device, model, 512)
+        routed.append(device)
+    assert "iGPU" in routed and "NPU" in routed
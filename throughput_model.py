@@ -0,0 +1,197 @@
+import os
+import json
+import numpy as np
+from typing import Callable, Dict, List, Optional, Tuple, Any
+
+
+CURVES_FILE = "throughput_curves.json"
+
+# 沒有曲線也沒有觀測值時的單一串流 tokens/s 預設值 (inflight / multi_dgpu 共用)
+DEFAULT_TPS = {"dGPU": 60.0, "iGPU": 20.0, "NPU": 15.0}
+
+# 所有曲線統一重新取樣到 0~100% 的格點，查詢時可一次向量化內插
+GRID = np.linspace(0.0, 100.0, 101)
+
+
+def model_key(model: str) -> str:
+    """曲線以不含組織前綴的模型名稱為鍵 ("OpenVINO/Qwen3-8B-int4-ov" → "Qwen3-8B-int4-ov")。"""
+    return model.split("/")[-1]
+
+
+# ============================================================
+# 📊 (模型, 裝置) → tokens/s 對負載的曲線
+# ============================================================
+
+class ThroughputCurves:
+    """
+    保存 benchmark_final 量測的 tokens/s 曲線。
+
+    每條曲線記錄：
+        model  - 模型名稱
+        device - 執行裝置 ("dGPU", "iGPU", "NPU")
+        axis   - 曲線 x 軸是哪個裝置的使用率 (benchmark_final 以 iGPU 負載掃描，
+                 因此 NPU 曲線的 axis 也是 "iGPU"，反映共用記憶體頻寬的干擾；
+                 查詢時再乘上 (1 - 裝置本身使用率)，裝置自己滿載時預測值才會下降)
+        load   - 使用率 (%)
+        tps    - 對應的 tokens/s
+
+    JSON 格式：{"curves": [{"model", "device", "axis", "load": [...], "tps": [...]}, ...]}
+    """
+
+    def __init__(self):
+        self._points: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._keys: List[Tuple[str, str]] = []
+        self._index: Dict[Tuple[str, str], int] = {}
+        self._axes: List[str] = []
+        self._table = np.zeros((0, GRID.size))
+
+    # --------------------------------------------------------
+    # 建立 / 讀寫
+    # --------------------------------------------------------
+    def add_point(self, model: str, device: str, load_pct: float, tps: float, axis: Optional[str] = None) -> None:
+        """加入一個量測點 (同一負載重複量測時保留最新值)。"""
+        self.add_curve(model, device, [load_pct], [tps], axis)
+
+    def add_curve(self, model: str, device: str, loads_pct, tps, axis: Optional[str] = None) -> None:
+        self._add(model, device, loads_pct, tps, axis)
+        self._rebuild()
+
+    def _add(self, model: str, device: str, loads_pct, tps, axis: Optional[str]) -> None:
+        curve = self._points.setdefault((model_key(model), device), {"axis": axis or device, "points": {}})
+        for load, value in zip(loads_pct, tps):
+            curve["points"][round(float(load), 3)] = float(value)
+
+    def _rebuild(self) -> None:
+        keys, axes, rows = [], [], []
+        for key, curve in self._points.items():
+            if not curve["points"]:
+                continue
+            loads = np.array(sorted(curve["points"]))
+            values = np.array([curve["points"][x] for x in loads])
+            keys.append(key)
+            axes.append(curve["axis"])
+            # 範圍外以端點值延伸
+            rows.append(np.interp(GRID, loads, values))
+        self._keys = keys
+        self._axes = axes
+        self._index = {k: i for i, k in enumerate(keys)}
+        self._table = np.vstack(rows) if rows else np.zeros((0, GRID.size))
+
+    def save(self, path: str = CURVES_FILE) -> None:
+        data = {"curves": [
+            {
+                "model": model,
+                "device": device,
+                "axis": curve["axis"],
+                "load": sorted(curve["points"]),
+                "tps": [curve["points"][x] for x in sorted(curve["points"])],
+            }
+            for (model, device), curve in self._points.items()
+        ]}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str = CURVES_FILE) -> "ThroughputCurves":
+        """讀取曲線檔；檔案不存在時回傳空的 ThroughputCurves。"""
+        curves = cls()
+        if not os.path.isfile(path):
+            return curves
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for c in data.get("curves", []):
+            curves._add(c["model"], c["device"], c["load"], c["tps"], c.get("axis"))
+        curves._rebuild()
+        return curves
+
+    # --------------------------------------------------------
+    # 查詢
+    # --------------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def has(self, model: str, device: str) -> bool:
+        return (model_key(model), device) in self._index
+
+    def predict_many(self, pairs: List[Tuple[str, str]], loads: Dict[str, float]) -> np.ndarray:
+        """
+        向量化預測多個 (model, device) 在目前負載下的 tokens/s。
+
+        參數：
+            pairs: [(model, device), ...]
+            loads: 各裝置目前使用率 (%)，例如 {"iGPU": 45.0, "NPU": 10.0, "dGPU": 0.0}
+
+        axis 不是裝置本身的曲線 (例如以 iGPU 負載量測的 NPU 曲線) 只反映其他裝置的干擾，
+        因此再乘上 (1 - 裝置本身使用率)。
+
+        回傳：
+            np.ndarray，沒有曲線的組合為 nan
+        """
+        out = np.full(len(pairs), np.nan)
+        rows = np.array([self._index.get((model_key(m), d), -1) for m, d in pairs], dtype=np.int64)
+        valid = rows >= 0
+        if not valid.any():
+            return out
+
+        r = rows[valid]
+        x = np.array([loads.get(self._axes[i], 0.0) for i in r], dtype=np.float64)
+        x = np.clip(x, GRID[0], GRID[-1])
+        lo = np.minimum(x.astype(np.int64), GRID.size - 2)   # 格點間距 1%
+        frac = x - lo
+        tps = self._table[r, lo] * (1.0 - frac) + self._table[r, lo + 1] * frac
+        devices = [d for (_, d), ok in zip(pairs, valid) if ok]
+        own = np.array([0.0 if self._axes[i] == d else loads.get(d, 0.0) for i, d in zip(r, devices)])
+        out[valid] = tps * np.clip(1.0 - own / 100.0, 0.0, 1.0)
+        return out
+
+    def predict(self, model: str, device: str, loads: Dict[str, float]) -> Optional[float]:
+        value = self.predict_many([(model, device)], loads)[0]
+        return None if np.isnan(value) else float(value)
+
+
+# ============================================================
+# 🎯 以預測 tokens/s 選擇裝置
+# ============================================================
+
+def candidate_pairs(devices: Dict[str, Any], dgpu_mem: float, model_list: Dict[str, List[str]],
+                    model_vram: Dict[str, float]) -> List[Tuple[str, str]]:
+    """列出所有可用的 (model, device) 組合 (dGPU 只列 VRAM 足夠的模型)。"""
+    pairs = []
+    for device in ("dGPU", "iGPU", "NPU"):
+        if not devices.get(device, False):
+            continue
+        for model in model_list.get(device, []):
+            if device == "dGPU" and model_vram.get(model, 0) > dgpu_mem:
+                continue
+            pairs.append((model, device))
+    return pairs
+
+
+def select_by_throughput(devices, igpu_util, npu_util, dgpu_util, dgpu_mem, usage_threshold, model_list, model_vram,
+                         curves: ThroughputCurves, fallback: Callable[..., Tuple[str, str]]) -> Tuple[str, str]:
+    """
+    依量測曲線內插目前負載下的 tokens/s，選擇預測最快的 (裝置, 模型)。
+    參數與 main.select_best_device_and_model 相同，另加：
+
+        curves (ThroughputCurves): 量測曲線
+        fallback (callable): 沒有任何曲線可用時改用的規則式選擇函式
+
+    沒有曲線的組合 (例如 benchmark_final 不量測的 dGPU) 不會被排除，
+    改以 DEFAULT_TPS × (1 - 使用率) 估計。
+
+    回傳：
+        tuple (str, str): (裝置名稱, 模型名稱)
+    """
+    pairs = candidate_pairs(devices, dgpu_mem, model_list, model_vram)
+    if not any(curves.has(*p) for p in pairs):
+        return fallback(devices, igpu_util, npu_util, dgpu_util, dgpu_mem, usage_threshold, model_list, model_vram)
+
+    loads = {"iGPU": igpu_util, "NPU": npu_util, "dGPU": dgpu_util}
+    predicted = curves.predict_many(pairs, loads)
+    for i, (model, device) in enumerate(pairs):
+        if np.isnan(predicted[i]):
+            predicted[i] = DEFAULT_TPS.get(device, 10.0) * max(0.0, 1.0 - loads.get(device, 0.0) / 100.0)
+    best = int(np.argmax(predicted))
+    model, device = pairs[best]
+    print(f"🚀 預測吞吐量最高: {device} / {model} ≈ {predicted[best]:.1f} tok/s")
+    return device, model